@@ -1,8 +1,12 @@
+import time
+
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
 from jose import JWTError, jwt
 
+from app.core.cache import principal_cache
 from app.core.config import settings
+from app.core.metrics import timed
 from app.schemas.token import TokenData
 from app.repositories.user_repository import user_repository
 
@@ -13,6 +17,15 @@ async def get_current_user(token: str = Depends(oauth2_scheme)):
     """
     Dependency to get the current user from a token
     """
+    with timed("auth"):
+        return await _authenticate(token)
+
+async def _authenticate(token: str):
+    # A cached token was already verified and has not expired yet
+    user = principal_cache.get(token)
+    if user is not None:
+        return user
+
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
@@ -36,6 +49,10 @@ async def get_current_user(token: str = Depends(oauth2_scheme)):
     
     if user is None:
         raise credentials_exception
+
+    # Never keep a principal past the expiry of its token
+    expires_in = payload["exp"] - time.time() if "exp" in payload else None
+    principal_cache.set(token, user, ttl=expires_in)
     return user
 
 async def get_current_admin_user(
@@ -0,0 +1,29 @@
+from typing import Any
+from fastapi import Request, Response, status
+from fastapi.responses import JSONResponse
+
+from app.core.metrics import timed
+from app.services.catalog_service import RenderedResponse
+
+class TimedJSONResponse(JSONResponse):
+    """
+    JSONResponse that reports its encoding time as the serialize phase
+    """
+    def render(self, content: Any) -> bytes:
+        with timed("serialize"):
+            return super().render(content)
+
+def etag_response(request: Request, rendered: RenderedResponse) -> Response:
+    """
+    Send pre-rendered JSON with its ETag, or an empty 304 when the client
+    already has this version (If-None-Match)
+    """
+    headers = {"ETag": rendered.etag, "Cache-Control": "no-cache"}
+
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match:
+        tags = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+        if "*" in tags or rendered.etag in tags:
+            return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
+    return Response(content=rendered.body, media_type="application/json", headers=headers)
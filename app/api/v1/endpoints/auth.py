@@ -1,5 +1,6 @@
 from fastapi import APIRouter, Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordRequestForm
+from app.core.security import AuthBusyError
 from app.schemas.token import Token
 from app.services.auth_service import auth_service
 
@@ -13,10 +14,17 @@ async def login_for_access_token(
     Logs in a user and returns an access token
     """
     # Call the service layer
-    access_token = await auth_service.login(
-        username=form_data.username,
-        password=form_data.password
-    )
+    try:
+        access_token = await auth_service.login(
+            username=form_data.username,
+            password=form_data.password
+        )
+    except AuthBusyError:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Too many login attempts in progress, try again shortly",
+            headers={"Retry-After": "1"},
+        )
     
     # Handle the service's response
     if not access_token:
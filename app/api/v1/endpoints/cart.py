@@ -1,9 +1,8 @@
 from fastapi import APIRouter, Depends, HTTPException, status
 
 from app.models.user import User
-from app.models.cart import Cart
 
-from app.schemas.cart import CartItemCreate, CartOut
+from app.schemas.cart import CartItemCreate, CartItemUpdate, CartOut
 from app.api.dependencies import get_current_user
 
 from beanie import PydanticObjectId
@@ -12,16 +11,6 @@ from app.services.cart_service import cart_service
 
 router = APIRouter()
 
-async def get_or_create_cart(user_id: PydanticObjectId) -> Cart:
-    """
-    Get user's cart or create one
-    """
-    cart = await Cart.find_one(Cart.user_id == user_id)
-    if not cart:
-        cart = Cart(user_id=user_id, items=[])
-        await cart.insert()
-    return cart
-
 @router.post("/items", response_model=CartOut)
 async def add_item_to_cart(
     item_in: CartItemCreate,
@@ -66,6 +55,36 @@ async def get_user_cart(
         items=cart.items # type: ignore
     )
 
+@router.put("/items/{product_id}", response_model=CartOut)
+async def update_cart_item(
+    product_id: PydanticObjectId,
+    item_in: CartItemUpdate,
+    current_user: User = Depends(get_current_user)
+):
+    """
+    Set the quantity of a product in the current user's shopping cart
+    """
+    user_id = current_user.id
+
+    cart_or_error = await cart_service.update_item(user_id, product_id, item_in.quantity) # pyright: ignore[reportArgumentType]
+
+    if cart_or_error is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Item not found in cart"
+        )
+    if cart_or_error == "NOT_ENOUGH_STOCK":
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Not enough stock"
+        )
+
+    return CartOut(
+        id=str(cart_or_error.id), # type: ignore
+        user_id=cart_or_error.user_id, # type: ignore
+        items=cart_or_error.items # type: ignore
+    )
+
 @router.delete("/items/{product_id}", response_model=CartOut)
 async def remove_item_from_cart(
     product_id: PydanticObjectId,
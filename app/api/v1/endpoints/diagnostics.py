@@ -0,0 +1,42 @@
+from typing import List, Literal
+from fastapi import APIRouter, Depends, Query, status
+
+from app.api.dependencies import get_current_admin_user
+from app.core.metrics import mongo_pool_listener
+from app.core.slow_queries import slow_query_log
+from app.models.user import User
+from app.schemas.diagnostics import MongoPoolOut, SlowQueryReport
+
+router = APIRouter()
+
+@router.get("/slow-queries", response_model=SlowQueryReport)
+async def get_slow_queries(
+    limit: int = Query(20, ge=1, le=500),
+    sort: Literal["total_ms", "count", "max_ms", "avg_ms"] = "total_ms",
+    _: User = Depends(get_current_admin_user)
+):
+    """
+    The query shapes of this worker that ran slower than the threshold most,
+    with their last captured plan (Admin only)
+    """
+    return SlowQueryReport(
+        threshold_ms=slow_query_log.threshold_ms,
+        items=slow_query_log.top(limit, sort)
+    )
+
+@router.delete("/slow-queries", status_code=status.HTTP_204_NO_CONTENT)
+async def reset_slow_queries(_: User = Depends(get_current_admin_user)):
+    """
+    Start the slow-query report over (Admin only)
+    """
+    slow_query_log.reset()
+
+@router.get("/mongo-pool", response_model=List[MongoPoolOut])
+async def get_mongo_pool(_: User = Depends(get_current_admin_user)):
+    """
+    Connection pool usage of this worker, per MongoDB server (Admin only)
+    """
+    return [
+        MongoPoolOut(address=address, **pool)
+        for address, pool in mongo_pool_listener.stats().items()
+    ]
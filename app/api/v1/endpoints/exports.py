@@ -0,0 +1,43 @@
+from typing import Literal
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from fastapi.responses import StreamingResponse
+
+from app.api.dependencies import get_current_admin_user
+from app.models.user import User
+from app.services.export_service import export_service
+
+router = APIRouter()
+
+MEDIA_TYPES = {"ndjson": "application/x-ndjson", "csv": "text/csv"}
+
+@router.get("/{collection}")
+async def export_collection(
+    collection: Literal["products", "orders", "users"],
+    format: Literal["ndjson", "csv"] = "ndjson",
+    fields: str | None = Query(None, description="Comma-separated fields to include"),
+    gzip: bool = False,
+    batch_size: int | None = Query(None, ge=1, le=10_000),
+    _: User = Depends(get_current_admin_user)
+):
+    """
+    Stream every product, order or user as NDJSON or CSV (Admin only).
+    Pass gzip=true to compress the body (Content-Encoding: gzip).
+    """
+    selected = export_service.resolve_fields(collection, fields)
+    if isinstance(selected, str):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Unknown export field",
+        )
+
+    headers = {
+        "Content-Disposition": f'attachment; filename="{collection}.{format}"',
+        "Cache-Control": "no-store",
+    }
+    if gzip:
+        headers["Content-Encoding"] = "gzip"
+    return StreamingResponse(
+        export_service.export(collection, selected, format, gzip, batch_size),
+        media_type=MEDIA_TYPES[format],
+        headers=headers
+    )
@@ -1,11 +1,85 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from datetime import datetime
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from beanie import PydanticObjectId
 from app.models.user import User
-from app.schemas.order import OrderOut, OrderItemOut, CheckoutSessionResponse
+from app.schemas.order import (
+    OrderOut,
+    OrderItemOut,
+    OrderPage,
+    OrderSummaryOut,
+    CheckoutSessionResponse
+)
 from app.api.dependencies import get_current_user
 from app.services.order_service import order_service
 
 router = APIRouter()
 
+@router.get("/", response_model=OrderPage)
+async def get_my_orders(
+    limit: int = Query(20, ge=1, le=100),
+    cursor: str | None = None,
+    order_status: str | None = Query(None, alias="status"),
+    created_from: datetime | None = None,
+    created_to: datetime | None = None,
+    current_user: User = Depends(get_current_user)
+):
+    """
+    Get a page of the current user's orders, newest first.
+    Pass the returned next_cursor to fetch the following page.
+    """
+    result = await order_service.get_orders_page(
+        current_user.id, # pyright: ignore[reportArgumentType]
+        limit,
+        cursor=cursor,
+        order_status=order_status,
+        created_from=created_from,
+        created_to=created_to
+    )
+
+    if isinstance(result, str):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid cursor."
+        )
+
+    orders, next_cursor = result
+    return OrderPage(
+        items=[
+            OrderSummaryOut(
+                id=str(o.id),
+                total_price=o.total_price,
+                order_status=o.order_status,
+                created_at=o.created_at
+            ) for o in orders
+        ],
+        next_cursor=next_cursor
+    )
+
+@router.get("/{id}", response_model=OrderOut)
+async def get_order_by_id(
+    id: PydanticObjectId,
+    current_user: User = Depends(get_current_user)
+):
+    """
+    Get one of the current user's orders with its line items
+    """
+    order = await order_service.get_order(current_user.id, id) # pyright: ignore[reportArgumentType]
+
+    if not order:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Order not found"
+        )
+
+    return OrderOut(
+        id=str(order.id),
+        user_id=order.user_id,
+        items=[OrderItemOut.model_validate(item) for item in order.items],
+        total_price=order.total_price,
+        order_status=order.order_status,
+        created_at=order.created_at
+    )
+
 @router.post("/", response_model=OrderOut, status_code=status.HTTP_201_CREATED)
 async def create_order(
     current_user: User = Depends(get_current_user)
@@ -31,6 +105,14 @@ async def create_order(
             error_detail = "An item in your cart was not found."
         elif order_or_error == "NOT_ENOUGH_STOCK":
             error_detail = "An item in your cart is out of stock."
+        elif order_or_error == "SOLD_OUT":
+            raise HTTPException(status_code=409, detail="An item in your cart is sold out.")
+        elif order_or_error == "CHECKOUT_BUSY":
+            raise HTTPException(
+                status_code=503,
+                detail="Too many checkouts for an item in your cart, try again shortly",
+                headers={"Retry-After": "1"},
+            )
             
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
@@ -68,6 +150,18 @@ async def create_checkout(
             raise HTTPException(status_code=400, detail="Cart is empty")
         if result == "PRODUCT_NOT_FOUND":
             raise HTTPException(status_code=404, detail="Product not found")
+        if result == "NOT_ENOUGH_STOCK":
+            raise HTTPException(status_code=409, detail="An item in your cart is out of stock.")
+        if result == "SOLD_OUT":
+            raise HTTPException(status_code=409, detail="An item in your cart is sold out.")
+        if result == "CHECKOUT_BUSY":
+            raise HTTPException(
+                status_code=503,
+                detail="Too many checkouts for an item in your cart, try again shortly",
+                headers={"Retry-After": "1"},
+            )
+        if result == "PAYMENT_UNAVAILABLE":
+            raise HTTPException(status_code=503, detail="Payments are temporarily unavailable")
         if result == "STRIPE_ERROR":
             raise HTTPException(status_code=500, detail="Could not create payment session")
     
@@ -1,12 +1,26 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from typing import Literal
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, status
 
 from app.models.user import User
-from app.schemas.product import ProductCreate, ProductOut, ProductUpdate
+from app.schemas.product import (
+    BulkResult,
+    ProductCreate,
+    ProductFilter,
+    ProductOut,
+    ProductPage,
+    ProductUpdate,
+    StockShardsUpdate
+)
 
 from app.api.dependencies import get_current_admin_user
+from app.api.responses import etag_response
+from app.core.formats import iter_csv, iter_ndjson
 
 from beanie import PydanticObjectId
 from app.services.product_service import product_service
+from app.services.bulk_service import product_bulk_service
+from app.services.catalog_service import catalog_service
+from app.services.search_service import search_service
 
 router = APIRouter()
 
@@ -27,41 +41,123 @@ async def create_product(
         stock=product.stock
     )
 
-@router.get("/", response_model=list[ProductOut])
-async def get_all_products():
+def parse_bulk_rows(request: Request):
     """
-    Get list of all products (Public)
+    Pick the row parser for the request body from its content type
     """
-    products = await product_service.get_all()
-    return [
-        ProductOut(
-            id=str(p.id),
-            name=p.name,
-            description=p.description,
-            price=p.price,
-            stock=p.stock
-        ) for p in products
-    ]
+    content_type = request.headers.get("content-type", "").split(";")[0].strip()
+    if content_type == "text/csv":
+        return iter_csv(request.stream())
+    if content_type in ("application/x-ndjson", "application/jsonl", "application/json-lines"):
+        return iter_ndjson(request.stream())
+    raise HTTPException(
+        status_code=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE,
+        detail="Send NDJSON (application/x-ndjson) or CSV (text/csv)",
+    )
+
+@router.post("/bulk/import", response_model=BulkResult)
+async def import_products(
+    request: Request,
+    _: User = Depends(get_current_admin_user)
+):
+    """
+    Create or replace products from a streamed NDJSON or CSV body (Admin only).
+    Fields: name, description, price, stock and an optional id; rows with
+    an id replace that product or create it under that id.
+    Bad rows are reported by row number and do not stop the import.
+    """
+    return await product_bulk_service.import_products(parse_bulk_rows(request))
+
+@router.post("/bulk/stock", response_model=BulkResult)
+async def update_stock(
+    request: Request,
+    _: User = Depends(get_current_admin_user)
+):
+    """
+    Add stock deltas from a streamed NDJSON or CSV body (Admin only).
+    Fields: id and delta. A negative delta is rejected for that row when
+    it would take stock below zero.
+    """
+    return await product_bulk_service.update_stock(parse_bulk_rows(request))
+
+@router.get("/", response_model=ProductPage)
+async def get_all_products(
+    request: Request,
+    limit: int = Query(20, ge=1, le=100),
+    cursor: str | None = None,
+    min_price: float | None = Query(None, ge=0),
+    max_price: float | None = Query(None, ge=0),
+    in_stock: bool = False,
+    name_prefix: str | None = Query(None, min_length=1, max_length=100),
+    sort: Literal["id", "newest", "price_asc", "price_desc"] = "id"
+):
+    """
+    Get a page of products (Public).
+    Filter by price range, stock and case-sensitive name prefix, and sort
+    by price or newest. Pass the returned next_cursor with the same
+    filters to fetch the following page. Supports If-None-Match.
+    """
+    filters = ProductFilter(
+        min_price=min_price,
+        max_price=max_price,
+        in_stock=in_stock,
+        name_prefix=name_prefix,
+        sort=sort
+    )
+    page = await catalog_service.get_page(limit, filters, cursor)
+    if not page:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid cursor",
+        )
+    return etag_response(request, page)
+
+@router.get("/search", response_model=ProductPage)
+async def search_products(
+    q: str = Query(..., min_length=1, max_length=100),
+    limit: int = Query(20, ge=1, le=100),
+    cursor: str | None = None
+):
+    """
+    Search products by name and description, best matches first (Public).
+    Pass the returned next_cursor to fetch the following page.
+    """
+    result = await search_service.search_products(q, limit, cursor)
+
+    if isinstance(result, str):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid cursor",
+        )
+
+    products, next_cursor = result
+    return ProductPage(
+        items=[
+            ProductOut(
+                id=str(p.id),
+                name=p.name,
+                description=p.description,
+                price=p.price,
+                stock=p.stock
+            ) for p in products
+        ],
+        next_cursor=next_cursor
+    )
 
 @router.get("/{id}", response_model=ProductOut)
-async def get_product_by_id(id: PydanticObjectId):
+async def get_product_by_id(request: Request, id: PydanticObjectId):
     """
-    Get  product by ID (Public)
+    Get  product by ID (Public).
+    Supports If-None-Match.
     """
-    product = await product_service.get_by_id(id)
+    product = await catalog_service.get_product(id)
     if not product:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Product not found",
         )
         
-    return ProductOut(
-        id=str(product.id),
-        name=product.name,
-        description=product.description,
-        price=product.price,
-        stock=product.stock
-    )
+    return etag_response(request, product)
 
 @router.put("/{id}", response_model=ProductOut)
 async def update_product(
@@ -88,6 +184,38 @@ async def update_product(
         stock=updated_product.stock
     )
 
+@router.put("/{id}/stock-shards", response_model=ProductOut)
+async def set_stock_shards(
+    id: PydanticObjectId,
+    shards_in: StockShardsUpdate,
+    _: User = Depends(get_current_admin_user)
+):
+    """
+    Spread a hot product's stock over several counters so concurrent
+    checkouts do not all write one document (Admin only).
+    Send shards=0 to fold the counters back into the product.
+    """
+    product = await product_service.set_stock_shards(id, shards_in.shards)
+
+    if isinstance(product, str):
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="Stock sharding is disabled (STOCK_SHARDING)",
+        )
+    if not product:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Product not found",
+        )
+
+    return ProductOut(
+        id=str(product.id),
+        name=product.name,
+        description=product.description,
+        price=product.price,
+        stock=product.stock
+    )
+
 @router.delete("/{id}", status_code=status.HTTP_204_NO_CONTENT)
 async def delete_product(
     id: PydanticObjectId,
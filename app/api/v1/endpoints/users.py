@@ -1,7 +1,8 @@
-from fastapi import APIRouter, HTTPException, status, Depends
+from fastapi import APIRouter, HTTPException, Query, status, Depends
 from app.models.user import User
-from app.schemas.user import UserCreate, UserOut
-from app.api.dependencies import get_current_user
+from app.schemas.user import UserCreate, UserOut, UserPage
+from app.api.dependencies import get_current_admin_user, get_current_user
+from app.core.security import AuthBusyError
 from app.repositories.user_repository import user_repository
 
 router = APIRouter()
@@ -29,14 +30,36 @@ async def create_user(user_in: UserCreate):
         )
     
     # Create the user
-    user = await user_repository.create(user_in)
+    try:
+        user = await user_repository.create(user_in)
+    except AuthBusyError:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Too many sign-ups in progress, try again shortly",
+            headers={"Retry-After": "1"},
+        )
     
     return user
 
-@router.get("/", response_model=list[UserOut])
-async def get_all_users():
+@router.get("/", response_model=UserPage)
+async def get_all_users(
+    limit: int = Query(50, ge=1, le=200),
+    cursor: str | None = None,
+    email_prefix: str | None = Query(None, min_length=1, max_length=254),
+    _: User = Depends(get_current_admin_user)
+):
     """
-    Get a list of all users.
+    Get a page of users in email order (Admin only).
+    Filter by case-sensitive email prefix. Pass the returned next_cursor
+    with the same filter to fetch the following page.
     """
-    users = await User.find_all().to_list()
-    return users
\ No newline at end of file
+    # Fetch one extra row to find out whether another page exists
+    users = await user_repository.get_page(limit + 1, email_prefix, cursor)
+    next_cursor = None
+    if len(users) > limit:
+        users = users[:limit]
+        next_cursor = users[-1].email
+    return UserPage(
+        items=[UserOut(**user.model_dump()) for user in users],
+        next_cursor=next_cursor
+    )
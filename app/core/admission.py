@@ -0,0 +1,113 @@
+import asyncio
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Generic, Hashable, Iterable, TypeVar
+
+from app.core.cache import TTLCache
+
+K = TypeVar("K", bound=Hashable)
+
+class AdmissionRejected(Exception):
+    """
+    Raised when a request is turned away instead of waiting its turn.
+    reason is "SOLD_OUT" or "BUSY".
+    """
+    def __init__(self, reason: str):
+        super().__init__(reason)
+        self.reason = reason
+
+class _Slot:
+    def __init__(self, concurrency: int):
+        self.semaphore = asyncio.Semaphore(concurrency)
+        self.users = 0
+        self.waiting = 0
+
+class KeyedAdmission(Generic[K]):
+    """
+    In-process admission control per key (here: per product). Requests
+    for the same key run at most `concurrency` at a time and wait their
+    turn in arrival order; the queue and the wait are both bounded.
+    Keys marked sold out are rejected straight away, including requests
+    already queued, until the mark expires or is cleared.
+    Not thread-safe: it is meant to be used from the event loop only.
+    """
+    def __init__(
+        self,
+        concurrency: int,
+        max_waiters: int,
+        timeout: float,
+        sold_out_ttl: float,
+        max_sold_out: int = 10_000
+    ):
+        self.concurrency = concurrency
+        self.max_waiters = max_waiters
+        self.timeout = timeout
+        self.sold_out: TTLCache[K, bool] = TTLCache(maxsize=max_sold_out, ttl=sold_out_ttl)
+        self._slots: dict[K, _Slot] = {}
+
+    def mark_sold_out(self, key: K) -> None:
+        self.sold_out.set(key, True)
+
+    def clear_sold_out(self, key: K | None = None) -> None:
+        """
+        Drop the sold-out mark of a key, or of every key with None
+        """
+        if key is None:
+            self.sold_out.clear()
+        else:
+            self.sold_out.pop(key)
+
+    @asynccontextmanager
+    async def admit(self, keys: Iterable[K]) -> AsyncIterator[None]:
+        """
+        Wait for a turn on every key. Keys are taken in a fixed order so
+        requests for overlapping sets of keys cannot deadlock.
+        """
+        ordered = sorted(set(keys), key=str)
+        self._check_sold_out(ordered)
+
+        acquired: list[K] = []
+        try:
+            for key in ordered:
+                await self._acquire(key)
+                acquired.append(key)
+            # The key may have sold out while this request was queued
+            self._check_sold_out(ordered)
+            yield
+        finally:
+            for key in reversed(acquired):
+                self._release(key)
+
+    def _check_sold_out(self, keys: list[K]) -> None:
+        if any(self.sold_out.get(key) for key in keys):
+            raise AdmissionRejected("SOLD_OUT")
+
+    async def _acquire(self, key: K) -> None:
+        slot = self._slots.get(key)
+        if slot is None:
+            slot = self._slots[key] = _Slot(self.concurrency)
+
+        if slot.semaphore.locked() and slot.waiting >= self.max_waiters:
+            raise AdmissionRejected("BUSY")
+
+        slot.users += 1
+        slot.waiting += 1
+        try:
+            await asyncio.wait_for(slot.semaphore.acquire(), timeout=self.timeout)
+        except BaseException as e:
+            # Timed out or cancelled while queued
+            self._leave(key, slot)
+            if isinstance(e, asyncio.TimeoutError):
+                raise AdmissionRejected("BUSY")
+            raise
+        finally:
+            slot.waiting -= 1
+
+    def _release(self, key: K) -> None:
+        slot = self._slots[key]
+        slot.semaphore.release()
+        self._leave(key, slot)
+
+    def _leave(self, key: K, slot: _Slot) -> None:
+        slot.users -= 1
+        if not slot.users:
+            del self._slots[key]
@@ -0,0 +1,168 @@
+import asyncio
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Generic, Hashable, TypeVar
+
+from app.core.config import settings
+
+K = TypeVar("K", bound=Hashable)
+V = TypeVar("V")
+
+class TTLCache(Generic[K, V]):
+    """
+    Bounded in-process cache. Entries expire after a TTL and the least
+    recently used entry is evicted once the cache is full.
+    Not thread-safe: it is meant to be used from the event loop only.
+    """
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._data: OrderedDict[K, tuple[float, V]] = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def get(self, key: K) -> V | None:
+        entry = self._data.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+
+        expires_at, value = entry
+        if expires_at <= time.monotonic():
+            self.pop(key)
+            self.misses += 1
+            return None
+
+        self._data.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def set(self, key: K, value: V, ttl: float | None = None) -> None:
+        """
+        Store a value. A per-entry ttl can only shorten the default TTL.
+        """
+        ttl = self.ttl if ttl is None else min(ttl, self.ttl)
+        if ttl <= 0 or self.maxsize <= 0:
+            return
+
+        self.pop(key)
+        self._data[key] = (time.monotonic() + ttl, value)
+        while len(self._data) > self.maxsize:
+            evicted_key, (_, evicted_value) = self._data.popitem(last=False)
+            self._on_evict(evicted_key, evicted_value)
+
+    def pop(self, key: K) -> V | None:
+        entry = self._data.pop(key, None)
+        if entry is None:
+            return None
+        self._on_evict(key, entry[1])
+        return entry[1]
+
+    def clear(self) -> None:
+        for key in list(self._data):
+            self.pop(key)
+
+    def stats(self) -> dict[str, int]:
+        return {"size": len(self._data), "hits": self.hits, "misses": self.misses}
+
+    def _on_evict(self, key: K, value: V) -> None:
+        """
+        Hook for subclasses that keep secondary indexes
+        """
+
+class SingleFlight(Generic[K, V]):
+    """
+    Collapses concurrent calls for the same key into one. Callers that
+    arrive while a call is in flight await its result instead of starting
+    their own.
+    """
+    def __init__(self):
+        self._calls: dict[K, asyncio.Future[V]] = {}
+
+    async def do(self, key: K, func: Callable[[], Awaitable[V]]) -> V:
+        call = self._calls.get(key)
+        if call is None:
+            call = asyncio.ensure_future(func())
+            self._calls[key] = call
+            call.add_done_callback(lambda _: self.forget(key, call))
+        # Shield so one cancelled caller does not cancel the call for everyone
+        return await asyncio.shield(call)
+
+    def forget(self, key: K, call: asyncio.Future | None = None) -> None:
+        """
+        Make the next caller for key start a new call
+        """
+        if call is None or self._calls.get(key) is call:
+            self._calls.pop(key, None)
+
+class ReadThroughCache(Generic[K, V]):
+    """
+    TTL/LRU cache that loads missing entries itself. Concurrent misses for
+    a key share one load, and a load that started before an invalidation
+    is not cached, so a write can never be hidden by a slow read.
+    None results are returned but not cached.
+    """
+    def __init__(self, maxsize: int, ttl: float):
+        self.entries: TTLCache[K, V] = TTLCache(maxsize, ttl)
+        self._loads: SingleFlight[K, V | None] = SingleFlight()
+        self._generation = 0
+
+    async def get(self, key: K, load: Callable[[], Awaitable[V | None]]) -> V | None:
+        value = self.entries.get(key)
+        if value is not None:
+            return value
+
+        generation = self._generation
+        value = await self._loads.do(key, load)
+        if value is not None and generation == self._generation:
+            self.entries.set(key, value)
+        return value
+
+    def invalidate(self, key: K | None = None) -> None:
+        """
+        Drop one key, or everything when key is None
+        """
+        self._generation += 1
+        if key is None:
+            self.entries.clear()
+            self._loads = SingleFlight()
+            return
+        self.entries.pop(key)
+        self._loads.forget(key)
+
+    def stats(self) -> dict[str, int]:
+        return self.entries.stats()
+
+class PrincipalCache(TTLCache[str, Any]):
+    """
+    Cache of authenticated users keyed by access token, with an index by
+    email so every token of a modified user can be dropped at once.
+    """
+    def __init__(self, maxsize: int, ttl: float):
+        super().__init__(maxsize, ttl)
+        self._tokens_by_email: dict[str, set[str]] = {}
+
+    def set(self, key: str, value: Any, ttl: float | None = None) -> None:
+        super().set(key, value, ttl)
+        if key in self._data:
+            self._tokens_by_email.setdefault(value.email, set()).add(key)
+
+    def invalidate_user(self, email: str) -> None:
+        for token in list(self._tokens_by_email.get(email, ())):
+            self.pop(token)
+
+    def _on_evict(self, key: str, value: Any) -> None:
+        tokens = self._tokens_by_email.get(value.email)
+        if tokens is None:
+            return
+        tokens.discard(key)
+        if not tokens:
+            del self._tokens_by_email[value.email]
+
+principal_cache = PrincipalCache(
+    maxsize=settings.PRINCIPAL_CACHE_SIZE,
+    ttl=settings.PRINCIPAL_CACHE_TTL_SECONDS
+)
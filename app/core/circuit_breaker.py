@@ -0,0 +1,55 @@
+import time
+
+class CircuitOpenError(Exception):
+    """
+    Raised when a call is refused because the circuit is open
+    """
+
+class CircuitBreaker:
+    """
+    Fails fast once a dependency keeps failing.
+    After failure_threshold consecutive failures the circuit opens and
+    every call is refused for reset_timeout seconds. Then a single trial
+    call is let through: success closes the circuit, failure reopens it.
+    """
+    def __init__(self, failure_threshold: int, reset_timeout: float):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self._opened_at: float | None = None
+        self._trial_in_flight = False
+
+    @property
+    def state(self) -> str:
+        if self._opened_at is None:
+            return "closed"
+        if time.monotonic() - self._opened_at >= self.reset_timeout:
+            return "half-open"
+        return "open"
+
+    def before_call(self) -> None:
+        state = self.state
+        if state == "closed":
+            return
+        if state == "half-open" and not self._trial_in_flight:
+            self._trial_in_flight = True
+            return
+        raise CircuitOpenError()
+
+    def record_success(self) -> None:
+        self.failures = 0
+        self._opened_at = None
+        self._trial_in_flight = False
+
+    def record_abandoned(self) -> None:
+        """
+        The call ended without an outcome (it was cancelled). Let the next
+        call be the trial instead of keeping the circuit half-open forever.
+        """
+        self._trial_in_flight = False
+
+    def record_failure(self) -> None:
+        self.failures += 1
+        if self._trial_in_flight or self.failures >= self.failure_threshold:
+            self._opened_at = time.monotonic()
+        self._trial_in_flight = False
@@ -6,18 +6,141 @@ class CommonSettings(BaseSettings):
 
 class DatabaseSettings(BaseSettings):
     DATABASE_URL: str
+    USE_TRANSACTIONS: bool = True
+    # Runs of a transaction that hit write conflicts before the request gives up
+    TRANSACTION_MAX_ATTEMPTS: int = 5
+    BUILD_INDEXES: bool = True
+    REQUIRE_INDEXES: bool = False
+    # Connection pool per server. Operations that wait longer than the
+    # wait-queue timeout for a connection fail instead of queueing forever.
+    MONGO_MAX_POOL_SIZE: int = 100
+    MONGO_MIN_POOL_SIZE: int = 0
+    MONGO_WAIT_QUEUE_TIMEOUT_MS: int = 2_000
+    MONGO_SERVER_SELECTION_TIMEOUT_MS: int = 5_000
+    MONGO_CONNECT_TIMEOUT_MS: int = 5_000
+    # 0 waits for a reply as long as it takes
+    MONGO_SOCKET_TIMEOUT_MS: int = 30_000
+    # Comma-separated wire compressors, e.g. "zstd,zlib"; zstd and snappy need extra packages
+    MONGO_COMPRESSORS: str = ""
+    # Read preference of product listings and search, which tolerate replication lag
+    MONGO_CATALOG_READ_PREFERENCE: str = "secondaryPreferred"
+    # After a product write, listings and search read the primary for this
+    # long, so rebuilt caches hold the write. Longer covers more replication
+    # lag at the cost of primary load while the catalog is being edited.
+    MONGO_CATALOG_PRIMARY_AFTER_WRITE_SECONDS: float = 5
 
 class JwtSettings(BaseSettings):
     SECRET_KEY: str
     ALGORITHM: str
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 30
 
+class PasswordHashSettings(BaseSettings):
+    BCRYPT_ROUNDS: int = 12
+    AUTH_HASH_WORKERS: int = 4
+    AUTH_HASH_MAX_QUEUE: int = 64
+
 class StripeSettings(BaseSettings):
     STRIPE_PUBLIC_KEY: str
     STRIPE_SECRET_KEY: str
     STRIPE_WEBHOOK_SECRET: str
+    STRIPE_API_BASE: str | None = None
+    STRIPE_CONNECT_TIMEOUT_SECONDS: float = 3
+    STRIPE_READ_TIMEOUT_SECONDS: float = 10
+    STRIPE_MAX_RETRIES: int = 2
+    STRIPE_MAX_CONCURRENCY: int = 16
+    STRIPE_BREAKER_FAILURES: int = 5
+    STRIPE_BREAKER_RESET_SECONDS: float = 30
+
+class WebhookSettings(BaseSettings):
+    WEBHOOK_WORKERS: int = 4
+    WEBHOOK_MAX_ATTEMPTS: int = 5
+    WEBHOOK_RETRY_BASE_SECONDS: float = 2
+    WEBHOOK_LEASE_SECONDS: float = 60
+    WEBHOOK_POLL_SECONDS: float = 5
+
+class SearchSettings(BaseSettings):
+    # "memory" (in-process index with prefix matching, built by every worker
+    # at startup) or "mongo" (text index, whole words only, no worker memory)
+    PRODUCT_SEARCH_BACKEND: str = "memory"
+    PRODUCT_SEARCH_MAX_RESULTS: int = 1_000
+
+class InventorySettings(BaseSettings):
+    # Route stock writes of products that have stock shards to those shards.
+    # Costs one extra lookup per checkout, so it is off unless needed.
+    STOCK_SHARDING: bool = False
+    # Per-worker checkout admission for each product: how many checkouts
+    # of it run at once, how many may queue and for how long
+    CHECKOUT_CONCURRENCY_PER_PRODUCT: int = 1
+    CHECKOUT_MAX_WAITERS_PER_PRODUCT: int = 256
+    CHECKOUT_WAIT_SECONDS: float = 2
+    # How long a product seen at zero stock is rejected without a query
+    SOLD_OUT_TTL_SECONDS: float = 2
+
+class ReservationSettings(BaseSettings):
+    # How long a Checkout Session can be paid, kept within Stripe's 31 minutes
+    # to 24 hours. Its stock hold lasts 5 minutes longer.
+    RESERVATION_TTL_SECONDS: float = 1800
+    RESERVATION_SWEEP_SECONDS: float = 30
+
+class CacheSettings(BaseSettings):
+    PRINCIPAL_CACHE_SIZE: int = 10_000
+    PRINCIPAL_CACHE_TTL_SECONDS: float = 60
+    PRODUCT_CACHE_SIZE: int = 10_000
+    PRODUCT_CACHE_TTL_SECONDS: float = 30
+    CATALOG_CACHE_SIZE: int = 1_000
+    CATALOG_CACHE_TTL_SECONDS: float = 10
+    # "local" (single worker) or "changestream" (needs a replica set)
+    CACHE_INVALIDATION_BACKEND: str = "local"
+
+class BulkSettings(BaseSettings):
+    # Rows validated and written per bulk write
+    BULK_CHUNK_SIZE: int = 1_000
+    # Row errors listed in a bulk response; the rest are only counted
+    BULK_MAX_ERRORS: int = 1_000
+    # Documents fetched and encoded per chunk of a streamed export
+    EXPORT_BATCH_SIZE: int = 1_000
+
+class SlowQuerySettings(BaseSettings):
+    # Commands slower than this are logged and aggregated; 0 turns it off
+    SLOW_QUERY_THRESHOLD_MS: float = 100
+    # Fraction of slow commands whose plan is captured with explain()
+    SLOW_QUERY_EXPLAIN_SAMPLE_RATE: float = 0.1
+    # Explains running at once; samples taken while all are busy are skipped
+    SLOW_QUERY_MAX_CONCURRENT_EXPLAINS: int = 2
+    # Distinct query shapes kept for the report
+    SLOW_QUERY_MAX_SHAPES: int = 500
+
+class ServerSettings(BaseSettings):
+    # Used by `python -m app.serve`; a plain `uvicorn app.main:app` ignores them
+    SERVER_HOST: str = "0.0.0.0"
+    SERVER_PORT: int = 8000
+    # Worker processes; 0 starts one per CPU this process may run on
+    SERVER_WORKERS: int = 0
+    SERVER_BACKLOG: int = 2048
+    # Keep idle connections open longer than the load balancer does, so it
+    # never sends a request on a connection we are closing
+    SERVER_KEEP_ALIVE_SECONDS: int = 65
+    # How long a stopping worker waits for in-flight requests
+    SERVER_GRACEFUL_SHUTDOWN_SECONDS: int = 30
+    # Pin each worker to a CPU of its own (Linux only)
+    SERVER_CPU_PINNING: bool = False
+    SERVER_ACCESS_LOG: bool = True
 
-class Settings(CommonSettings, DatabaseSettings, JwtSettings, StripeSettings):
+class Settings(
+    CommonSettings,
+    DatabaseSettings,
+    JwtSettings,
+    PasswordHashSettings,
+    StripeSettings,
+    WebhookSettings,
+    SearchSettings,
+    InventorySettings,
+    ReservationSettings,
+    CacheSettings,
+    BulkSettings,
+    SlowQuerySettings,
+    ServerSettings
+):
     class Config:
         env_file = ".env"
         env_file_encoding = "utf-8"
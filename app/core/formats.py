@@ -0,0 +1,141 @@
+import csv
+import io
+import json
+import zlib
+from datetime import datetime
+from typing import Any, AsyncIterator, Iterable, List
+
+from bson import ObjectId
+
+def _decode_line(line: bytes) -> str | ValueError:
+    try:
+        return line.rstrip(b"\r").decode("utf-8")
+    except UnicodeDecodeError as e:
+        return ValueError(f"Invalid UTF-8 at byte {e.start}")
+
+async def iter_lines(chunks: AsyncIterator[bytes]) -> AsyncIterator[str | ValueError]:
+    """
+    Split a byte stream into text lines without reading it all first.
+    A line that is not valid UTF-8 is yielded as a ValueError.
+    """
+    buffer = b""
+    async for chunk in chunks:
+        buffer += chunk
+        *lines, buffer = buffer.split(b"\n")
+        for line in lines:
+            yield _decode_line(line)
+    if buffer:
+        yield _decode_line(buffer)
+
+async def iter_ndjson(chunks: AsyncIterator[bytes]) -> AsyncIterator[tuple[int, Any]]:
+    """
+    Parse newline-delimited JSON. Yields (row number, object), or
+    (row number, ValueError) for a line that is not valid JSON.
+    Blank lines are skipped.
+    """
+    row = 0
+    async for line in iter_lines(chunks):
+        if isinstance(line, ValueError):
+            row += 1
+            yield row, line
+            continue
+        if not line.strip():
+            continue
+        row += 1
+        try:
+            yield row, json.loads(line)
+        except ValueError as e:
+            yield row, ValueError(f"Invalid JSON: {e}")
+
+async def iter_csv(chunks: AsyncIterator[bytes]) -> AsyncIterator[tuple[int, Any]]:
+    """
+    Parse CSV with a header row. Yields (row number, dict) with empty
+    cells left out. Quoted cells may span several lines.
+    """
+    header: list[str] | None = None
+    row = 0
+    pending = ""
+    async for line in iter_lines(chunks):
+        if isinstance(line, ValueError):
+            # Drop the record the line belongs to
+            row += 1
+            yield row, line
+            pending = ""
+            continue
+        pending = f"{pending}\n{line}" if pending else line
+        # An odd number of quotes means a quoted cell continues on the next line
+        if pending.count('"') % 2:
+            continue
+
+        record, pending = next(csv.reader([pending])), ""
+        if not any(cell.strip() for cell in record):
+            continue
+        if header is None:
+            header = [cell.strip() for cell in record]
+            continue
+
+        row += 1
+        if len(record) != len(header):
+            yield row, ValueError(f"Expected {len(header)} columns, got {len(record)}")
+            continue
+        yield row, {key: value for key, value in zip(header, record) if value != ""}
+
+def _json_default(value: Any) -> Any:
+    if isinstance(value, ObjectId):
+        return str(value)
+    if isinstance(value, datetime):
+        return value.isoformat()
+    raise TypeError(f"Cannot serialize {type(value).__name__}")
+
+def _csv_cell(value: Any) -> Any:
+    if value is None:
+        return ""
+    if isinstance(value, ObjectId):
+        return str(value)
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, (dict, list)):
+        return json.dumps(value, default=_json_default, separators=(",", ":"))
+    return value
+
+async def encode_ndjson(batches: AsyncIterator[List[dict]]) -> AsyncIterator[bytes]:
+    """
+    Encode batches of documents as newline-delimited JSON, one chunk per batch
+    """
+    async for batch in batches:
+        yield "".join(
+            json.dumps(doc, default=_json_default, separators=(",", ":")) + "\n"
+            for doc in batch
+        ).encode("utf-8")
+
+async def encode_csv(
+    batches: AsyncIterator[List[dict]],
+    fields: Iterable[str]
+) -> AsyncIterator[bytes]:
+    """
+    Encode batches of documents as CSV with a header row, one chunk per
+    batch. Nested values are written as JSON.
+    """
+    fields = list(fields)
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(fields)
+    async for batch in batches:
+        for doc in batch:
+            writer.writerow([_csv_cell(doc.get(field)) for field in fields])
+        yield buffer.getvalue().encode("utf-8")
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode("utf-8")
+
+async def gzip_chunks(chunks: AsyncIterator[bytes], level: int = 6) -> AsyncIterator[bytes]:
+    """
+    Compress a byte stream into a single gzip member as it goes
+    """
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+    async for chunk in chunks:
+        compressed = compressor.compress(chunk)
+        if compressed:
+            yield compressed
+    yield compressor.flush()
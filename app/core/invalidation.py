@@ -0,0 +1,110 @@
+import asyncio
+from typing import Any, Callable, Mapping
+
+from motor.motor_asyncio import AsyncIOMotorCollection
+
+# Longest wait between attempts to reopen the change stream
+STREAM_RETRY_MAX_SECONDS = 30
+
+# Called with the key and the changed fields (see InvalidationBus)
+Subscriber = Callable[[Any | None, Mapping[str, Any] | None], None]
+
+class InvalidationBus:
+    """
+    Delivers cache invalidations to subscribers.
+    This base class only reaches subscribers in the current process, which
+    is enough for a single worker. Subclasses also deliver invalidations
+    made by other workers. A key of None means "drop everything".
+    Subscribers also get the top-level fields an update changed, mapped to
+    their new values (None when removed, only partly changed or not known),
+    or None when the changed fields are not known: inserts, replaces,
+    deletes, and publishes that do not pass fields.
+    """
+    def __init__(self):
+        self._subscribers: list[Subscriber] = []
+
+    def subscribe(self, callback: Subscriber) -> None:
+        self._subscribers.append(callback)
+
+    async def publish(self, key: Any, fields: Mapping[str, Any] | None = None) -> None:
+        self._dispatch(key, fields)
+
+    async def start(self) -> None:
+        pass
+
+    async def stop(self) -> None:
+        pass
+
+    def _dispatch(self, key: Any | None, fields: Mapping[str, Any] | None = None) -> None:
+        for callback in self._subscribers:
+            callback(key, fields)
+
+class ChangeStreamInvalidationBus(InvalidationBus):
+    """
+    Invalidates by watching a collection's change stream, so every worker
+    hears about every insert, update, replace or delete, whoever made it.
+    Needs a replica set or a sharded cluster.
+    """
+    def __init__(self, get_collection: Callable[[], AsyncIOMotorCollection]):
+        super().__init__()
+        self._get_collection = get_collection
+        self._task: asyncio.Task | None = None
+
+    async def start(self) -> None:
+        self._task = asyncio.create_task(self._watch(), name="cache-invalidation")
+
+    async def stop(self) -> None:
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def _watch(self) -> None:
+        pipeline = [{"$match": {"operationType": {"$in": ["insert", "update", "replace", "delete"]}}}]
+        missed = False
+        delay = 1.0
+        while True:
+            try:
+                async with self._get_collection().watch(pipeline) as stream:
+                    if missed:
+                        # Changes may have been missed while disconnected;
+                        # drop everything once, not on every failed attempt
+                        self._dispatch(None)
+                        missed = False
+                    delay = 1.0
+                    async for change in stream:
+                        self._dispatch(change["documentKey"]["_id"], changed_fields(change))
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"Cache invalidation stream interrupted: {e}")
+                missed = True
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, STREAM_RETRY_MAX_SECONDS)
+
+def changed_fields(change: Mapping[str, Any]) -> dict[str, Any] | None:
+    """
+    The top-level fields an update event changed, with their new values
+    """
+    description = change.get("updateDescription")
+    if change["operationType"] != "update" or description is None:
+        return None
+    fields: dict[str, Any] = {}
+    for path, value in description.get("updatedFields", {}).items():
+        field, _, rest = path.partition(".")
+        fields[field] = None if rest else value
+    for path in description.get("removedFields", []):
+        fields[path.partition(".")[0]] = None
+    for truncated in description.get("truncatedArrays", []):
+        fields.setdefault(truncated["field"].partition(".")[0], None)
+    return fields
+
+def create_invalidation_bus(
+    backend: str,
+    get_collection: Callable[[], AsyncIOMotorCollection]
+) -> InvalidationBus:
+    if backend == "changestream":
+        return ChangeStreamInvalidationBus(get_collection)
+    if backend == "local":
+        return InvalidationBus()
+    raise ValueError(f"Unknown cache invalidation backend: {backend}")
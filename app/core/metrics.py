@@ -0,0 +1,338 @@
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Callable, Iterable, Iterator
+
+from pymongo import monitoring
+
+# Latency buckets in seconds, for requests and database commands alike
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def _format_labels(names: tuple[str, ...], values: tuple[str, ...], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(str(value))}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+class _Metric:
+    type = ""
+
+    def __init__(self, name: str, help: str, labelnames: Iterable[str] = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def render(self) -> Iterator[str]:
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} {self.type}"
+        yield from self._samples()
+
+    def _samples(self) -> Iterator[str]:
+        raise NotImplementedError
+
+class Counter(_Metric):
+    type = "counter"
+
+    def __init__(self, name: str, help: str, labelnames: Iterable[str] = ()):
+        super().__init__(name, help, labelnames)
+        self._values: dict[tuple[str, ...], float] = {}
+
+    def inc(self, *labels: str, amount: float = 1) -> None:
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def _samples(self) -> Iterator[str]:
+        with self._lock:
+            values = list(self._values.items())
+        for labels, value in values:
+            yield f"{self.name}{_format_labels(self.labelnames, labels)} {_format_value(value)}"
+
+class Gauge(Counter):
+    type = "gauge"
+
+    def dec(self, *labels: str, amount: float = 1) -> None:
+        self.inc(*labels, amount=-amount)
+
+    def set(self, *labels: str, value: float) -> None:
+        with self._lock:
+            self._values[labels] = value
+
+class Histogram(_Metric):
+    type = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        help: str,
+        labelnames: Iterable[str] = (),
+        buckets: Iterable[float] = DEFAULT_BUCKETS
+    ):
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # Per label set: count per bucket (the last one is +Inf), then sum
+        self._values: dict[tuple[str, ...], tuple[list[int], list[float]]] = {}
+
+    def observe(self, value: float, *labels: str) -> None:
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            entry = self._values.get(labels)
+            if entry is None:
+                entry = self._values[labels] = ([0] * (len(self.buckets) + 1), [0.0])
+            entry[0][index] += 1
+            entry[1][0] += value
+
+    def _samples(self) -> Iterator[str]:
+        with self._lock:
+            values = [(labels, list(counts), total[0]) for labels, (counts, total) in self._values.items()]
+        for labels, counts, total in values:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = f'le="{_format_value(bound)}"'
+                yield f"{self.name}_bucket{_format_labels(self.labelnames, labels, le)} {cumulative}"
+            yield f"{self.name}_sum{_format_labels(self.labelnames, labels)} {_format_value(total)}"
+            yield f"{self.name}_count{_format_labels(self.labelnames, labels)} {cumulative}"
+
+class MetricsRegistry:
+    """
+    A minimal Prometheus registry. Metrics are updated in place and
+    collectors are called at scrape time for values that live elsewhere
+    (such as cache statistics).
+    """
+    def __init__(self):
+        self._metrics: list[_Metric] = []
+        self._collectors: list[Callable[[], Iterable[_Metric]]] = []
+
+    def counter(self, name: str, help: str, labelnames: Iterable[str] = ()) -> Counter:
+        return self._add(Counter(name, help, labelnames))
+
+    def gauge(self, name: str, help: str, labelnames: Iterable[str] = ()) -> Gauge:
+        return self._add(Gauge(name, help, labelnames))
+
+    def histogram(self, name: str, help: str, labelnames: Iterable[str] = ()) -> Histogram:
+        return self._add(Histogram(name, help, labelnames))
+
+    def register_collector(self, collector: Callable[[], Iterable[_Metric]]) -> None:
+        self._collectors.append(collector)
+
+    def register_caches(self, caches: dict[str, Any]) -> None:
+        """
+        Export hits, misses and size of caches that have a stats() method
+        """
+        def collect() -> Iterable[_Metric]:
+            hits = Counter("app_cache_hits_total", "Cache lookups that found an entry.", ["cache"])
+            misses = Counter("app_cache_misses_total", "Cache lookups that found nothing.", ["cache"])
+            size = Gauge("app_cache_entries", "Entries currently cached.", ["cache"])
+            for name, cache in caches.items():
+                stats = cache.stats()
+                hits.inc(name, amount=stats["hits"])
+                misses.inc(name, amount=stats["misses"])
+                size.set(name, value=stats["size"])
+            return [hits, misses, size]
+        self.register_collector(collect)
+
+    def render(self) -> str:
+        lines: list[str] = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        for collector in self._collectors:
+            for metric in collector():
+                lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+    def _add(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+registry = MetricsRegistry()
+
+http_requests = registry.counter(
+    "http_requests_total", "HTTP requests handled.", ["method", "route", "status"]
+)
+http_requests_in_flight = registry.gauge(
+    "http_requests_in_flight", "HTTP requests being handled right now."
+)
+http_request_duration = registry.histogram(
+    "http_request_duration_seconds", "Time to handle an HTTP request.", ["method", "route"]
+)
+mongo_commands = registry.counter(
+    "mongo_commands_total", "MongoDB commands run.", ["collection", "command", "outcome"]
+)
+mongo_command_duration = registry.histogram(
+    "mongo_command_duration_seconds", "Time MongoDB commands took.", ["collection", "command"]
+)
+
+class RequestTimings:
+    """
+    Time spent per phase (db, auth, serialize) while handling one request,
+    reported in the Server-Timing header
+    """
+    def __init__(self):
+        self.durations: dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def add(self, phase: str, seconds: float) -> None:
+        with self._lock:
+            self.durations[phase] = self.durations.get(phase, 0.0) + seconds
+
+    def header(self, total: float) -> str:
+        with self._lock:
+            durations = dict(self.durations)
+        durations["total"] = total
+        return ", ".join(f"{phase};dur={seconds * 1000:.1f}" for phase, seconds in durations.items())
+
+current_timings: ContextVar[RequestTimings | None] = ContextVar("current_timings", default=None)
+
+@contextmanager
+def timed(phase: str) -> Iterator[None]:
+    """
+    Add the time spent in the block to the current request's phase
+    """
+    timings = current_timings.get()
+    if timings is None:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings.add(phase, time.perf_counter() - started)
+
+class MongoCommandListener(monitoring.CommandListener):
+    """
+    Times every MongoDB command by collection and command name, and adds
+    it to the db phase of the request that ran it. Motor runs commands on
+    its own threads but copies the caller's context, so the request's
+    timings are visible here.
+    """
+    def __init__(self):
+        self._pending: dict[tuple[Any, int], str] = {}
+        self._lock = threading.Lock()
+
+    def started(self, event: monitoring.CommandStartedEvent) -> None:
+        collection = event.command.get(event.command_name)
+        if not isinstance(collection, str):
+            collection = ""
+        with self._lock:
+            self._pending[(event.connection_id, event.request_id)] = collection
+
+    def succeeded(self, event: monitoring.CommandSucceededEvent) -> None:
+        self._finish(event, "success")
+
+    def failed(self, event: monitoring.CommandFailedEvent) -> None:
+        self._finish(event, "failure")
+
+    def _finish(self, event: Any, outcome: str) -> None:
+        with self._lock:
+            collection = self._pending.pop((event.connection_id, event.request_id), "")
+        seconds = event.duration_micros / 1_000_000
+        mongo_commands.inc(collection, event.command_name, outcome)
+        mongo_command_duration.observe(seconds, collection, event.command_name)
+
+        timings = current_timings.get()
+        if timings is not None:
+            timings.add("db", seconds)
+
+mongo_command_listener = MongoCommandListener()
+
+mongo_pool_checkout_wait = registry.histogram(
+    "mongo_pool_checkout_wait_seconds", "Time spent waiting for a pooled MongoDB connection.", ["address"]
+)
+mongo_pool_checkout_failures = registry.counter(
+    "mongo_pool_checkout_failures_total", "Connection checkouts that failed, by reason.", ["address", "reason"]
+)
+
+def _format_address(address: tuple) -> str:
+    return f"{address[0]}:{address[1]}"
+
+class MongoPoolListener(monitoring.ConnectionPoolListener):
+    """
+    Tracks each connection pool's size, connections in use and requests
+    waiting for one, so pool exhaustion shows up as a number rather than
+    as unexplained latency
+    """
+    def __init__(self):
+        self._pools: dict[str, dict[str, int]] = {}
+        self._lock = threading.Lock()
+
+    def stats(self) -> dict[str, dict[str, int]]:
+        with self._lock:
+            return {address: dict(pool) for address, pool in self._pools.items()}
+
+    def _update(self, address: tuple, **changes: int) -> None:
+        with self._lock:
+            pool = self._pools.setdefault(
+                _format_address(address), {"max_size": 0, "open": 0, "in_use": 0, "waiting": 0}
+            )
+            for name, change in changes.items():
+                pool[name] += change
+
+    def pool_created(self, event: monitoring.PoolCreatedEvent) -> None:
+        with self._lock:
+            self._pools[_format_address(event.address)] = {
+                "max_size": event.options.get("maxPoolSize", 0), "open": 0, "in_use": 0, "waiting": 0
+            }
+
+    def pool_ready(self, event: monitoring.PoolReadyEvent) -> None:
+        pass
+
+    def pool_cleared(self, event: monitoring.PoolClearedEvent) -> None:
+        pass
+
+    def pool_closed(self, event: monitoring.PoolClosedEvent) -> None:
+        with self._lock:
+            self._pools.pop(_format_address(event.address), None)
+
+    def connection_created(self, event: monitoring.ConnectionCreatedEvent) -> None:
+        self._update(event.address, open=1)
+
+    def connection_ready(self, event: monitoring.ConnectionReadyEvent) -> None:
+        pass
+
+    def connection_closed(self, event: monitoring.ConnectionClosedEvent) -> None:
+        self._update(event.address, open=-1)
+
+    def connection_check_out_started(self, event: monitoring.ConnectionCheckOutStartedEvent) -> None:
+        self._update(event.address, waiting=1)
+
+    def connection_check_out_failed(self, event: monitoring.ConnectionCheckOutFailedEvent) -> None:
+        self._update(event.address, waiting=-1)
+        address = _format_address(event.address)
+        mongo_pool_checkout_failures.inc(address, event.reason)
+        if event.duration is not None:
+            mongo_pool_checkout_wait.observe(event.duration, address)
+
+    def connection_checked_out(self, event: monitoring.ConnectionCheckedOutEvent) -> None:
+        self._update(event.address, waiting=-1, in_use=1)
+        if event.duration is not None:
+            mongo_pool_checkout_wait.observe(event.duration, _format_address(event.address))
+
+    def connection_checked_in(self, event: monitoring.ConnectionCheckedInEvent) -> None:
+        self._update(event.address, in_use=-1)
+
+mongo_pool_listener = MongoPoolListener()
+
+def _collect_pool_stats() -> Iterable[_Metric]:
+    gauges = {
+        "max_size": Gauge("mongo_pool_max_connections", "Largest size a connection pool may grow to.", ["address"]),
+        "open": Gauge("mongo_pool_connections", "Open connections in a pool.", ["address"]),
+        "in_use": Gauge("mongo_pool_connections_in_use", "Connections checked out of a pool.", ["address"]),
+        "waiting": Gauge("mongo_pool_wait_queue", "Operations waiting for a pooled connection.", ["address"]),
+    }
+    for address, pool in mongo_pool_listener.stats().items():
+        for name, gauge in gauges.items():
+            gauge.set(address, value=pool[name])
+    return gauges.values()
+
+registry.register_collector(_collect_pool_stats)
@@ -1,11 +1,33 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta, timezone
-from typing import Optional
+from functools import partial
+from typing import Callable, Optional, TypeVar
 from passlib.context import CryptContext
 from jose import jwt
 from app.core.config import settings
+from app.core.metrics import timed
+
+T = TypeVar("T")
 
 # --- HASHING ---
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+pwd_context = CryptContext(
+    schemes=["bcrypt"],
+    deprecated="auto",
+    bcrypt__rounds=settings.BCRYPT_ROUNDS
+)
+
+# bcrypt releases the GIL, so a small thread pool keeps it off the event loop
+auth_executor = ThreadPoolExecutor(
+    max_workers=settings.AUTH_HASH_WORKERS,
+    thread_name_prefix="auth-hash"
+)
+_pending_hashes = 0
+
+class AuthBusyError(Exception):
+    """
+    Raised when too many password hashes are already queued
+    """
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     return pwd_context.verify(plain_password, hashed_password)
@@ -13,6 +35,44 @@ def verify_password(plain_password: str, hashed_password: str) -> bool:
 def get_password_hash(password: str) -> str:
     return pwd_context.hash(password)
 
+async def _run_in_auth_executor(func: Callable[[], T]) -> T:
+    """
+    Run a hashing call in the auth pool, or fail fast once the number of
+    waiting calls goes over AUTH_HASH_MAX_QUEUE
+    """
+    global _pending_hashes
+
+    if _pending_hashes >= settings.AUTH_HASH_WORKERS + settings.AUTH_HASH_MAX_QUEUE:
+        raise AuthBusyError()
+
+    _pending_hashes += 1
+    try:
+        with timed("auth"):
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(auth_executor, func)
+    finally:
+        _pending_hashes -= 1
+
+async def verify_and_update_password(
+    plain_password: str, hashed_password: str
+) -> tuple[bool, Optional[str]]:
+    """
+    Verify a password off the event loop. Also returns a new hash when the
+    stored one uses outdated settings (e.g. a lower BCRYPT_ROUNDS).
+    """
+    return await _run_in_auth_executor(
+        partial(pwd_context.verify_and_update, plain_password, hashed_password)
+    )
+
+async def hash_password(password: str) -> str:
+    """
+    Hash a password off the event loop
+    """
+    return await _run_in_auth_executor(partial(pwd_context.hash, password))
+
+def shutdown_auth_executor() -> None:
+    auth_executor.shutdown(wait=False, cancel_futures=True)
+
 # --- JWT TOKEN CREATION ---
 def create_access_token(
     data: dict, expires_delta: Optional[timedelta] = None
@@ -31,4 +91,4 @@ def create_access_token(
         settings.SECRET_KEY, 
         algorithm=settings.ALGORITHM
     )
-    return encoded_jwt
\ No newline at end of file
+    return encoded_jwt
@@ -0,0 +1,283 @@
+import asyncio
+import json
+import logging
+import random
+import threading
+from datetime import datetime, timezone
+from typing import Any
+
+from pymongo import monitoring
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+# Where each command keeps the part of it that decides which documents it reads
+FILTER_FIELDS = {
+    "find": "filter",
+    "count": "query",
+    "distinct": "query",
+    "findAndModify": "query",
+    "aggregate": "pipeline",
+    "update": "updates",
+    "delete": "deletes",
+}
+
+# Fields the driver adds to a command that explain() must not be given
+DRIVER_FIELDS = {
+    "lsid", "$db", "$clusterTime", "$readPreference", "txnNumber",
+    "startTransaction", "autocommit", "readConcern", "writeConcern", "signature",
+}
+
+def redact(value: Any) -> Any:
+    """
+    Replace the values in a filter with "?" and keep its structure:
+    field names, operators and "$field" references
+    """
+    if isinstance(value, dict):
+        return {key: redact(item) for key, item in value.items()}
+    if isinstance(value, list) and value and all(isinstance(item, dict) for item in value):
+        return [redact(item) for item in value]
+    if isinstance(value, str) and value.startswith("$"):
+        return value
+    return "?"
+
+def query_shape(command_name: str, command: dict) -> dict:
+    """
+    The redacted filter (and sort, for finds) or pipeline a command ran with
+    """
+    field = FILTER_FIELDS.get(command_name)
+    if field is None:
+        return {}
+    value = command.get(field)
+    if command_name in ("update", "delete"):
+        # Shape of the first statement; a bulk write mixes many
+        value = value[0].get("q") if value else None
+
+    if command_name == "aggregate":
+        return {"pipeline": redact(value or [])}
+    shape = {"filter": redact(value or {})}
+    if command.get("sort"):
+        shape["sort"] = dict(command["sort"])
+    return shape
+
+def docs_returned(reply: dict) -> int:
+    cursor = reply.get("cursor")
+    if isinstance(cursor, dict):
+        return len(cursor.get("firstBatch", cursor.get("nextBatch", [])))
+    if "values" in reply:
+        return len(reply["values"])
+    if "value" in reply:
+        return 0 if reply["value"] is None else 1
+    return reply.get("n", 0)
+
+def summarize_plan(explained: dict) -> tuple[str, dict]:
+    """
+    Reduce an explain() result to its winning plan as "FETCH > IXSCAN price_1"
+    and its execution stats
+    """
+    planner = explained.get("queryPlanner")
+    stats = explained.get("executionStats", {})
+    if planner is None and explained.get("stages"):
+        # Aggregations report the plan of their first ($cursor) stage
+        cursor = explained["stages"][0].get("$cursor", {})
+        planner = cursor.get("queryPlanner")
+        stats = cursor.get("executionStats", {})
+
+    plan = (planner or {}).get("winningPlan", {})
+    plan = plan.get("queryPlan", plan)
+    stages = []
+    while plan:
+        stage = plan.get("stage", "?")
+        if plan.get("indexName"):
+            stage = f"{stage} {plan['indexName']}"
+        stages.append(stage)
+        plan = plan.get("inputStage") or (plan.get("inputStages") or [None])[0]
+    return " > ".join(stages), stats
+
+class QueryShapeStats:
+    """
+    How often one query shape ran slowly, and its last captured plan
+    """
+    def __init__(self, collection: str, command: str, shape: dict):
+        self.collection = collection
+        self.command = command
+        self.shape = shape
+        self.count = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+        self.docs_returned = 0
+        self.last_seen: datetime | None = None
+        self.plan: str | None = None
+        self.docs_examined: int | None = None
+        self.keys_examined: int | None = None
+
+    def to_dict(self) -> dict:
+        return {
+            "collection": self.collection,
+            "command": self.command,
+            "shape": self.shape,
+            "count": self.count,
+            "total_ms": round(self.total_ms, 3),
+            "max_ms": round(self.max_ms, 3),
+            "avg_ms": round(self.total_ms / self.count, 3) if self.count else 0.0,
+            "docs_returned": self.docs_returned,
+            "last_seen": self.last_seen,
+            "plan": self.plan,
+            "collscan": self.plan is not None and "COLLSCAN" in self.plan,
+            "docs_examined": self.docs_examined,
+            "keys_examined": self.keys_examined,
+        }
+
+class SlowQueryLog(monitoring.CommandListener):
+    """
+    Logs MongoDB commands slower than SLOW_QUERY_THRESHOLD_MS with their
+    redacted filter shape, and aggregates them by shape for a top-N report.
+    A sampled fraction is explained in the background to capture the
+    winning plan and how many documents the query examined; at most
+    max_explains at a time, so a burst of slow queries does not turn into
+    a burst of extra queries.
+    """
+    def __init__(
+        self,
+        threshold_ms: float,
+        sample_rate: float,
+        max_shapes: int,
+        max_explains: int
+    ):
+        self.threshold_ms = threshold_ms
+        self.sample_rate = sample_rate
+        self.max_shapes = max_shapes
+        self.max_explains = max_explains
+        self._pending: dict[tuple[Any, int], dict] = {}
+        self._shapes: dict[tuple[str, str, str], QueryShapeStats] = {}
+        self._lock = threading.Lock()
+        self._client: Any = None
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._explaining: set[tuple[str, str, str]] = set()
+        self._tasks: set[asyncio.Task] = set()
+
+    def start(self, client: Any) -> None:
+        """
+        Let sampled slow queries be explained through this client
+        """
+        self._client = client
+        self._loop = asyncio.get_running_loop()
+
+    async def stop(self) -> None:
+        self._client = None
+        for task in list(self._tasks):
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+
+    def started(self, event: monitoring.CommandStartedEvent) -> None:
+        if self.threshold_ms <= 0 or event.command_name not in FILTER_FIELDS:
+            return
+        with self._lock:
+            self._pending[(event.connection_id, event.request_id)] = event.command
+
+    def succeeded(self, event: monitoring.CommandSucceededEvent) -> None:
+        with self._lock:
+            command = self._pending.pop((event.connection_id, event.request_id), None)
+        if command is None:
+            return
+        duration_ms = event.duration_micros / 1000
+        if duration_ms >= self.threshold_ms:
+            self.record(event.database_name, event.command_name, command, duration_ms, event.reply)
+
+    def failed(self, event: monitoring.CommandFailedEvent) -> None:
+        with self._lock:
+            self._pending.pop((event.connection_id, event.request_id), None)
+
+    def record(
+        self,
+        database: str,
+        command_name: str,
+        command: dict,
+        duration_ms: float,
+        reply: dict
+    ) -> None:
+        collection = command.get(command_name)
+        collection = collection if isinstance(collection, str) else ""
+        shape = query_shape(command_name, command)
+        shape_json = json.dumps(shape, default=str)
+        returned = docs_returned(reply)
+        logger.warning(
+            "Slow query: %s.%s took %.1fms, returned %d docs, shape %s",
+            collection, command_name, duration_ms, returned, shape_json
+        )
+
+        key = (collection, command_name, shape_json)
+        with self._lock:
+            stats = self._shapes.get(key)
+            if stats is None:
+                if len(self._shapes) >= self.max_shapes:
+                    # Forget the shape that has cost the least so far
+                    cheapest = min(self._shapes, key=lambda k: self._shapes[k].total_ms)
+                    del self._shapes[cheapest]
+                stats = self._shapes[key] = QueryShapeStats(collection, command_name, shape)
+            stats.count += 1
+            stats.total_ms += duration_ms
+            stats.max_ms = max(stats.max_ms, duration_ms)
+            stats.docs_returned += returned
+            stats.last_seen = datetime.now(timezone.utc)
+
+        if self._loop is not None and random.random() < self.sample_rate:
+            # Listeners run on the driver's threads; explain on the event loop
+            self._loop.call_soon_threadsafe(self._schedule_explain, key, database, command)
+
+    def top(self, limit: int = 20, sort: str = "total_ms") -> list[dict]:
+        with self._lock:
+            report = [stats.to_dict() for stats in self._shapes.values()]
+        report.sort(key=lambda entry: entry[sort], reverse=True)
+        return report[:limit]
+
+    def reset(self) -> None:
+        with self._lock:
+            self._shapes.clear()
+
+    def _schedule_explain(self, key: tuple[str, str, str], database: str, command: dict) -> None:
+        if (
+            self._client is None
+            or key in self._explaining
+            or len(self._explaining) >= self.max_explains
+        ):
+            return
+        self._explaining.add(key)
+        task = asyncio.create_task(self._explain(key, database, command))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _explain(self, key: tuple[str, str, str], database: str, command: dict) -> None:
+        try:
+            explained = await self._client[database].command({
+                "explain": {k: v for k, v in command.items() if k not in DRIVER_FIELDS},
+                "verbosity": "executionStats",
+            })
+            plan, stats = summarize_plan(explained)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.warning("Could not explain slow query %s.%s: %s", key[0], key[1], e)
+            return
+        finally:
+            self._explaining.discard(key)
+
+        with self._lock:
+            shape_stats = self._shapes.get(key)
+            if shape_stats is not None:
+                shape_stats.plan = plan
+                shape_stats.docs_examined = stats.get("totalDocsExamined")
+                shape_stats.keys_examined = stats.get("totalKeysExamined")
+        logger.warning(
+            "Slow query plan: %s.%s %s, examined %s docs / %s keys to return %s",
+            key[0], key[1], plan, stats.get("totalDocsExamined"),
+            stats.get("totalKeysExamined"), stats.get("nReturned")
+        )
+
+slow_query_log = SlowQueryLog(
+    threshold_ms=settings.SLOW_QUERY_THRESHOLD_MS,
+    sample_rate=settings.SLOW_QUERY_EXPLAIN_SAMPLE_RATE,
+    max_shapes=settings.SLOW_QUERY_MAX_SHAPES,
+    max_explains=settings.SLOW_QUERY_MAX_CONCURRENT_EXPLAINS
+)
@@ -1,22 +1,171 @@
-from beanie import init_beanie
-from motor.motor_asyncio import AsyncIOMotorClient
+import asyncio
+import random
+from typing import Any, Awaitable, Callable, Iterable, TypeVar
+
+from beanie import Document, init_beanie
+from motor.motor_asyncio import AsyncIOMotorClient, AsyncIOMotorClientSession
+from pymongo.errors import PyMongoError
 from app.core.config import settings
+from app.core.metrics import mongo_command_listener, mongo_pool_listener
+from app.core.slow_queries import slow_query_log
 
 from app.models.user import User
 from app.models.product import Product
 from app.models.cart import Cart
 from app.models.order import Order
+from app.models.reservation import Reservation
+from app.models.stock_shard import StockShard
+from app.models.webhook_event import WebhookEvent, WebhookDeadLetter
+
+DOCUMENT_MODELS: list[type[Document]] = [
+    User, Product, Cart, Order, Reservation, StockShard, WebhookEvent, WebhookDeadLetter
+]
+
+T = TypeVar("T")
+
+# First retry of a conflicting transaction waits up to this long, doubling after
+TRANSACTION_RETRY_BASE_SECONDS = 0.01
+
+client: AsyncIOMotorClient | None = None
+supports_transactions: bool = False
 
 async def init_db():
+    global client, supports_transactions
+
     db_url = settings.DATABASE_URL
     if not db_url:
         raise ValueError("DATABASE_URL not set")
 
-    client = AsyncIOMotorClient(db_url)
+    options = {}
+    if settings.MONGO_COMPRESSORS:
+        options["compressors"] = settings.MONGO_COMPRESSORS
+    client = AsyncIOMotorClient(
+        db_url,
+        maxPoolSize=settings.MONGO_MAX_POOL_SIZE,
+        minPoolSize=settings.MONGO_MIN_POOL_SIZE,
+        waitQueueTimeoutMS=settings.MONGO_WAIT_QUEUE_TIMEOUT_MS,
+        serverSelectionTimeoutMS=settings.MONGO_SERVER_SELECTION_TIMEOUT_MS,
+        connectTimeoutMS=settings.MONGO_CONNECT_TIMEOUT_MS,
+        socketTimeoutMS=settings.MONGO_SOCKET_TIMEOUT_MS or None,
+        event_listeners=[mongo_command_listener, mongo_pool_listener, slow_query_log],
+        **options
+    )
+    slow_query_log.start(client)
 
+    # Beanie creates the indexes declared in each document's Settings
     await init_beanie(
         database=client.get_default_database(), # pyright: ignore[reportArgumentType]
-        document_models=[User, Product, Cart, Order]
+        document_models=DOCUMENT_MODELS,
+        skip_indexes=not settings.BUILD_INDEXES
+    )
+
+    missing = await find_missing_indexes()
+    if missing:
+        message = f"Missing MongoDB indexes: {', '.join(missing)}"
+        if settings.REQUIRE_INDEXES:
+            raise RuntimeError(message)
+        print(f"WARNING: {message}")
+
+    # Multi-document transactions need a replica set or a sharded cluster
+    hello = await client.admin.command("hello")
+    supports_transactions = settings.USE_TRANSACTIONS and (
+        "setName" in hello or hello.get("msg") == "isdbgrid"
     )
     
-    print("Database connection initialized...")
\ No newline at end of file
+    print(f"Database connection initialized (transactions: {supports_transactions})...")
+
+def close_db() -> None:
+    """
+    Close every pooled connection. Call once the background workers that
+    use the database have stopped.
+    """
+    global client
+    if client is not None:
+        client.close()
+        client = None
+
+def _key_signature(key: Iterable[tuple[str, Any]], weights: dict | None) -> tuple:
+    """
+    A key pattern that compares equal whether it was declared or read back.
+    The server stores a text index's fields as _fts/_ftsx keys and lists
+    them in its weights instead.
+    """
+    key = list(key)
+    if weights is None:
+        text_fields = {field for field, kind in key if kind == "text"}
+    else:
+        text_fields = set(weights)
+    plain = tuple(
+        (field, kind) for field, kind in key
+        if kind != "text" and field not in ("_fts", "_ftsx")
+    )
+    return plain, frozenset(text_fields)
+
+async def find_missing_indexes() -> list[str]:
+    """
+    Compare the indexes declared on every document with the ones that
+    exist in the database. Returns "collection.index_name" for each
+    declared index whose key pattern is not present.
+    """
+    missing = []
+    for model in DOCUMENT_MODELS:
+        declared = model.get_settings().indexes or []
+        existing = await model.get_pymongo_collection().index_information()
+        existing_keys = {
+            _key_signature(info["key"], info.get("weights")) for info in existing.values()
+        }
+
+        for index in declared:
+            # Beanie wraps declared IndexModels in IndexModelField when it builds them
+            spec = getattr(index, "index", index).document
+            if _key_signature(spec["key"].items(), None) not in existing_keys:
+                missing.append(f"{model.get_collection_name()}.{spec['name']}")
+    return missing
+
+class TransactionConflict(Exception):
+    """
+    Raised when a transaction still conflicted with concurrent writes
+    after every retry
+    """
+
+async def run_in_transaction(
+    func: Callable[[AsyncIOMotorClientSession | None], Awaitable[T]]
+) -> T:
+    """
+    Run func inside a multi-document transaction when the deployment
+    supports it, otherwise call it with None and let it compensate itself.
+    The transaction is aborted if func raises. Transient errors, such as a
+    write conflict with a concurrent checkout of the same product, run func
+    again from the start with a short jittered backoff, up to
+    TRANSACTION_MAX_ATTEMPTS times, then raise TransactionConflict.
+    """
+    if client is None or not supports_transactions:
+        return await func(None)
+
+    async with await client.start_session() as session:
+        for attempt in range(1, settings.TRANSACTION_MAX_ATTEMPTS + 1):
+            try:
+                async with session.start_transaction():
+                    result = await func(session)
+                    await _commit(session)
+                return result
+            except PyMongoError as e:
+                if not e.has_error_label("TransientTransactionError"):
+                    raise
+                if attempt == settings.TRANSACTION_MAX_ATTEMPTS:
+                    raise TransactionConflict(str(e)) from e
+            await asyncio.sleep(random.uniform(0, TRANSACTION_RETRY_BASE_SECONDS * 2 ** attempt))
+    raise AssertionError("unreachable")
+
+async def _commit(session: AsyncIOMotorClientSession) -> None:
+    """
+    Commit, retrying only the commit while its outcome is unknown, so a
+    commit that did apply is never followed by a second run of the body
+    """
+    for attempt in range(1, settings.TRANSACTION_MAX_ATTEMPTS + 1):
+        try:
+            await session.commit_transaction()
+            return
+        except PyMongoError as e:
+            if not e.has_error_label("UnknownTransactionCommitResult") or attempt == settings.TRANSACTION_MAX_ATTEMPTS:
+                raise
@@ -1,8 +1,20 @@
-from fastapi import FastAPI
-import stripe
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, PlainTextResponse
+from pymongo.errors import WaitQueueTimeoutError
 from contextlib import asynccontextmanager
-from app.db import init_db
+from app.db import close_db, init_db
 from app.core.config import settings
+from app.core.cache import principal_cache
+from app.core.metrics import registry
+from app.core.slow_queries import slow_query_log
+from app.core.security import shutdown_auth_executor
+from app.api.responses import TimedJSONResponse
+from app.services.catalog_service import catalog_service
+from app.services.product_service import product_service
+from app.services.reservation_service import reservation_service
+from app.services.search_service import search_service
+from app.services.stripe_service import stripe_service
+from app.services.webhook_service import webhook_service
 
 from app.api.v1.endpoints import users
 from app.api.v1.endpoints import auth
@@ -10,22 +22,41 @@ from app.api.v1.endpoints import products
 from app.api.v1.endpoints import cart
 from app.api.v1.endpoints import orders
 from app.api.v1.endpoints import webhooks
+from app.api.v1.endpoints import exports
+from app.api.v1.endpoints import diagnostics
 
 from app.middleware import setup_middleware
+from app.serve import pin_worker_to_cpu
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     print("FastAPI app starting up...")
-    stripe.api_key = settings.STRIPE_SECRET_KEY
+    if settings.SERVER_CPU_PINNING:
+        cpu = pin_worker_to_cpu()
+        if cpu is not None:
+            print(f"Worker pinned to CPU {cpu}")
     await init_db()
+    await product_service.invalidation_bus.start()
+    await search_service.backend.start()
+    webhook_service.start()
+    reservation_service.start()
     yield
     print("FastAPI app shutting down...")
+    await reservation_service.stop()
+    await search_service.backend.stop()
+    await product_service.invalidation_bus.stop()
+    await webhook_service.stop()
+    await slow_query_log.stop()
+    shutdown_auth_executor()
+    stripe_service.close()
+    close_db()
 
 app = FastAPI(
     title=settings.APP_NAME,
     description=" API for an e-commerce platform.",
     version="0.1.0",
-    lifespan=lifespan
+    lifespan=lifespan,
+    default_response_class=TimedJSONResponse
 )
 
 setup_middleware(app)
@@ -37,7 +68,34 @@ app.include_router(products.router, prefix="/api/v1/products", tags=["Products"]
 app.include_router(cart.router, prefix="/api/v1/cart", tags=["Shopping Cart"])
 app.include_router(orders.router, prefix="/api/v1/orders", tags=["Orders"])
 app.include_router(webhooks.router, prefix="/api/v1/webhooks", tags=["Webhooks"])
+app.include_router(exports.router, prefix="/api/v1/exports", tags=["Exports"])
+app.include_router(diagnostics.router, prefix="/api/v1/diagnostics", tags=["Diagnostics"])
+
+@app.exception_handler(WaitQueueTimeoutError)
+async def database_busy(request: Request, exc: WaitQueueTimeoutError):
+    """
+    Every pooled connection stayed busy for MONGO_WAIT_QUEUE_TIMEOUT_MS
+    """
+    return JSONResponse(
+        status_code=503,
+        content={"detail": "The database is busy, try again shortly"},
+        headers={"Retry-After": "1"}
+    )
 
 @app.get("/")
 def read_root():
-    return {"message": "Welcome to the E-Commerce API!"}
\ No newline at end of file
+    return {"message": "Welcome to the E-Commerce API!"}
+
+registry.register_caches({
+    "principal": principal_cache,
+    "product": product_service.cache,
+    "catalog_pages": catalog_service.pages,
+    "catalog_details": catalog_service.details,
+})
+
+@app.get("/metrics", response_class=PlainTextResponse, include_in_schema=False)
+def metrics():
+    """
+    Prometheus metrics of this worker
+    """
+    return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4")
\ No newline at end of file
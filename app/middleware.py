@@ -1,5 +1,74 @@
+import time
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from starlette.datastructures import MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.core.metrics import (
+    current_timings,
+    http_request_duration,
+    http_requests,
+    http_requests_in_flight,
+    RequestTimings
+)
+
+def route_template(scope: Scope) -> str:
+    """
+    The full path template of the matched route, e.g.
+    "/api/v1/products/{product_id}", or "unmatched"
+    """
+    route = scope.get("route")
+    template = getattr(route, "path", None)
+    if template is None:
+        return "unmatched"
+    path_regex = getattr(route, "path_regex", None)
+    path = scope["path"]
+    if path_regex is None or path_regex.match(path):
+        return template
+    # Routes of an included router may only know their path below the
+    # router's prefix: the prefix is whatever precedes the part they match
+    for i, char in enumerate(path):
+        if char == "/" and path_regex.match(path[i:]):
+            return path[:i] + template
+    return template
+
+class MetricsMiddleware:
+    """
+    Counts and times every HTTP request by route template, tracks requests
+    in flight, and reports per-phase timings in a Server-Timing header.
+    Plain ASGI, so streamed responses pass through untouched.
+    """
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        timings = RequestTimings()
+        token = current_timings.set(timings)
+        started = time.perf_counter()
+        status_code = 500
+
+        async def send_with_timing(message: Message) -> None:
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                headers = MutableHeaders(scope=message)
+                headers.append("Server-Timing", timings.header(time.perf_counter() - started))
+            await send(message)
+
+        http_requests_in_flight.inc()
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            http_requests_in_flight.dec()
+            current_timings.reset(token)
+            # The route template keeps the label set small; unmatched paths share one
+            route = route_template(scope)
+            http_requests.inc(scope["method"], route, str(status_code))
+            http_request_duration.observe(time.perf_counter() - started, scope["method"], route)
 
 def setup_middleware(app: FastAPI):
     """
@@ -17,4 +86,6 @@ def setup_middleware(app: FastAPI):
         allow_headers=["*"],    # Allow all headers
     )
     
+    app.add_middleware(MetricsMiddleware)
+    
     print("Middleware setup complete.")
\ No newline at end of file
@@ -1,6 +1,7 @@
 from beanie import Document, PydanticObjectId
 from pydantic import BaseModel
 from typing import List
+from pymongo import ASCENDING, IndexModel
 
 class CartItem(BaseModel):
     product_id: PydanticObjectId
@@ -11,4 +12,7 @@ class Cart(Document):
     items: List[CartItem] = []
 
     class Settings:
-        name = "carts"
\ No newline at end of file
+        name = "carts"
+        indexes = [
+            IndexModel([("user_id", ASCENDING)], name="user_id_unique", unique=True),
+        ]
\ No newline at end of file
@@ -1,7 +1,8 @@
 from beanie import Document, PydanticObjectId
 from pydantic import BaseModel, Field
-from typing import List
+from typing import List, Optional
 from datetime import datetime
+from pymongo import ASCENDING, DESCENDING, IndexModel
 
 class OrderItem(BaseModel):
     product_id: PydanticObjectId
@@ -14,6 +15,38 @@ class Order(Document):
     total_price: float
     order_status: str = "pending"
     created_at: datetime = Field(default_factory=datetime.now)
+    checkout_session_id: Optional[str] = None
 
     class Settings:
-        name = "orders"
\ No newline at end of file
+        name = "orders"
+        indexes = [
+            IndexModel(
+                [("user_id", ASCENDING), ("created_at", DESCENDING), ("_id", DESCENDING)],
+                name="user_id_created_at"
+            ),
+            IndexModel(
+                [
+                    ("user_id", ASCENDING),
+                    ("order_status", ASCENDING),
+                    ("created_at", DESCENDING),
+                    ("_id", DESCENDING)
+                ],
+                name="user_id_status_created_at"
+            ),
+            # One order per Stripe Checkout Session, so webhook retries are idempotent
+            IndexModel(
+                [("checkout_session_id", ASCENDING)],
+                name="checkout_session_id_unique",
+                unique=True,
+                partialFilterExpression={"checkout_session_id": {"$type": "string"}}
+            ),
+        ]
+
+class OrderSummaryView(BaseModel):
+    """
+    Projection of an order without its line items
+    """
+    id: PydanticObjectId = Field(alias="_id")
+    total_price: float
+    order_status: str
+    created_at: datetime
\ No newline at end of file
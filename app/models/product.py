@@ -1,10 +1,56 @@
-from beanie import Document
+from beanie import Document, PydanticObjectId
+from pydantic import BaseModel, Field
+from pymongo import ASCENDING, TEXT, IndexModel
 
 class Product(Document):
     name: str
     description: str
     price: float
+    # Available to sell; units held by checkout reservations are not included
     stock: int = 0
+    # Units held by open reservations, waiting for payment
+    reserved: int = 0
+    # Hot products can keep stock and reserved in this many StockShard
+    # documents; stock here is then only a snapshot for listing filters
+    stock_shards: int = 0
 
     class Settings:
-        name = "products"
\ No newline at end of file
+        name = "products"
+        indexes = [
+            IndexModel(
+                [("name", TEXT), ("description", TEXT)],
+                name="name_description_text",
+                weights={"name": 10, "description": 1}
+            ),
+            # Listing indexes, one per sort order. The sort fields lead, so
+            # pages come back in index order without a blocking sort; the
+            # filter fields follow, so they are checked on the index keys
+            # without fetching documents that do not match.
+            IndexModel(
+                [("_id", ASCENDING), ("price", ASCENDING), ("stock", ASCENDING), ("name", ASCENDING)],
+                name="id_price_stock_name"
+            ),
+            IndexModel(
+                [("price", ASCENDING), ("_id", ASCENDING), ("stock", ASCENDING), ("name", ASCENDING)],
+                name="price_id_stock_name"
+            ),
+        ]
+
+class ProductListView(BaseModel):
+    """
+    Projection of the fields returned by the public product listing
+    """
+    id: PydanticObjectId = Field(alias="_id")
+    name: str
+    description: str
+    price: float
+    stock: int
+    stock_shards: int = 0
+
+class ProductSearchView(BaseModel):
+    """
+    Projection of the fields indexed by the in-process search backend
+    """
+    id: PydanticObjectId = Field(alias="_id")
+    name: str
+    description: str
@@ -0,0 +1,31 @@
+from beanie import Document, PydanticObjectId
+from pydantic import Field
+from typing import List, Optional
+from datetime import datetime
+from pymongo import ASCENDING, IndexModel
+from app.models.order import OrderItem
+from app.models.webhook_event import utc_now
+
+class Reservation(Document):
+    """
+    Stock held for a user between creating a checkout and paying for it.
+    The held units are already taken off Product.stock and counted in
+    Product.reserved, so available-to-sell is simply Product.stock.
+    """
+    user_id: PydanticObjectId
+    items: List[OrderItem]
+    total_price: float
+    # "held", then "converted" into an order or "released" back to stock
+    status: str = "held"
+    expires_at: datetime
+    # The Stripe Checkout Session paying for it, once created
+    checkout_session_id: Optional[str] = None
+    created_at: datetime = Field(default_factory=utc_now)
+
+    class Settings:
+        name = "reservations"
+        indexes = [
+            # The sweeper looks for held reservations past their expiry
+            IndexModel([("status", ASCENDING), ("expires_at", ASCENDING)], name="status_expires_at"),
+            IndexModel([("user_id", ASCENDING), ("status", ASCENDING)], name="user_id_status"),
+        ]
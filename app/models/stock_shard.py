@@ -0,0 +1,23 @@
+from beanie import Document, PydanticObjectId
+from pymongo import ASCENDING, IndexModel
+
+class StockShard(Document):
+    """
+    One slice of a hot product's inventory. Sharded products keep their
+    available and reserved units spread over several of these, so
+    concurrent checkouts write different documents.
+    """
+    product_id: PydanticObjectId
+    shard: int
+    stock: int = 0
+    reserved: int = 0
+
+    class Settings:
+        name = "stock_shards"
+        indexes = [
+            IndexModel(
+                [("product_id", ASCENDING), ("shard", ASCENDING)],
+                name="product_id_shard_unique",
+                unique=True
+            ),
+        ]
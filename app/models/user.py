@@ -1,5 +1,6 @@
 from beanie import Document
-from pydantic import EmailStr
+from pydantic import BaseModel, EmailStr
+from pymongo import ASCENDING, IndexModel
 
 class User(Document):
     first_name: str
@@ -9,4 +10,16 @@ class User(Document):
     is_admin: bool = False
 
     class Settings:
-        name = "users"
\ No newline at end of file
+        name = "users"
+        indexes = [
+            IndexModel([("email", ASCENDING)], name="email_unique", unique=True),
+        ]
+
+class UserListView(BaseModel):
+    """
+    Projection of a user for listings, without the password hash
+    """
+    first_name: str
+    last_name: str
+    email: EmailStr
+    is_admin: bool = False
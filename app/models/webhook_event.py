@@ -0,0 +1,49 @@
+from beanie import Document
+from pydantic import Field
+from typing import Any, Dict, Optional
+from datetime import datetime, timezone
+from pymongo import ASCENDING, IndexModel
+
+def utc_now() -> datetime:
+    return datetime.now(timezone.utc)
+
+class WebhookEvent(Document):
+    """
+    A Stripe event waiting to be processed, keyed by its Stripe event id
+    """
+    event_id: str
+    type: str
+    payload: Dict[str, Any]
+    status: str = "pending"
+    attempts: int = 0
+    next_attempt_at: datetime = Field(default_factory=utc_now)
+    locked_until: Optional[datetime] = None
+    last_error: Optional[str] = None
+    created_at: datetime = Field(default_factory=utc_now)
+
+    class Settings:
+        name = "webhook_events"
+        indexes = [
+            IndexModel([("event_id", ASCENDING)], name="event_id_unique", unique=True),
+            IndexModel(
+                [("status", ASCENDING), ("next_attempt_at", ASCENDING)],
+                name="status_next_attempt_at"
+            ),
+        ]
+
+class WebhookDeadLetter(Document):
+    """
+    A Stripe event that could not be processed and needs a human
+    """
+    event_id: str
+    type: str
+    payload: Dict[str, Any]
+    attempts: int
+    error: str
+    failed_at: datetime = Field(default_factory=utc_now)
+
+    class Settings:
+        name = "webhook_dead_letters"
+        indexes = [
+            IndexModel([("event_id", ASCENDING)], name="event_id_unique", unique=True),
+        ]
@@ -1,5 +1,8 @@
 from app.models.cart import Cart
 from beanie import PydanticObjectId
+from motor.motor_asyncio import AsyncIOMotorClientSession
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
 
 class CartRepository:
     async def get_by_user_id(self, user_id: PydanticObjectId) -> Cart | None:
@@ -8,19 +11,114 @@ class CartRepository:
         """
         return await Cart.find_one(Cart.user_id == user_id)
 
-    async def create(self, user_id: PydanticObjectId) -> Cart:
+    async def get_or_create(self, user_id: PydanticObjectId) -> Cart:
         """
-        Create new cart for user
+        Get cart by user_id, creating an empty one in the same round trip
         """
-        cart = Cart(user_id=user_id, items=[])
-        await cart.insert()
-        return cart
+        document = await Cart.get_pymongo_collection().find_one_and_update(
+            {"user_id": user_id},
+            {"$setOnInsert": {"items": []}},
+            upsert=True,
+            return_document=ReturnDocument.AFTER
+        )
+        return Cart.model_validate(document)
 
-    async def update(self, cart: Cart) -> Cart:
+    async def push_item(
+        self,
+        user_id: PydanticObjectId,
+        product_id: PydanticObjectId,
+        quantity: int
+    ) -> Cart | None:
         """
-        Save changes to cart document
+        Append an item to the cart, creating the cart if needed.
+        Returns None if the product is already in the cart.
         """
-        await cart.save()
-        return cart
+        for attempt in range(2):
+            try:
+                document = await Cart.get_pymongo_collection().find_one_and_update(
+                    {"user_id": user_id, "items.product_id": {"$ne": product_id}},
+                    {"$push": {"items": {"product_id": product_id, "quantity": quantity}}},
+                    upsert=True,
+                    return_document=ReturnDocument.AFTER
+                )
+                return Cart.model_validate(document)
+            except DuplicateKeyError:
+                # The upsert ran into the unique user_id index: either the
+                # cart holds the product, or a concurrent first add created
+                # the cart. Once the cart exists, a retry settles which.
+                if attempt:
+                    return None
+        return None
 
-cart_repository = CartRepository()
\ No newline at end of file
+    async def increment_item(
+        self,
+        user_id: PydanticObjectId,
+        product_id: PydanticObjectId,
+        quantity: int,
+        max_quantity: int
+    ) -> Cart | None:
+        """
+        Add to the quantity of an item already in the cart, as long as the
+        new quantity stays within max_quantity
+        """
+        document = await Cart.get_pymongo_collection().find_one_and_update(
+            {
+                "user_id": user_id,
+                "items": {"$elemMatch": {
+                    "product_id": product_id,
+                    "quantity": {"$lte": max_quantity - quantity}
+                }}
+            },
+            {"$inc": {"items.$.quantity": quantity}},
+            return_document=ReturnDocument.AFTER
+        )
+        return Cart.model_validate(document) if document else None
+
+    async def set_item_quantity(
+        self,
+        user_id: PydanticObjectId,
+        product_id: PydanticObjectId,
+        quantity: int
+    ) -> Cart | None:
+        """
+        Set the quantity of an item in the cart.
+        Returns None if the product is not in the cart.
+        """
+        document = await Cart.get_pymongo_collection().find_one_and_update(
+            {"user_id": user_id, "items.product_id": product_id},
+            {"$set": {"items.$.quantity": quantity}},
+            return_document=ReturnDocument.AFTER
+        )
+        return Cart.model_validate(document) if document else None
+
+    async def pull_item(
+        self,
+        user_id: PydanticObjectId,
+        product_id: PydanticObjectId
+    ) -> Cart | None:
+        """
+        Remove an item from the cart.
+        Returns None if the product is not in the cart.
+        """
+        document = await Cart.get_pymongo_collection().find_one_and_update(
+            {"user_id": user_id, "items.product_id": product_id},
+            {"$pull": {"items": {"product_id": product_id}}},
+            return_document=ReturnDocument.AFTER
+        )
+        return Cart.model_validate(document) if document else None
+
+    async def clear(
+        self,
+        user_id: PydanticObjectId,
+        session: AsyncIOMotorClientSession | None = None
+    ) -> None:
+        """
+        Empty the user's cart
+        """
+        await Cart.get_pymongo_collection().update_one(
+            {"user_id": user_id},
+            {"$set": {"items": []}},
+            session=session
+        )
+
+cart_repository = CartRepository()
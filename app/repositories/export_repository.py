@@ -0,0 +1,33 @@
+from typing import AsyncIterator, Iterable, List, Type
+from beanie import Document
+
+class ExportRepository:
+    async def iter_batches(
+        self,
+        model: Type[Document],
+        fields: Iterable[str],
+        batch_size: int
+    ) -> AsyncIterator[List[dict]]:
+        """
+        Stream a whole collection in _id order as raw documents, one batch
+        at a time. Only the given fields are projected, in the given order;
+        "id" maps to _id and missing fields come out as None.
+        """
+        fields = list(fields)
+        projection = {field: 1 for field in fields if field != "id"}
+        if "id" not in fields:
+            projection["_id"] = 0
+
+        cursor = model.get_pymongo_collection().find(
+            {}, projection, batch_size=batch_size
+        ).sort("_id", 1)
+        while True:
+            batch = await cursor.to_list(length=batch_size)
+            if not batch:
+                return
+            yield [
+                {field: doc.get("_id" if field == "id" else field) for field in fields}
+                for doc in batch
+            ]
+
+export_repository = ExportRepository()
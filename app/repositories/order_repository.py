@@ -1,12 +1,19 @@
-from app.models.order import Order
+from datetime import datetime
+from typing import Any, List
+from app.models.order import Order, OrderSummaryView
 from beanie import PydanticObjectId
+from motor.motor_asyncio import AsyncIOMotorClientSession
 
 class OrderRepository:
-    async def create(self, order: Order) -> Order:
+    async def create(
+        self,
+        order: Order,
+        session: AsyncIOMotorClientSession | None = None
+    ) -> Order:
         """
         Creates new Order document in the database
         """
-        await order.insert()
+        await order.insert(session=session)
         return order
 
     async def get_by_id(self, order_id: PydanticObjectId) -> Order | None:
@@ -15,10 +22,50 @@ class OrderRepository:
         """
         return await Order.get(order_id)
     
-    async def get_all_for_user(self, user_id: PydanticObjectId) -> list[Order]:
+    async def get_by_checkout_session_id(self, checkout_session_id: str) -> Order | None:
         """
-        Get all orders for specific user
+        Get the order created for a Stripe Checkout Session
         """
-        return await Order.find(Order.user_id == user_id).to_list()
+        return await Order.find_one(Order.checkout_session_id == checkout_session_id)
 
-order_repository = OrderRepository()
\ No newline at end of file
+    async def get_page_for_user(
+        self,
+        user_id: PydanticObjectId,
+        limit: int,
+        after: tuple[datetime, PydanticObjectId] | None = None,
+        order_status: str | None = None,
+        created_from: datetime | None = None,
+        created_to: datetime | None = None
+    ) -> List[OrderSummaryView]:
+        """
+        Get one page of a user's orders, newest first, starting after the
+        (created_at, _id) position. Line items are not loaded.
+        """
+        query: dict[str, Any] = {"user_id": user_id}
+        if order_status:
+            query["order_status"] = order_status
+
+        created_at: dict[str, datetime] = {}
+        if created_from:
+            created_at["$gte"] = created_from
+        if created_to:
+            created_at["$lt"] = created_to
+        if created_at:
+            query["created_at"] = created_at
+
+        if after:
+            after_created_at, after_id = after
+            query["$or"] = [
+                {"created_at": {"$lt": after_created_at}},
+                {"created_at": after_created_at, "_id": {"$lt": after_id}}
+            ]
+
+        return await (
+            Order.find(query)
+            .sort("-created_at", "-_id")
+            .limit(limit)
+            .project(OrderSummaryView)
+            .to_list()
+        )
+
+order_repository = OrderRepository()
@@ -1,20 +1,203 @@
-from typing import List
-from app.models.product import Product
-from app.schemas.product import ProductCreate, ProductUpdate
+import asyncio
+import re
+import time
+from typing import Any, AsyncIterator, Dict, Iterable, List, Mapping, Sequence
+from app.core.config import settings
+from app.models.product import Product, ProductListView, ProductSearchView
+from app.repositories.stock_shard_repository import (
+    stock_shard_repository,
+    StockShardRepository
+)
+from app.schemas.product import (
+    ProductCreate,
+    ProductFilter,
+    ProductImportRow,
+    ProductUpdate,
+    StockDeltaRow
+)
 from beanie import PydanticObjectId
+from beanie.operators import In
+from motor.motor_asyncio import AsyncIOMotorClientSession
+from pymongo import ASCENDING, DESCENDING, InsertOne, UpdateOne
+from pymongo.errors import BulkWriteError
+from pymongo.read_preferences import make_read_preference, read_pref_mode_from_name
+
+# How many conditional stock decreases a bulk update sends at a time
+STOCK_DELTA_CONCURRENCY = 16
+
+# Listing sort orders. Each ends with _id so keyset pagination is stable.
+PRODUCT_SORTS: dict[str, list[tuple[str, int]]] = {
+    "id": [("_id", ASCENDING)],
+    "newest": [("_id", DESCENDING)],
+    "price_asc": [("price", ASCENDING), ("_id", ASCENDING)],
+    "price_desc": [("price", DESCENDING), ("_id", DESCENDING)],
+}
+
+# The index each listing sort walks (see Product.Settings.indexes). The
+# planner is not left to choose: on a small or skewed sample it can pick
+# one that needs a blocking sort or fetches documents to filter them.
+LISTING_INDEXES = {
+    "id": "id_price_stock_name",
+    "newest": "id_price_stock_name",
+    "price_asc": "price_id_stock_name",
+    "price_desc": "price_id_stock_name",
+}
+
+# Fields of ProductListView; listings and search read only these
+LISTING_PROJECTION = {"name": 1, "description": 1, "price": 1, "stock": 1, "stock_shards": 1}
+
+# Fields every checkout writes; changes to only these leave listings alone
+STOCK_FIELDS = {"stock", "reserved"}
+
+# Listing and search pages may read from secondaries; every other read,
+# including stock checks at checkout, goes to the primary
+CATALOG_READ_PREFERENCE = make_read_preference(
+    read_pref_mode_from_name(settings.MONGO_CATALOG_READ_PREFERENCE), None
+)
+
+class InsufficientStockError(Exception):
+    """
+    Raised when a stock decrement could not be applied to every product
+    """
 
 class ProductRepository:
+    def __init__(self, shard_repo: StockShardRepository = stock_shard_repository):
+        self.shard_repo = shard_repo
+        self._catalog_primary_until = 0.0
+
+    def read_catalog_from_primary(self, seconds: float) -> None:
+        """
+        Send listing and search reads to the primary for a while, so pages
+        rebuilt right after a write do not cache a lagging secondary's view
+        """
+        self._catalog_primary_until = max(self._catalog_primary_until, time.monotonic() + seconds)
+
+    def _catalog_collection(self):
+        collection = Product.get_pymongo_collection()
+        if time.monotonic() < self._catalog_primary_until:
+            return collection
+        return collection.with_options(read_preference=CATALOG_READ_PREFERENCE)
+
     async def get(self, product_id: PydanticObjectId) -> Product | None:
         """
         Get single product by ID
         """
-        return await Product.get(product_id)
+        product = await Product.get(product_id)
+        if product:
+            await self._apply_shard_totals([product])
+        return product
+
+    async def get_stock(self, product_id: PydanticObjectId) -> int | None:
+        """
+        Get the current stock of a product straight from the primary, or
+        None if it does not exist. Only the stock fields are read.
+        """
+        document = await Product.get_pymongo_collection().find_one(
+            {"_id": product_id}, {"stock": 1, "stock_shards": 1}
+        )
+        if document is None:
+            return None
+        if document.get("stock_shards"):
+            totals = await self.shard_repo.get_totals([product_id])
+            return totals.get(product_id, (0, 0))[0]
+        return document["stock"]
+
+    async def get_many(
+        self,
+        product_ids: Iterable[PydanticObjectId]
+    ) -> Dict[PydanticObjectId, Product]:
+        """
+        Get several products with a single $in query, keyed by ID.
+        Missing IDs are simply absent from the result.
+        """
+        ids = list(set(product_ids))
+        if not ids:
+            return {}
+        products = await Product.find(In(Product.id, ids)).to_list()
+        await self._apply_shard_totals(products)
+        return {product.id: product for product in products} # pyright: ignore[reportReturnType]
+
+    async def get_page(
+        self,
+        limit: int,
+        filters: ProductFilter,
+        after: tuple | None = None
+    ) -> List[ProductListView]:
+        """
+        Get one page of products matching the filters, in the filter's sort
+        order, starting after the given sort key values.
+        Only the listing fields are projected.
+        """
+        cursor = (
+            self._catalog_collection()
+            .find(self._listing_query(filters, after), LISTING_PROJECTION)
+            .sort(PRODUCT_SORTS[filters.sort])
+            .hint(LISTING_INDEXES[filters.sort])
+            .limit(limit)
+        )
+        products = [ProductListView.model_validate(document) async for document in cursor]
+        await self._apply_shard_totals(products)
+        return products
+
+    def _listing_query(self, filters: ProductFilter, after: tuple | None = None) -> dict:
+        query: dict[str, Any] = {}
+
+        price: dict[str, float] = {}
+        if filters.min_price is not None:
+            price["$gte"] = filters.min_price
+        if filters.max_price is not None:
+            price["$lte"] = filters.max_price
+        if price:
+            query["price"] = price
+
+        if filters.in_stock:
+            query["stock"] = {"$gt": 0}
+
+        if filters.name_prefix:
+            # An anchored, case-sensitive regex becomes a range on the name index
+            query["name"] = {"$regex": f"^{re.escape(filters.name_prefix)}"}
+
+        if after:
+            # Everything strictly after the last row, in sort order:
+            # (a > x) or (a == x and b > y) for the sort fields a, b.
+            # a >= x is repeated outside the $or so it bounds the index scan.
+            sort = PRODUCT_SORTS[filters.sort]
+            alternatives = []
+            for i, (field, direction) in enumerate(sort):
+                condition = {sort[j][0]: after[j] for j in range(i)}
+                condition[field] = {"$gt" if direction == ASCENDING else "$lt": after[i]}
+                alternatives.append(condition)
+            first_field, first_direction = sort[0]
+            query["$and"] = [
+                {first_field: {"$gte" if first_direction == ASCENDING else "$lte": after[0]}},
+                {"$or": alternatives}
+            ]
+
+        return query
+
+    async def search_text(self, query: str, skip: int, limit: int) -> List[ProductListView]:
+        """
+        Full-text search over name and description using the text index,
+        best matches first
+        """
+        score = {"$meta": "textScore"}
+        cursor = (
+            self._catalog_collection()
+            .find({"$text": {"$search": query}}, {**LISTING_PROJECTION, "score": score})
+            .sort([("score", score)])
+            .skip(skip)
+            .limit(limit)
+        )
+        products = [ProductListView.model_validate(document) async for document in cursor]
+        await self._apply_shard_totals(products)
+        return products
 
-    async def get_all(self) -> List[Product]:
+    async def iter_search_documents(self) -> AsyncIterator[ProductSearchView]:
         """
-        Get list of all products.
+        Stream the searchable fields of every product
         """
-        return await Product.find_all().to_list()
+        async for product in Product.find_all().project(ProductSearchView):
+            yield product
 
     async def create(self, product_in: ProductCreate) -> Product:
         """
@@ -30,12 +213,17 @@ class ProductRepository:
         product_in: ProductUpdate
     ) -> Product:
         """
-        Update product
+        Update product. Only the given fields are written, so counters
+        changed by concurrent checkouts are not overwritten.
         """
         update_data = product_in.model_dump(exclude_unset=True)
-        for key, value in update_data.items():
-            setattr(product, key, value)
-        await product.save()
+        if update_data:
+            await product.set(update_data)
+        if product.stock_shards and "stock" in update_data:
+            _, reserved = await self.shard_repo.drain(product.id) # pyright: ignore[reportArgumentType]
+            await self.shard_repo.create(
+                product.id, product.stock_shards, product.stock, reserved # pyright: ignore[reportArgumentType]
+            )
         return product
 
     async def delete(self, product: Product) -> None:
@@ -43,13 +231,408 @@ class ProductRepository:
         Delete product
         """
         await product.delete()
+        if product.stock_shards:
+            await self.shard_repo.drain(product.id) # pyright: ignore[reportArgumentType]
 
-    async def save(self, product: Product) -> Product:
+    async def decrement_stock(
+        self,
+        quantities: Mapping[PydanticObjectId, int],
+        session: AsyncIOMotorClientSession | None = None,
+        reserve: bool = False
+    ) -> None:
         """
-        Saves product document > used for stock updates
+        Atomically take stock for several products. Each update only
+        matches while stock >= quantity, so concurrent checkouts can never
+        oversell. Either every product is decremented or none is: inside a
+        transaction the caller aborts on error, without one the products
+        that were decremented are given back here.
+        With reserve, the units taken are counted as reserved.
+        Sharded products are taken from their shards instead.
         """
-        await product.save()
-        return product
+        if not quantities:
+            return
+        sharded = await self._get_shard_counts(quantities)
+
+        taken: Dict[PydanticObjectId, int] = {}
+        try:
+            for product_id, shard_count in sharded.items():
+                await self._take_sharded(
+                    product_id, shard_count, "stock", "reserved" if reserve else None,
+                    quantities[product_id], session=session
+                )
+                taken[product_id] = quantities[product_id]
+            await self._decrement_unsharded(
+                {k: v for k, v in quantities.items() if k not in sharded}, session, reserve
+            )
+        except InsufficientStockError:
+            if session is None:
+                for product_id, quantity in taken.items():
+                    if reserve:
+                        await self._take_sharded(
+                            product_id, sharded[product_id], "reserved", "stock", quantity
+                        )
+                    else:
+                        await self._add_sharded(product_id, sharded[product_id], quantity)
+            raise
+
+    async def _decrement_unsharded(
+        self,
+        quantities: Mapping[PydanticObjectId, int],
+        session: AsyncIOMotorClientSession | None,
+        reserve: bool
+    ) -> None:
+        if not quantities:
+            return
+        collection = Product.get_pymongo_collection()
+
+        def take(product_id: PydanticObjectId, quantity: int) -> tuple[dict, dict]:
+            return (
+                {"_id": product_id, "stock": {"$gte": quantity}},
+                {"$inc": {"stock": -quantity, **({"reserved": quantity} if reserve else {})}}
+            )
+
+        if session is not None:
+            # One round trip; the caller aborts the transaction on error
+            result = await collection.bulk_write(
+                [UpdateOne(*take(product_id, quantity)) for product_id, quantity in quantities.items()],
+                ordered=False,
+                session=session
+            )
+            if result.modified_count != len(quantities):
+                raise InsufficientStockError()
+            return
+
+        # Without a transaction, update each product on its own (concurrently)
+        # so we know exactly which ones to give back if another falls short
+        results = await asyncio.gather(*(
+            collection.update_one(*take(product_id, quantity))
+            for product_id, quantity in quantities.items()
+        ))
+        taken = {
+            product_id: quantity
+            for (product_id, quantity), result in zip(quantities.items(), results)
+            if result.modified_count
+        }
+        if len(taken) == len(quantities):
+            return
+
+        await self._bulk_inc(
+            taken,
+            lambda quantity: {"stock": quantity, **({"reserved": -quantity} if reserve else {})},
+            None
+        )
+        raise InsufficientStockError()
+
+    async def increment_stock(
+        self,
+        quantities: Mapping[PydanticObjectId, int],
+        session: AsyncIOMotorClientSession | None = None
+    ) -> None:
+        """
+        Give stock back for several products in one bulk write
+        """
+        if not quantities:
+            return
+        sharded = await self._get_shard_counts(quantities)
+        for product_id, shard_count in sharded.items():
+            await self._add_sharded(product_id, shard_count, quantities[product_id], session)
+
+        await self._bulk_inc(
+            {k: v for k, v in quantities.items() if k not in sharded},
+            lambda quantity: {"stock": quantity},
+            session
+        )
+
+    async def release_reserved(
+        self,
+        quantities: Mapping[PydanticObjectId, int],
+        session: AsyncIOMotorClientSession | None = None
+    ) -> None:
+        """
+        Give reserved units back to available stock
+        """
+        if not quantities:
+            return
+        sharded = await self._get_shard_counts(quantities)
+        for product_id, shard_count in sharded.items():
+            await self.shard_repo.take(
+                product_id, shard_count, "reserved", "stock", quantities[product_id], session
+            )
+
+        await self._bulk_inc(
+            {k: v for k, v in quantities.items() if k not in sharded},
+            lambda quantity: {"stock": quantity, "reserved": -quantity},
+            session
+        )
+
+    async def commit_reserved(
+        self,
+        quantities: Mapping[PydanticObjectId, int],
+        session: AsyncIOMotorClientSession | None = None
+    ) -> None:
+        """
+        Turn reserved units into sold ones. Available stock is unchanged,
+        it was already taken when the units were reserved.
+        """
+        if not quantities:
+            return
+        sharded = await self._get_shard_counts(quantities)
+        for product_id, shard_count in sharded.items():
+            await self.shard_repo.take(
+                product_id, shard_count, "reserved", None, quantities[product_id], session
+            )
+
+        await self._bulk_inc(
+            {k: v for k, v in quantities.items() if k not in sharded},
+            lambda quantity: {"reserved": -quantity},
+            session
+        )
+
+    async def _bulk_inc(
+        self,
+        quantities: Mapping[PydanticObjectId, int],
+        inc: Any,
+        session: AsyncIOMotorClientSession | None
+    ) -> None:
+        if not quantities:
+            return
+        await Product.get_pymongo_collection().bulk_write(
+            [
+                UpdateOne({"_id": product_id}, {"$inc": inc(quantity)})
+                for product_id, quantity in quantities.items()
+            ],
+            ordered=False,
+            session=session
+        )
+
+    async def set_stock_shards(self, product_id: PydanticObjectId, shard_count: int) -> bool:
+        """
+        Spread a product's stock over shard_count shards, change how many
+        shards it has, or fold the shards back into the product with 0.
+        While units move between the product and its shards, checkouts of
+        that product may briefly see less stock, never more.
+        Returns False if the product does not exist.
+        """
+        collection = Product.get_pymongo_collection()
+        before = await collection.find_one({"_id": product_id}, {"stock_shards": 1})
+        if before is None:
+            return False
+        current = before.get("stock_shards", 0)
+
+        if not current and shard_count:
+            # Move the units out of the product document first, so checkouts
+            # still routed to it find nothing rather than a stale snapshot
+            before = await collection.find_one_and_update(
+                {"_id": product_id},
+                {"$set": {"stock": 0, "reserved": 0, "stock_shards": shard_count}},
+                projection={"stock": 1, "reserved": 1}
+            )
+            await self.shard_repo.create(
+                product_id, shard_count, before["stock"], before.get("reserved", 0)
+            )
+        elif current and not shard_count:
+            await collection.update_one(
+                {"_id": product_id},
+                {"$set": {"stock": 0, "reserved": 0, "stock_shards": 0}}
+            )
+            stock, reserved = await self.shard_repo.drain(product_id)
+            await collection.update_one(
+                {"_id": product_id},
+                {"$inc": {"stock": stock, "reserved": reserved}}
+            )
+            return True
+        elif current != shard_count:
+            await collection.update_one({"_id": product_id}, {"$set": {"stock_shards": shard_count}})
+            await self.shard_repo.create(product_id, shard_count)
+            stock, reserved = await self.shard_repo.drain(product_id, from_shard=shard_count)
+            await self.shard_repo.create(product_id, shard_count, stock, reserved)
+
+        if shard_count:
+            await self._rebalance(product_id, shard_count)
+        return True
+
+    async def _get_shard_counts(
+        self,
+        product_ids: Iterable[PydanticObjectId]
+    ) -> Dict[PydanticObjectId, int]:
+        """
+        Find which of the products keep their stock in shards
+        """
+        if not settings.STOCK_SHARDING:
+            return {}
+        cursor = Product.get_pymongo_collection().find(
+            {"_id": {"$in": list(set(product_ids))}, "stock_shards": {"$gt": 0}},
+            {"stock_shards": 1}
+        )
+        return {product["_id"]: product["stock_shards"] async for product in cursor}
+
+    async def _apply_shard_totals(self, products: Sequence[Product | ProductListView]) -> None:
+        """
+        Replace the stock snapshot of sharded products with the sum of
+        their shards
+        """
+        sharded = [product for product in products if product.stock_shards]
+        if not sharded:
+            return
+        totals = await self.shard_repo.get_totals(product.id for product in sharded) # pyright: ignore[reportArgumentType]
+        for product in sharded:
+            stock, reserved = totals.get(product.id, (0, 0)) # pyright: ignore[reportArgumentType]
+            product.stock = stock
+            if isinstance(product, Product):
+                product.reserved = reserved
+
+    async def _take_sharded(
+        self,
+        product_id: PydanticObjectId,
+        shard_count: int,
+        source: str,
+        target: str | None,
+        quantity: int,
+        session: AsyncIOMotorClientSession | None = None
+    ) -> None:
+        touched = await self.shard_repo.take(
+            product_id, shard_count, source, target, quantity, session # pyright: ignore[reportArgumentType]
+        )
+        if touched is None:
+            raise InsufficientStockError()
+        if touched > 1 and source == "stock" and session is None:
+            # A shard ran dry; spread what is left so the next checkouts
+            # find stock on their first try again. Not inside a transaction,
+            # where moving units between shards would conflict with the
+            # other checkouts.
+            await self._rebalance(product_id, shard_count)
+
+    async def _add_sharded(
+        self,
+        product_id: PydanticObjectId,
+        shard_count: int,
+        quantity: int,
+        session: AsyncIOMotorClientSession | None = None
+    ) -> None:
+        added = await self.shard_repo.add(product_id, shard_count, "stock", quantity, session)
+        if not added:
+            # The shards were folded back into the product meanwhile
+            await Product.get_pymongo_collection().update_one(
+                {"_id": product_id}, {"$inc": {"stock": quantity}}, session=session
+            )
+
+    async def _rebalance(self, product_id: PydanticObjectId, shard_count: int) -> None:
+        total = await self.shard_repo.rebalance(product_id, shard_count)
+        # Keep the snapshot used by the listing's in-stock filter roughly current
+        await Product.get_pymongo_collection().update_one(
+            {"_id": product_id, "stock_shards": {"$gt": 0}}, {"$set": {"stock": total}}
+        )
+
+    async def bulk_import(self, rows: List[ProductImportRow]) -> Dict[int, str]:
+        """
+        Write a batch of products in one unordered bulk write. Rows with an
+        ID are upserted, the others inserted. Returns the error of each
+        failed row, keyed by its position in the batch.
+        """
+        if not rows:
+            return {}
+        operations = []
+        for row in rows:
+            fields = row.model_dump(exclude={"id"})
+            if row.id is None:
+                operations.append(InsertOne(fields))
+            else:
+                operations.append(UpdateOne({"_id": row.id}, {"$set": fields}, upsert=True))
+
+        errors: Dict[int, str] = {}
+        try:
+            await Product.get_pymongo_collection().bulk_write(operations, ordered=False)
+        except BulkWriteError as e:
+            errors = {error["index"]: error["errmsg"] for error in e.details["writeErrors"]}
+
+        # The stock of a sharded product lives in its shards
+        sharded = await self._get_shard_counts(row.id for row in rows if row.id is not None)
+        for position, row in enumerate(rows):
+            if row.id in sharded and position not in errors:
+                _, reserved = await self.shard_repo.drain(row.id) # pyright: ignore[reportArgumentType]
+                await self.shard_repo.create(row.id, sharded[row.id], row.stock, reserved) # pyright: ignore[reportArgumentType]
+        return errors
+
+    async def apply_stock_deltas(self, rows: List[StockDeltaRow]) -> Dict[int, str]:
+        """
+        Add a batch of stock deltas. Rows for the same product are added
+        up and applied as one update, so they succeed or fail together.
+        Increases go out in one unordered bulk write; a net decrease only
+        applies while enough stock is left. Returns the error of each row
+        that was not applied, keyed by its position in the batch.
+        """
+        if not rows:
+            return {}
+        errors: Dict[int, str] = {}
+
+        positions: Dict[PydanticObjectId, List[int]] = {}
+        deltas: Dict[PydanticObjectId, int] = {}
+        for position, row in enumerate(rows):
+            positions.setdefault(row.id, []).append(position)
+            deltas[row.id] = deltas.get(row.id, 0) + row.delta
+
+        def fail(product_id: PydanticObjectId, error: str) -> None:
+            for position in positions[product_id]:
+                errors[position] = error
+
+        sharded = await self._get_shard_counts(deltas)
+        for product_id, shard_count in sharded.items():
+            delta = deltas.pop(product_id)
+            if delta >= 0:
+                await self._add_sharded(product_id, shard_count, delta)
+                continue
+            try:
+                await self._take_sharded(product_id, shard_count, "stock", None, -delta)
+            except InsufficientStockError:
+                fail(product_id, "Not enough stock")
+
+        if not deltas:
+            return errors
+        collection = Product.get_pymongo_collection()
+
+        # Increases always apply to products that exist
+        increases = {product_id: delta for product_id, delta in deltas.items() if delta >= 0}
+        unmatched: set[PydanticObjectId] = set()
+        if increases:
+            result = await collection.bulk_write(
+                [
+                    UpdateOne({"_id": product_id}, {"$inc": {"stock": delta}})
+                    for product_id, delta in increases.items()
+                ],
+                ordered=False
+            )
+            if result.matched_count != len(increases):
+                unmatched.update(increases)
+
+        # Decreases are conditional, so each gets its own update to tell
+        # which ones matched
+        decreases = [(product_id, delta) for product_id, delta in deltas.items() if delta < 0]
+        for start in range(0, len(decreases), STOCK_DELTA_CONCURRENCY):
+            chunk = decreases[start:start + STOCK_DELTA_CONCURRENCY]
+            results = await asyncio.gather(*(
+                collection.update_one(
+                    {"_id": product_id, "stock": {"$gte": -delta}},
+                    {"$inc": {"stock": delta}}
+                )
+                for product_id, delta in chunk
+            ))
+            unmatched.update(
+                product_id for (product_id, _), result in zip(chunk, results)
+                if not result.matched_count
+            )
+
+        if unmatched:
+            found = {
+                product["_id"] async for product in collection.find(
+                    {"_id": {"$in": list(unmatched)}}, {"_id": 1}
+                )
+            }
+            for product_id in unmatched:
+                if product_id not in found:
+                    fail(product_id, "Product not found")
+                elif product_id not in increases:
+                    fail(product_id, "Not enough stock")
+        return errors
 
 # Create a single instance
 product_repository = ProductRepository()
\ No newline at end of file
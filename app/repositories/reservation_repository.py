@@ -0,0 +1,72 @@
+from typing import List
+from app.models.reservation import Reservation
+from app.models.webhook_event import utc_now
+from beanie import PydanticObjectId
+from motor.motor_asyncio import AsyncIOMotorClientSession
+from pymongo import ASCENDING, ReturnDocument
+
+class ReservationRepository:
+    async def create(
+        self,
+        reservation: Reservation,
+        session: AsyncIOMotorClientSession | None = None
+    ) -> Reservation:
+        await reservation.insert(session=session)
+        return reservation
+
+    async def get_by_id(self, reservation_id: PydanticObjectId) -> Reservation | None:
+        return await Reservation.get(reservation_id)
+
+    async def get_held_for_user(self, user_id: PydanticObjectId) -> List[Reservation]:
+        """
+        Get the user's reservations that still hold stock
+        """
+        return await Reservation.find({"user_id": user_id, "status": "held"}).to_list()
+
+    async def set_checkout_session(
+        self,
+        reservation_id: PydanticObjectId,
+        checkout_session_id: str
+    ) -> None:
+        await Reservation.get_pymongo_collection().update_one(
+            {"_id": reservation_id},
+            {"$set": {"checkout_session_id": checkout_session_id}}
+        )
+
+    async def transition(
+        self,
+        reservation_id: PydanticObjectId,
+        from_status: str,
+        to_status: str,
+        session: AsyncIOMotorClientSession | None = None
+    ) -> Reservation | None:
+        """
+        Atomically move a reservation from one status to another.
+        Returns None if it was not in from_status, so only one caller
+        can ever convert or release a given hold.
+        """
+        document = await Reservation.get_pymongo_collection().find_one_and_update(
+            {"_id": reservation_id, "status": from_status},
+            {"$set": {"status": to_status}},
+            return_document=ReturnDocument.AFTER,
+            session=session
+        )
+        return Reservation.model_validate(document) if document else None
+
+    async def claim_next_expired(
+        self,
+        session: AsyncIOMotorClientSession | None = None
+    ) -> Reservation | None:
+        """
+        Atomically mark the oldest expired hold as released and return it
+        """
+        document = await Reservation.get_pymongo_collection().find_one_and_update(
+            {"status": "held", "expires_at": {"$lte": utc_now()}},
+            {"$set": {"status": "released"}},
+            sort=[("expires_at", ASCENDING)],
+            return_document=ReturnDocument.AFTER,
+            session=session
+        )
+        return Reservation.model_validate(document) if document else None
+
+reservation_repository = ReservationRepository()
@@ -0,0 +1,202 @@
+import random
+from typing import Dict, Iterable, Literal, Tuple
+from app.models.stock_shard import StockShard
+from beanie import PydanticObjectId
+from motor.motor_asyncio import AsyncIOMotorClientSession
+from pymongo import ReturnDocument, UpdateOne
+
+ShardField = Literal["stock", "reserved"]
+
+def split_evenly(total: int, parts: int) -> list[int]:
+    """
+    Split total into parts that differ by at most one
+    """
+    base, extra = divmod(total, parts)
+    return [base + (1 if i < extra else 0) for i in range(parts)]
+
+class StockShardRepository:
+    async def get_totals(
+        self,
+        product_ids: Iterable[PydanticObjectId]
+    ) -> Dict[PydanticObjectId, Tuple[int, int]]:
+        """
+        Sum the shards of several products with one aggregation, keyed by
+        product ID, as (stock, reserved)
+        """
+        ids = list(set(product_ids))
+        if not ids:
+            return {}
+        totals = {}
+        async for row in StockShard.get_pymongo_collection().aggregate([
+            {"$match": {"product_id": {"$in": ids}}},
+            {"$group": {
+                "_id": "$product_id",
+                "stock": {"$sum": "$stock"},
+                "reserved": {"$sum": "$reserved"}
+            }},
+        ]):
+            totals[row["_id"]] = (row["stock"], row["reserved"])
+        return totals
+
+    async def take(
+        self,
+        product_id: PydanticObjectId,
+        shard_count: int,
+        source: ShardField,
+        target: ShardField | None,
+        quantity: int,
+        session: AsyncIOMotorClientSession | None = None
+    ) -> int | None:
+        """
+        Take quantity units out of one field of a product's shards, moving
+        them to the target field if given. Starts at a random shard and
+        spills over to the next ones when it runs short, so most calls
+        are a single update of a single shard.
+        Returns how many shards were touched, or None if the shards did
+        not hold enough units between them. In that case nothing is taken:
+        without a session the partial takes are put back here, inside a
+        transaction the caller aborts.
+        """
+        collection = StockShard.get_pymongo_collection()
+        start = random.randrange(shard_count)
+        taken: Dict[int, int] = {}
+        remaining = quantity
+
+        for offset in range(shard_count):
+            shard = (start + offset) % shard_count
+            # Take what the shard has, up to what is still needed
+            update: dict = {source: {"$max": [0, {"$subtract": [f"${source}", remaining]}]}}
+            if target:
+                update[target] = {"$add": [f"${target}", {"$min": [f"${source}", remaining]}]}
+            before = await collection.find_one_and_update(
+                {"product_id": product_id, "shard": shard, source: {"$gt": 0}},
+                [{"$set": update}],
+                projection={source: 1},
+                return_document=ReturnDocument.BEFORE,
+                session=session
+            )
+            if before is None:
+                continue
+            amount = min(before[source], remaining)
+            taken[shard] = amount
+            remaining -= amount
+            if not remaining:
+                return len(taken)
+
+        if session is None and taken:
+            inc = lambda amount: {source: amount, **({target: -amount} if target else {})}
+            await collection.bulk_write(
+                [
+                    UpdateOne({"product_id": product_id, "shard": shard}, {"$inc": inc(amount)})
+                    for shard, amount in taken.items()
+                ],
+                ordered=False
+            )
+        return None
+
+    async def add(
+        self,
+        product_id: PydanticObjectId,
+        shard_count: int,
+        field: ShardField,
+        quantity: int,
+        session: AsyncIOMotorClientSession | None = None
+    ) -> bool:
+        """
+        Add units to a random shard. Returns False if the product has no
+        shards (any more).
+        """
+        result = await StockShard.get_pymongo_collection().update_one(
+            {"product_id": product_id, "shard": random.randrange(shard_count)},
+            {"$inc": {field: quantity}},
+            session=session
+        )
+        return result.matched_count == 1
+
+    async def create(
+        self,
+        product_id: PydanticObjectId,
+        shard_count: int,
+        stock: int = 0,
+        reserved: int = 0
+    ) -> None:
+        """
+        Add shards 0..shard_count-1 that do not exist yet, then spread
+        stock and reserved units over all of them
+        """
+        await StockShard.get_pymongo_collection().bulk_write(
+            [
+                UpdateOne(
+                    {"product_id": product_id, "shard": shard},
+                    {"$inc": {"stock": stock_part, "reserved": reserved_part}},
+                    upsert=True
+                )
+                for shard, (stock_part, reserved_part) in enumerate(zip(
+                    split_evenly(stock, shard_count), split_evenly(reserved, shard_count)
+                ))
+            ],
+            ordered=False
+        )
+
+    async def drain(
+        self,
+        product_id: PydanticObjectId,
+        from_shard: int = 0
+    ) -> Tuple[int, int]:
+        """
+        Delete the product's shards numbered from_shard and up, returning
+        the (stock, reserved) units they held
+        """
+        collection = StockShard.get_pymongo_collection()
+        stock = reserved = 0
+        while True:
+            shard = await collection.find_one_and_delete(
+                {"product_id": product_id, "shard": {"$gte": from_shard}}
+            )
+            if shard is None:
+                return stock, reserved
+            stock += shard["stock"]
+            reserved += shard["reserved"]
+
+    async def rebalance(self, product_id: PydanticObjectId, shard_count: int) -> int:
+        """
+        Even out available units across the shards so they run dry at
+        about the same time. Surplus is taken from each shard with a
+        guarded decrement, so concurrent checkouts are never blocked and
+        no unit is lost. Returns the total available units.
+        """
+        collection = StockShard.get_pymongo_collection()
+        levels = {
+            shard["shard"]: shard["stock"]
+            async for shard in collection.find({"product_id": product_id}, {"shard": 1, "stock": 1})
+        }
+        targets = dict(enumerate(split_evenly(sum(levels.values()), shard_count)))
+
+        moved = 0
+        for shard, level in levels.items():
+            surplus = level - targets.get(shard, 0)
+            if surplus <= 0:
+                continue
+            result = await collection.update_one(
+                {"product_id": product_id, "shard": shard, "stock": {"$gte": surplus}},
+                {"$inc": {"stock": -surplus}}
+            )
+            if result.modified_count:
+                moved += surplus
+
+        operations = []
+        for shard, target in targets.items():
+            give = min(max(target - levels.get(shard, 0), 0), moved)
+            if shard == shard_count - 1:
+                # Whatever could not be placed evenly goes to the last shard
+                give = moved
+            if give:
+                operations.append(
+                    UpdateOne({"product_id": product_id, "shard": shard}, {"$inc": {"stock": give}})
+                )
+                moved -= give
+        if operations:
+            await collection.bulk_write(operations, ordered=False)
+        return sum(targets.values())
+
+stock_shard_repository = StockShardRepository()
@@ -1,6 +1,9 @@
-from app.models.user import User
+import re
+from typing import Any, List
+from app.models.user import User, UserListView
 from app.schemas.user import UserCreate
-from app.core.security import get_password_hash
+from app.core.security import hash_password
+from app.core.cache import principal_cache
 from beanie import PydanticObjectId
 
 class UserRepository:
@@ -16,11 +19,37 @@ class UserRepository:
         """
         return await User.get(user_id)
 
+    async def get_page(
+        self,
+        limit: int,
+        email_prefix: str | None = None,
+        after_email: str | None = None
+    ) -> List[UserListView]:
+        """
+        Get one page of users in email order, starting after the given
+        email. Both the prefix match and the sort use the email index,
+        and the password hash is never loaded.
+        """
+        email: dict[str, Any] = {}
+        if email_prefix:
+            email["$regex"] = f"^{re.escape(email_prefix)}"
+        if after_email:
+            email["$gt"] = after_email
+        query = {"email": email} if email else {}
+
+        return await (
+            User.find(query)
+            .sort("+email")
+            .limit(limit)
+            .project(UserListView)
+            .to_list()
+        )
+
     async def create(self, user_in: UserCreate) -> User:
         """
         Create new user
         """
-        hashed_password = get_password_hash(user_in.password)
+        hashed_password = await hash_password(user_in.password)
         
         user = User(
             first_name=user_in.first_name,
@@ -29,6 +58,15 @@ class UserRepository:
             hashed_password=hashed_password
         )
         await user.insert()
+        principal_cache.invalidate_user(user.email)
+        return user
+
+    async def update(self, user: User) -> User:
+        """
+        Save changes to user and drop any cached sessions of that user
+        """
+        await user.save()
+        principal_cache.invalidate_user(user.email)
         return user
 
 user_repository = UserRepository()
\ No newline at end of file
@@ -0,0 +1,79 @@
+from datetime import datetime, timedelta
+from typing import Any, Dict
+from app.models.webhook_event import WebhookDeadLetter, WebhookEvent, utc_now
+from pymongo import ASCENDING, ReturnDocument
+from pymongo.errors import DuplicateKeyError
+
+class WebhookRepository:
+    async def enqueue(self, event_id: str, type: str, payload: Dict[str, Any]) -> bool:
+        """
+        Store a new event. Returns False if the event was already stored.
+        """
+        try:
+            await WebhookEvent(event_id=event_id, type=type, payload=payload).insert()
+        except DuplicateKeyError:
+            return False
+        return True
+
+    async def claim_next(self, lease: timedelta) -> WebhookEvent | None:
+        """
+        Atomically take the next due event, including events whose previous
+        worker died while holding them
+        """
+        now = utc_now()
+        document = await WebhookEvent.get_pymongo_collection().find_one_and_update(
+            {"$or": [
+                {"status": "pending", "next_attempt_at": {"$lte": now}},
+                {"status": "processing", "locked_until": {"$lt": now}}
+            ]},
+            {
+                "$set": {"status": "processing", "locked_until": now + lease},
+                "$inc": {"attempts": 1}
+            },
+            sort=[("next_attempt_at", ASCENDING)],
+            return_document=ReturnDocument.AFTER
+        )
+        return WebhookEvent.model_validate(document) if document else None
+
+    async def mark_done(self, event: WebhookEvent) -> None:
+        await WebhookEvent.get_pymongo_collection().update_one(
+            {"_id": event.id},
+            {"$set": {"status": "done", "locked_until": None, "last_error": None}}
+        )
+
+    async def schedule_retry(
+        self,
+        event: WebhookEvent,
+        next_attempt_at: datetime,
+        error: str
+    ) -> None:
+        await WebhookEvent.get_pymongo_collection().update_one(
+            {"_id": event.id},
+            {"$set": {
+                "status": "pending",
+                "next_attempt_at": next_attempt_at,
+                "locked_until": None,
+                "last_error": error
+            }}
+        )
+
+    async def dead_letter(self, event: WebhookEvent, error: str) -> None:
+        """
+        Copy the event to the dead-letter collection and stop retrying it
+        """
+        try:
+            await WebhookDeadLetter(
+                event_id=event.event_id,
+                type=event.type,
+                payload=event.payload,
+                attempts=event.attempts,
+                error=error
+            ).insert()
+        except DuplicateKeyError:
+            pass
+        await WebhookEvent.get_pymongo_collection().update_one(
+            {"_id": event.id},
+            {"$set": {"status": "dead", "locked_until": None, "last_error": error}}
+        )
+
+webhook_repository = WebhookRepository()
@@ -6,6 +6,9 @@ class CartItemCreate(BaseModel):
     product_id: PydanticObjectId
     quantity: int = Field(..., gt=0)
 
+class CartItemUpdate(BaseModel):
+    quantity: int = Field(..., gt=0)
+
 class CartItemOut(BaseModel):
     product_id: PydanticObjectId
     quantity: int
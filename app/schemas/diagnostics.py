@@ -0,0 +1,29 @@
+from datetime import datetime
+from typing import Any, List, Optional
+from pydantic import BaseModel
+
+class SlowQueryOut(BaseModel):
+    collection: str
+    command: str
+    shape: dict[str, Any]
+    count: int
+    total_ms: float
+    max_ms: float
+    avg_ms: float
+    docs_returned: int
+    last_seen: Optional[datetime] = None
+    plan: Optional[str] = None
+    collscan: bool
+    docs_examined: Optional[int] = None
+    keys_examined: Optional[int] = None
+
+class SlowQueryReport(BaseModel):
+    threshold_ms: float
+    items: List[SlowQueryOut]
+
+class MongoPoolOut(BaseModel):
+    address: str
+    max_size: int
+    open: int
+    in_use: int
+    waiting: int
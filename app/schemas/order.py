@@ -1,6 +1,6 @@
 from pydantic import BaseModel, HttpUrl
 from beanie import PydanticObjectId
-from typing import List
+from typing import List, Optional
 from datetime import datetime
 
 class OrderItemOut(BaseModel):
@@ -21,6 +21,16 @@ class OrderOut(BaseModel):
         from_attributes = True
         json_encoders = {"id": str}
 
+class OrderSummaryOut(BaseModel):
+    id: str
+    total_price: float
+    order_status: str
+    created_at: datetime
+
+class OrderPage(BaseModel):
+    items: List[OrderSummaryOut]
+    next_cursor: Optional[str] = None
+
 class CheckoutSessionResponse(BaseModel):
     """
     Pydantic model for sending the Stripe Checkout session URL
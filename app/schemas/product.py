@@ -1,5 +1,6 @@
-from pydantic import BaseModel
-from typing import Optional
+from beanie import PydanticObjectId
+from pydantic import BaseModel, Field
+from typing import List, Literal, Optional
 
 class ProductCreate(BaseModel):
     name: str
@@ -18,8 +19,42 @@ class ProductOut(BaseModel):
         from_attributes = True
         json_encoders = {"id": str}
 
+class ProductFilter(BaseModel):
+    min_price: Optional[float] = None
+    max_price: Optional[float] = None
+    in_stock: bool = False
+    name_prefix: Optional[str] = None
+    sort: Literal["id", "newest", "price_asc", "price_desc"] = "id"
+
+    class Config:
+        frozen = True
+
+class ProductPage(BaseModel):
+    items: List[ProductOut]
+    next_cursor: Optional[str] = None
+
 class ProductUpdate(BaseModel):
     name: Optional[str] = None
     description: Optional[str] = None
     price: Optional[float] = None
-    stock: Optional[int] = None
\ No newline at end of file
+    stock: Optional[int] = None
+
+class StockShardsUpdate(BaseModel):
+    shards: int = Field(..., ge=0, le=64)
+
+class ProductImportRow(ProductCreate):
+    id: Optional[PydanticObjectId] = None
+
+class StockDeltaRow(BaseModel):
+    id: PydanticObjectId
+    delta: int
+
+class BulkRowError(BaseModel):
+    row: int
+    error: str
+
+class BulkResult(BaseModel):
+    received: int
+    succeeded: int
+    failed: int
+    errors: List[BulkRowError]
@@ -1,3 +1,4 @@
+from typing import List, Optional
 from pydantic import BaseModel, EmailStr, Field
 
 class UserCreate(BaseModel):
@@ -10,4 +11,8 @@ class UserOut(BaseModel):
     first_name: str
     last_name: str
     email: EmailStr
-    is_admin: bool
\ No newline at end of file
+    is_admin: bool
+
+class UserPage(BaseModel):
+    items: List[UserOut]
+    next_cursor: Optional[str] = None
@@ -0,0 +1,96 @@
+"""
+Run the API in production: one worker process per CPU, with uvloop and
+httptools when they are installed.
+
+    python -m app.serve
+    python -m app.serve --workers 4 --port 8080
+
+On SIGTERM each worker stops accepting connections, waits up to
+SERVER_GRACEFUL_SHUTDOWN_SECONDS for in-flight requests, then runs the
+app's shutdown, which stops the background workers and closes MongoDB.
+"""
+import argparse
+import importlib.util
+import os
+import tempfile
+from typing import IO
+
+import uvicorn
+
+from app.core.config import settings
+
+# Lock file of the CPU this worker claimed; held open for the worker's lifetime
+_cpu_lock: IO | None = None
+
+def available_cpus() -> list[int]:
+    """
+    CPUs this process may run on, which can be fewer than the machine has
+    (containers, taskset)
+    """
+    if hasattr(os, "sched_getaffinity"):
+        return sorted(os.sched_getaffinity(0))
+    return list(range(os.cpu_count() or 1))
+
+def pin_worker_to_cpu() -> int | None:
+    """
+    Pin this worker process to the first CPU no sibling worker holds.
+    Claims are lock files, so a restarted worker takes over the CPU of
+    the one it replaces. Returns the CPU, or None if none could be pinned.
+    """
+    global _cpu_lock
+    if not hasattr(os, "sched_setaffinity"):
+        print("WARNING: CPU pinning is only supported on Linux")
+        return None
+
+    import fcntl
+
+    for cpu in available_cpus():
+        path = os.path.join(tempfile.gettempdir(), f"e-commerce-api-{settings.SERVER_PORT}-cpu{cpu}.lock")
+        lock = open(path, "w")
+        try:
+            fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            lock.close()
+            continue
+        os.sched_setaffinity(0, {cpu})
+        _cpu_lock = lock
+        return cpu
+
+    print("WARNING: more workers than CPUs, this worker is not pinned")
+    return None
+
+def _installed(module: str) -> bool:
+    return importlib.util.find_spec(module) is not None
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default=settings.SERVER_HOST)
+    parser.add_argument("--port", type=int, default=settings.SERVER_PORT)
+    parser.add_argument("--workers", type=int, default=settings.SERVER_WORKERS,
+                        help="Worker processes; 0 starts one per CPU")
+    args = parser.parse_args()
+
+    workers = args.workers or len(available_cpus())
+    # Workers are fresh processes that load the settings again
+    os.environ["SERVER_PORT"] = str(args.port)
+
+    loop = "uvloop" if _installed("uvloop") else "asyncio"
+    http = "httptools" if _installed("httptools") else "h11"
+    print(f"Starting {workers} workers on {args.host}:{args.port} (loop: {loop}, http: {http})")
+
+    uvicorn.run(
+        "app.main:app",
+        host=args.host,
+        port=args.port,
+        workers=workers,
+        loop=loop,
+        http=http,
+        lifespan="on",
+        backlog=settings.SERVER_BACKLOG,
+        timeout_keep_alive=settings.SERVER_KEEP_ALIVE_SECONDS,
+        timeout_graceful_shutdown=settings.SERVER_GRACEFUL_SHUTDOWN_SECONDS,
+        access_log=settings.SERVER_ACCESS_LOG
+    )
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,6 @@
 from typing import Optional
 from app.repositories.user_repository import user_repository, UserRepository
-from app.core.security import verify_password, create_access_token
+from app.core.security import verify_and_update_password, create_access_token
 
 class AuthService:
     def __init__(self, user_repo: UserRepository = user_repository):
@@ -8,10 +8,20 @@ class AuthService:
 
     async def login(self, username: str, password: str) -> Optional[str]:
         user = await self.user_repo.get_by_email(username)
+        if not user:
+            return None
 
-        if not user or not verify_password(password, user.hashed_password):
+        verified, new_hash = await verify_and_update_password(
+            password, user.hashed_password
+        )
+        if not verified:
             return None
 
+        # Transparently upgrade hashes made with an older cost factor
+        if new_hash:
+            user.hashed_password = new_hash
+            await self.user_repo.update(user)
+
         access_token = create_access_token(
             data={"sub": user.email}
         )
@@ -0,0 +1,107 @@
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Set, Type, TypeVar
+from pydantic import BaseModel, ValidationError
+from app.core.config import settings
+from app.repositories.product_repository import product_repository, ProductRepository
+from app.schemas.product import BulkResult, BulkRowError, ProductImportRow, StockDeltaRow
+from app.services.product_service import product_service, ProductService
+
+RowT = TypeVar("RowT", bound=BaseModel)
+
+def describe_validation_error(error: ValidationError) -> str:
+    return "; ".join(
+        f"{'.'.join(str(part) for part in e['loc']) or 'row'}: {e['msg']}"
+        for e in error.errors()
+    )
+
+class ProductBulkService:
+    def __init__(
+        self,
+        product_repo: ProductRepository = product_repository,
+        product_srv: ProductService = product_service
+    ):
+        self.product_repo = product_repo
+        self.product_srv = product_srv
+
+    async def import_products(self, rows: AsyncIterator[tuple[int, Any]]) -> BulkResult:
+        """
+        Create or replace products from parsed rows, one bulk write per chunk
+        """
+        return await self._run(
+            rows, ProductImportRow, self.product_repo.bulk_import, self._publish_products
+        )
+
+    async def update_stock(self, rows: AsyncIterator[tuple[int, Any]]) -> BulkResult:
+        """
+        Apply stock deltas from parsed rows, one bulk write per chunk
+        """
+        return await self._run(
+            rows, StockDeltaRow, self.product_repo.apply_stock_deltas, self._publish_stock
+        )
+
+    async def _publish_products(self, product_ids: Set[Any]) -> None:
+        # Names and descriptions may have changed: drop every listing
+        await self.product_srv.invalidation_bus.publish(None)
+
+    async def _publish_stock(self, product_ids: Set[Any]) -> None:
+        # Only stock changed, to a value not known here
+        for product_id in product_ids:
+            await self.product_srv.invalidation_bus.publish(product_id, {"stock": None})
+
+    async def _run(
+        self,
+        rows: AsyncIterator[tuple[int, Any]],
+        model: Type[RowT],
+        write: Callable[[List[RowT]], Awaitable[Dict[int, str]]],
+        publish: Callable[[Set[Any]], Awaitable[None]]
+    ) -> BulkResult:
+        received = succeeded = failed = 0
+        errors: List[BulkRowError] = []
+
+        def add_error(row: int, error: str) -> None:
+            nonlocal failed
+            failed += 1
+            if len(errors) < settings.BULK_MAX_ERRORS:
+                errors.append(BulkRowError(row=row, error=error))
+
+        batch: List[RowT] = []
+        batch_rows: List[int] = []
+        written: Set[Any] = set()
+
+        async def flush() -> None:
+            nonlocal succeeded
+            if not batch:
+                return
+            failures = await write(batch)
+            for position, row in enumerate(batch_rows):
+                if position in failures:
+                    add_error(row, failures[position])
+                else:
+                    written.add(getattr(batch[position], "id", None))
+            succeeded += len(batch) - len(failures)
+            batch.clear()
+            batch_rows.clear()
+
+        try:
+            async for row, data in rows:
+                received += 1
+                if isinstance(data, Exception):
+                    add_error(row, str(data))
+                    continue
+                try:
+                    batch.append(model.model_validate(data))
+                except ValidationError as e:
+                    add_error(row, describe_validation_error(e))
+                    continue
+                batch_rows.append(row)
+                if len(batch) >= settings.BULK_CHUNK_SIZE:
+                    await flush()
+            await flush()
+        finally:
+            # Written chunks stay written, so caches must drop them even on failure
+            if succeeded:
+                await publish(written)
+
+        errors.sort(key=lambda error: error.row)
+        return BulkResult(received=received, succeeded=succeeded, failed=failed, errors=errors)
+
+product_bulk_service = ProductBulkService()
@@ -1,24 +1,21 @@
-from app.models.cart import Cart, CartItem
+from app.models.cart import Cart
 from app.schemas.cart import CartItemCreate
 from beanie import PydanticObjectId
 
-from app.services.product_service import product_service, ProductService
 from app.repositories.cart_repository import cart_repository, CartRepository
+from app.repositories.product_repository import product_repository, ProductRepository
 
 class CartService:
     def __init__(
         self, 
         cart_repo: CartRepository = cart_repository,
-        product_srv: ProductService = product_service
+        product_repo: ProductRepository = product_repository
     ):
         self.cart_repo = cart_repo
-        self.product_srv = product_srv
+        self.product_repo = product_repo
 
     async def get_or_create_cart(self, user_id: PydanticObjectId) -> Cart:
-        cart = await self.cart_repo.get_by_user_id(user_id)
-        if not cart:
-            cart = await self.cart_repo.create(user_id)
-        return cart
+        return await self.cart_repo.get_or_create(user_id)
 
     async def add_item(
         self, 
@@ -26,54 +23,50 @@ class CartService:
         item_in: CartItemCreate
     ) -> Cart | str | None:
         
-        product = await self.product_srv.get_by_id(item_in.product_id)
-        if not product:
+        # Checked against live stock: the product cache does not see checkouts
+        stock = await self.product_repo.get_stock(item_in.product_id)
+        if stock is None:
             return None 
-        
-        cart = await self.get_or_create_cart(user_id)
-
-        existing_item = None
-        for item in cart.items:
-            if item.product_id == item_in.product_id:
-                existing_item = item
-                break
-        
-        new_quantity = 0
-        if existing_item:
-            new_quantity = existing_item.quantity + item_in.quantity
-        else:
-            new_quantity = item_in.quantity
 
-        if product.stock < new_quantity:
+        if stock < item_in.quantity:
             return "NOT_ENOUGH_STOCK"
 
-        if existing_item:
-            existing_item.quantity = new_quantity
-        else:
-            cart.items.append(CartItem(**item_in.model_dump()))
+        # Most adds are for a product that is not in the cart yet
+        cart = await self.cart_repo.push_item(
+            user_id, item_in.product_id, item_in.quantity
+        )
+        if cart:
+            return cart
 
-        await self.cart_repo.update(cart)
+        cart = await self.cart_repo.increment_item(
+            user_id, item_in.product_id, item_in.quantity, max_quantity=stock
+        )
+        if not cart:
+            return "NOT_ENOUGH_STOCK"
         return cart
 
+    async def update_item(
+        self,
+        user_id: PydanticObjectId,
+        product_id: PydanticObjectId,
+        quantity: int
+    ) -> Cart | str | None:
+
+        stock = await self.product_repo.get_stock(product_id)
+        if stock is None:
+            return None
+
+        if stock < quantity:
+            return "NOT_ENOUGH_STOCK"
+
+        return await self.cart_repo.set_item_quantity(user_id, product_id, quantity)
+
     async def remove_item(
         self, 
         user_id: PydanticObjectId, 
         product_id: PydanticObjectId
     ) -> Cart | None:
         
-        cart = await self.get_or_create_cart(user_id)
-        
-        item_to_remove = None
-        for item in cart.items:
-            if item.product_id == product_id:
-                item_to_remove = item
-                break
-
-        if not item_to_remove:
-            return None
-
-        cart.items.remove(item_to_remove)
-        await self.cart_repo.update(cart)
-        return cart
+        return await self.cart_repo.pull_item(user_id, product_id)
     
-cart_service = CartService()
\ No newline at end of file
+cart_service = CartService()
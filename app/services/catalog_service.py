@@ -0,0 +1,99 @@
+import hashlib
+from typing import Any, Mapping, NamedTuple
+from app.core.cache import ReadThroughCache
+from app.core.config import settings
+from app.core.metrics import timed
+from app.repositories.product_repository import STOCK_FIELDS
+from app.schemas.product import ProductFilter, ProductOut, ProductPage
+from app.services.product_service import product_service, ProductService
+from beanie import PydanticObjectId
+from pydantic import BaseModel
+
+class RenderedResponse(NamedTuple):
+    body: bytes
+    etag: str
+
+def render(model: BaseModel) -> RenderedResponse:
+    with timed("serialize"):
+        body = model.model_dump_json().encode()
+    # A strong ETag: the same bytes always get the same tag
+    return RenderedResponse(body, f'"{hashlib.sha256(body).hexdigest()[:32]}"')
+
+class CatalogService:
+    """
+    Serves the public catalog as already-encoded JSON bytes, so browsing
+    traffic skips the query, model validation and serialization.
+    Any product write drops that product's detail page and, unless it
+    only moved stock, every cached list page; they are rebuilt by the
+    next request.
+    """
+    def __init__(self, product_srv: ProductService = product_service):
+        self.product_srv = product_srv
+        self.pages: ReadThroughCache[tuple, RenderedResponse] = ReadThroughCache(
+            maxsize=settings.CATALOG_CACHE_SIZE,
+            ttl=settings.CATALOG_CACHE_TTL_SECONDS
+        )
+        self.details: ReadThroughCache[PydanticObjectId, RenderedResponse] = ReadThroughCache(
+            maxsize=settings.CATALOG_CACHE_SIZE,
+            ttl=settings.CATALOG_CACHE_TTL_SECONDS
+        )
+        product_srv.invalidation_bus.subscribe(self._on_invalidate)
+
+    async def get_page(
+        self,
+        limit: int,
+        filters: ProductFilter,
+        cursor: str | None = None
+    ) -> RenderedResponse | None:
+        """
+        Get a rendered page of products, or None if the cursor is invalid
+        """
+        async def load() -> RenderedResponse | None:
+            result = await self.product_srv.get_page(limit, filters, cursor)
+            if isinstance(result, str):
+                return None
+
+            products, next_cursor = result
+            page = ProductPage(
+                items=[
+                    ProductOut(
+                        id=str(p.id),
+                        name=p.name,
+                        description=p.description,
+                        price=p.price,
+                        stock=p.stock
+                    ) for p in products
+                ],
+                next_cursor=next_cursor
+            )
+            return render(page)
+
+        return await self.pages.get((limit, filters, cursor), load)
+
+    async def get_product(self, product_id: PydanticObjectId) -> RenderedResponse | None:
+        """
+        Get a rendered product, or None if it does not exist
+        """
+        async def load() -> RenderedResponse | None:
+            product = await self.product_srv.get_by_id(product_id)
+            if not product:
+                return None
+            return render(
+                ProductOut(
+                    id=str(product.id),
+                    name=product.name,
+                    description=product.description,
+                    price=product.price,
+                    stock=product.stock
+                )
+            )
+
+        return await self.details.get(product_id, load)
+
+    def _on_invalidate(self, product_id: Any | None, fields: Mapping[str, Any] | None) -> None:
+        # The stock shown on list pages is at most CATALOG_CACHE_TTL_SECONDS old
+        if fields is None or not fields.keys() <= STOCK_FIELDS:
+            self.pages.invalidate()
+        self.details.invalidate(product_id)
+
+catalog_service = CatalogService()
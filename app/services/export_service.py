@@ -0,0 +1,62 @@
+from typing import AsyncIterator, Dict, List, Literal, Type
+from beanie import Document
+from app.core.config import settings
+from app.core.formats import encode_csv, encode_ndjson, gzip_chunks
+from app.models.order import Order
+from app.models.product import Product
+from app.models.user import User
+from app.repositories.export_repository import export_repository, ExportRepository
+
+ExportFormat = Literal["ndjson", "csv"]
+
+# Exportable fields of each collection, in default column order.
+# Password hashes are never exported.
+EXPORTS: Dict[str, tuple[Type[Document], List[str]]] = {
+    "products": (Product, ["id", "name", "description", "price", "stock"]),
+    "orders": (
+        Order,
+        ["id", "user_id", "order_status", "total_price", "created_at",
+         "checkout_session_id", "items"]
+    ),
+    "users": (User, ["id", "first_name", "last_name", "email", "is_admin"]),
+}
+
+class ExportService:
+    def __init__(self, export_repo: ExportRepository = export_repository):
+        self.export_repo = export_repo
+
+    def resolve_fields(self, collection: str, fields: str | None) -> List[str] | str:
+        """
+        Parse a comma-separated field list, or use every exportable field
+        """
+        _, allowed = EXPORTS[collection]
+        if not fields:
+            return allowed
+        selected = list(dict.fromkeys(f.strip() for f in fields.split(",") if f.strip()))
+        if not selected or any(field not in allowed for field in selected):
+            return "INVALID_FIELDS"
+        return selected
+
+    def export(
+        self,
+        collection: str,
+        fields: List[str],
+        export_format: ExportFormat,
+        compress: bool = False,
+        batch_size: int | None = None
+    ) -> AsyncIterator[bytes]:
+        """
+        Stream a collection as NDJSON or CSV bytes. Only one batch of
+        documents is held in memory at a time.
+        """
+        model, _ = EXPORTS[collection]
+        batches = self.export_repo.iter_batches(
+            model, fields, batch_size or settings.EXPORT_BATCH_SIZE
+        )
+        if export_format == "csv":
+            chunks = encode_csv(batches, fields)
+        else:
+            chunks = encode_ndjson(batches)
+        return gzip_chunks(chunks) if compress else chunks
+
+export_service = ExportService()
@@ -1,46 +1,125 @@
-import stripe
+from datetime import datetime, timedelta
+from typing import Any, List, Mapping, Tuple
 from beanie import PydanticObjectId
+from motor.motor_asyncio import AsyncIOMotorClientSession
+from pymongo.errors import DuplicateKeyError
+from app.core.admission import AdmissionRejected, KeyedAdmission
+from app.core.circuit_breaker import CircuitOpenError
 from app.core.config import settings
-from app.models.order import Order
+from app.db import run_in_transaction, TransactionConflict
+from app.models.cart import Cart
+from app.models.order import Order, OrderItem, OrderSummaryView
+from app.models.product import Product
+from app.models.reservation import Reservation
+from app.models.webhook_event import utc_now
 from app.repositories.order_repository import order_repository, OrderRepository
-from app.repositories.product_repository import product_repository, ProductRepository
+from app.repositories.product_repository import (
+    product_repository,
+    ProductRepository,
+    InsufficientStockError
+)
 from app.repositories.cart_repository import cart_repository, CartRepository
+from app.repositories.reservation_repository import (
+    reservation_repository,
+    ReservationRepository
+)
+from app.services.reservation_service import (
+    item_quantities,
+    reservation_service,
+    ReservationService
+)
+from app.services.product_service import product_service, ProductService
+from app.services.stripe_service import stripe_service, StripeService
+
+# Stripe only accepts Checkout Session expiries between 30 minutes and 24 hours
+STRIPE_SESSION_MIN_SECONDS = 30 * 60 + 60
+STRIPE_SESSION_MAX_SECONDS = 24 * 60 * 60 - 60
+
+# How long a hold outlives its session, for a payment made just before the
+# session expired whose webhook arrives a little later
+HOLD_GRACE_SECONDS = 5 * 60
 
 class OrderService:
     def __init__(
         self,
         order_repo: OrderRepository = order_repository,
         cart_repo: CartRepository = cart_repository,
-        product_repo: ProductRepository = product_repository
+        product_repo: ProductRepository = product_repository,
+        stripe_srv: StripeService = stripe_service,
+        reservation_repo: ReservationRepository = reservation_repository,
+        reservation_srv: ReservationService = reservation_service,
+        product_srv: ProductService = product_service,
+        admission: KeyedAdmission[PydanticObjectId] | None = None
     ):
         self.order_repo = order_repo
         self.cart_repo = cart_repo
         self.product_repo = product_repo
+        self.stripe_srv = stripe_srv
+        self.reservation_repo = reservation_repo
+        self.reservation_srv = reservation_srv
+
+        # Checkouts of the same product take turns within this worker, so
+        # a hot product is not raced by requests that are bound to lose
+        self.admission = admission or KeyedAdmission(
+            concurrency=settings.CHECKOUT_CONCURRENCY_PER_PRODUCT,
+            max_waiters=settings.CHECKOUT_MAX_WAITERS_PER_PRODUCT,
+            timeout=settings.CHECKOUT_WAIT_SECONDS,
+            sold_out_ttl=settings.SOLD_OUT_TTL_SECONDS
+        )
+        # A product write may be a restock
+        product_srv.invalidation_bus.subscribe(self._on_product_changed)
 
     async def create_order_from_cart(
         self, 
-        user_id: PydanticObjectId
+        user_id: PydanticObjectId,
+        checkout_session_id: str | None = None
     ) -> Order | str:
         """
-        Create a new order from the user cart
+        Create a new order from the user cart.
+        Orders placed directly wait their turn per product and fail fast
+        once a product is sold out; orders for a paid Checkout Session
+        always go through.
         """
         # Get the user's cart
         cart = await self.cart_repo.get_by_user_id(user_id)
         if not cart or not cart.items:
             return "CART_EMPTY"
 
+        if checkout_session_id:
+            return await self._place_cart_order(user_id, cart, checkout_session_id)
+        try:
+            async with self.admission.admit(item.product_id for item in cart.items):
+                return await self._place_cart_order(user_id, cart)
+        except AdmissionRejected as e:
+            return self._rejection_code(e)
+
+    async def _place_cart_order(
+        self,
+        user_id: PydanticObjectId,
+        cart: Cart,
+        checkout_session_id: str | None = None
+    ) -> Order | str:
+        """
+        Check stock and prices, then take the stock, write the order and
+        clear the cart
+        """
         total_price = 0.0
         order_items = []
-        products_to_update = []
+        quantities: dict[PydanticObjectId, int] = {}
+
+        products = await self.product_repo.get_many(
+            item.product_id for item in cart.items
+        )
 
         # Check stock and get prices for all items
         for item in cart.items:
-            product = await self.product_repo.get(item.product_id)
+            product = products.get(item.product_id)
             
             if not product:
                 return "PRODUCT_NOT_FOUND"
             
             if product.stock < item.quantity:
+                self._note_stock_left(products, {item.product_id: 0})
                 return "NOT_ENOUGH_STOCK"
             
             price_at_purchase = product.price
@@ -52,27 +131,169 @@ class OrderService:
                 "price_at_purchase": price_at_purchase
             })
             
-            product.stock -= item.quantity
-            products_to_update.append(product)
+            quantities[item.product_id] = quantities.get(item.product_id, 0) + item.quantity
 
         order = Order(
             user_id=user_id,
             items=order_items,
             total_price=total_price,
-            order_status="paid"
+            order_status="paid",
+            checkout_session_id=checkout_session_id
         )
-        await self.order_repo.create(order)
-        
-        # Update product stocks
-        for product in products_to_update:
-            await self.product_repo.save(product)
 
-        # Clear the cart
-        cart.items = []
-        await self.cart_repo.update(cart)
+        # Take the stock, write the order and clear the cart together.
+        # Without transaction support the stock is given back by hand.
+        async def place(session: AsyncIOMotorClientSession | None) -> None:
+            await self.product_repo.decrement_stock(quantities, session=session)
+            try:
+                await self.order_repo.create(order, session=session)
+                await self.cart_repo.clear(user_id, session=session)
+            except Exception:
+                if session is None:
+                    await self.product_repo.increment_stock(quantities)
+                raise
+
+        try:
+            await run_in_transaction(place)
+        except InsufficientStockError:
+            return "NOT_ENOUGH_STOCK"
+        except TransactionConflict:
+            return "CHECKOUT_BUSY"
 
+        self._note_stock_left(products, quantities)
         return order
     
+    async def create_order_for_checkout(
+        self,
+        user_id: PydanticObjectId,
+        checkout_session_id: str,
+        reservation_id: PydanticObjectId | None = None
+    ) -> Order | str:
+        """
+        Create the order for a completed Checkout Session, at most once.
+        The session's stock reservation becomes the order when there is one.
+        """
+        existing = await self.order_repo.get_by_checkout_session_id(checkout_session_id)
+        if existing:
+            return existing
+
+        try:
+            if reservation_id:
+                order_or_error = await self._convert_reservation(
+                    user_id, reservation_id, checkout_session_id
+                )
+                if order_or_error is not None:
+                    return order_or_error
+            return await self.create_order_from_cart(user_id, checkout_session_id)
+        except DuplicateKeyError:
+            # A concurrent delivery of the same session won the race
+            order = await self.order_repo.get_by_checkout_session_id(checkout_session_id)
+            if not order:
+                raise
+            return order
+
+    async def _convert_reservation(
+        self,
+        user_id: PydanticObjectId,
+        reservation_id: PydanticObjectId,
+        checkout_session_id: str
+    ) -> Order | str | None:
+        """
+        Create the order from a reservation, at the prices it was charged at.
+        A hold that is still in place becomes the sale; if it already
+        expired the stock is taken again now. Returns None when there is
+        no such reservation for the user.
+        """
+        reservation = await self.reservation_repo.get_by_id(reservation_id)
+        if not reservation or reservation.user_id != user_id:
+            return None
+
+        order = Order(
+            user_id=user_id,
+            items=reservation.items,
+            total_price=reservation.total_price,
+            order_status="paid",
+            checkout_session_id=checkout_session_id
+        )
+        quantities = item_quantities(reservation.items)
+
+        async def convert(session: AsyncIOMotorClientSession | None) -> None:
+            claimed = await self.reservation_repo.transition(
+                reservation_id, "held", "converted", session=session
+            )
+            if not claimed:
+                await self.product_repo.decrement_stock(quantities, session=session)
+            try:
+                await self.order_repo.create(order, session=session)
+            except Exception:
+                if session is None:
+                    if claimed:
+                        await self.reservation_repo.transition(reservation_id, "converted", "held")
+                    else:
+                        await self.product_repo.increment_stock(quantities)
+                raise
+            if claimed:
+                await self.product_repo.commit_reserved(quantities, session=session)
+            await self.cart_repo.clear(user_id, session=session)
+
+        try:
+            await run_in_transaction(convert)
+        except InsufficientStockError:
+            return "NOT_ENOUGH_STOCK"
+        except TransactionConflict:
+            return "CHECKOUT_BUSY"
+
+        return order
+
+    async def get_orders_page(
+        self,
+        user_id: PydanticObjectId,
+        limit: int,
+        cursor: str | None = None,
+        order_status: str | None = None,
+        created_from: datetime | None = None,
+        created_to: datetime | None = None
+    ) -> Tuple[List[OrderSummaryView], str | None] | str:
+        """
+        Get a page of the user's order history and the cursor of the next page
+        """
+        after = None
+        if cursor:
+            try:
+                created_at, order_id = cursor.split("_")
+                after = (datetime.fromisoformat(created_at), PydanticObjectId(order_id))
+            except Exception:
+                return "INVALID_CURSOR"
+
+        # Fetch one extra row to find out whether another page exists
+        orders = await self.order_repo.get_page_for_user(
+            user_id,
+            limit + 1,
+            after=after,
+            order_status=order_status,
+            created_from=created_from,
+            created_to=created_to
+        )
+        if len(orders) <= limit:
+            return orders, None
+
+        orders = orders[:limit]
+        last = orders[-1]
+        return orders, f"{last.created_at.isoformat()}_{last.id}"
+
+    async def get_order(
+        self,
+        user_id: PydanticObjectId,
+        order_id: PydanticObjectId
+    ) -> Order | None:
+        """
+        Get one of the user's orders with its line items
+        """
+        order = await self.order_repo.get_by_id(order_id)
+        if not order or order.user_id != user_id:
+            return None
+        return order
+
     async def create_checkout_session(
         self, 
         user_id: PydanticObjectId
@@ -85,10 +306,110 @@ class OrderService:
         if not cart or not cart.items:
             return "CART_EMPTY"
 
-        # 2. Build the 'line_items' for Stripe
+        # 2. Pick the session's expiry first: the hold must last at least
+        # as long as the session can still be paid
+        session_seconds = min(
+            max(settings.RESERVATION_TTL_SECONDS, STRIPE_SESSION_MIN_SECONDS),
+            STRIPE_SESSION_MAX_SECONDS
+        )
+        expires_at = utc_now() + timedelta(seconds=session_seconds)
+
+        # 3. Build the 'line_items' for Stripe and hold the stock, taking
+        # turns with other checkouts of the same products
+        try:
+            async with self.admission.admit(item.product_id for item in cart.items):
+                held = await self._hold_cart(
+                    user_id, cart, expires_at + timedelta(seconds=HOLD_GRACE_SECONDS)
+                )
+        except AdmissionRejected as e:
+            return self._rejection_code(e)
+        if isinstance(held, str):
+            return held
+        reservation, line_items = held
+
+        # Define success and cancel URLs
+        success_url = f"http://localhost:8000/payment-success?user_id={user_id}"
+        cancel_url = "http://localhost:8000/payment-cancelled"
+
+        # Create the Stripe Checkout Session
+        try:
+            session = await self.stripe_srv.create_checkout_session({
+                'payment_method_types': ['card'],
+                'line_items': line_items,
+                'mode': 'payment',
+                'success_url': success_url,
+                'cancel_url': cancel_url,
+                'expires_at': int(expires_at.timestamp()),
+                'metadata': {
+                    "user_id": str(user_id),
+                    "reservation_id": str(reservation.id)
+                }
+            })
+        except CircuitOpenError:
+            await self._release_hold(reservation)
+            return "PAYMENT_UNAVAILABLE"
+        except Exception as e:
+            print(f"Error creating Stripe session: {e}")
+            await self._release_hold(reservation)
+            return "STRIPE_ERROR"
+
+        try:
+            # Lets a later checkout expire this session before releasing the hold
+            await self.reservation_repo.set_checkout_session(reservation.id, session.id) # pyright: ignore[reportArgumentType]
+        except Exception as e:
+            # The session is open, so keep the hold; it expires after the session
+            print(f"Could not link reservation {reservation.id} to its Checkout Session: {e}")
+        return {"url": session.url}
+
+    async def _release_hold(self, reservation: Reservation) -> None:
+        try:
+            await self.reservation_srv.release(reservation.id) # pyright: ignore[reportArgumentType]
+        except TransactionConflict:
+            # The sweeper releases it once it expires
+            print(f"Could not release reservation {reservation.id} now, leaving it to expire")
+
+    async def _release_user_holds(self, user_id: PydanticObjectId) -> None:
+        """
+        Release the user's previous holds, so abandoned checkouts do not pile
+        up. A hold is only released once its Checkout Session is expired and
+        can no longer be paid; holds that cannot be released yet are left to
+        their payment or to expiry.
+        """
+        for reservation in await self.reservation_repo.get_held_for_user(user_id):
+            if not reservation.checkout_session_id:
+                # Its session is still being created, or was never linked
+                continue
+            try:
+                status = await self.stripe_srv.expire_checkout_session(reservation.checkout_session_id)
+            except Exception as e:
+                print(f"Could not expire Checkout Session {reservation.checkout_session_id}: {e}")
+                continue
+            if status == "expired":
+                await self.reservation_srv.release(reservation.id) # pyright: ignore[reportArgumentType]
+
+    async def _hold_cart(
+        self,
+        user_id: PydanticObjectId,
+        cart: Cart,
+        expires_at: datetime
+    ) -> Tuple[Reservation, List[dict]] | str:
+        """
+        Reserve the cart's items until expires_at and build the Stripe line items
+        """
+        # Replace the user's previous hold, before reading the stock it frees
+        try:
+            await self._release_user_holds(user_id)
+        except TransactionConflict:
+            return "CHECKOUT_BUSY"
+
+        products = await self.product_repo.get_many(
+            item.product_id for item in cart.items
+        )
         line_items = []
+        order_items = []
+        total_price = 0.0
         for item in cart.items:
-            product = await self.product_repo.get(item.product_id)
+            product = products.get(item.product_id)
             if not product:
                 return "PRODUCT_NOT_FOUND"
             
@@ -103,26 +424,47 @@ class OrderService:
                 },
                 'quantity': item.quantity,
             })
+            order_items.append(OrderItem(
+                product_id=item.product_id,
+                quantity=item.quantity,
+                price_at_purchase=product.price
+            ))
+            total_price += item.quantity * product.price
 
-        # Define success and cancel URLs
-        success_url = f"http://localhost:8000/payment-success?user_id={user_id}"
-        cancel_url = "http://localhost:8000/payment-cancelled"
+        # Hold the stock until the session is paid or expires
+        reservation = await self.reservation_srv.hold(user_id, order_items, total_price, expires_at)
+        if isinstance(reservation, str):
+            if reservation == "NOT_ENOUGH_STOCK":
+                self._note_stock_left(products, {product_id: 0 for product_id in products})
+            return reservation
 
-        # Create the Stripe Checkout Session
-        try:
-            session = stripe.checkout.Session.create(
-                payment_method_types=['card'],
-                line_items=line_items,
-                mode='payment',
-                success_url=success_url,
-                cancel_url=cancel_url,
-                metadata={
-                    "user_id": str(user_id)
-                }
-            )
-            return {"url": session.url}
-        except Exception as e:
-            print(f"Error creating Stripe session: {e}")
-            return "STRIPE_ERROR"
+        self._note_stock_left(products, item_quantities(order_items))
+        return reservation, line_items
+
+    def _note_stock_left(
+        self,
+        products: Mapping[PydanticObjectId, Product],
+        taken: Mapping[PydanticObjectId, int]
+    ) -> None:
+        """
+        Mark the products that have no stock left after taking the given
+        quantities, going by the stock just read
+        """
+        for product_id, quantity in taken.items():
+            product = products.get(product_id)
+            if product and product.stock - quantity <= 0:
+                self.admission.mark_sold_out(product_id)
+
+    def _rejection_code(self, error: AdmissionRejected) -> str:
+        return "SOLD_OUT" if error.reason == "SOLD_OUT" else "CHECKOUT_BUSY"
+
+    def _on_product_changed(self, product_id: Any | None, fields: Mapping[str, Any] | None) -> None:
+        # Only a write that may leave stock on hand is a restock; the
+        # decrement that sold the product out must not clear its own mark
+        if fields is not None:
+            stock = fields.get("stock", 0)
+            if stock is not None and stock <= 0:
+                return
+        self.admission.clear_sold_out(product_id)
 
 order_service = OrderService()
\ No newline at end of file
@@ -1,30 +1,88 @@
-from typing import List
-from app.models.product import Product
-from app.schemas.product import ProductCreate, ProductUpdate
-from app.repositories.product_repository import product_repository, ProductRepository
+from typing import Any, List, Mapping, Tuple
+from app.core.cache import ReadThroughCache
+from app.core.config import settings
+from app.core.invalidation import InvalidationBus, create_invalidation_bus
+from app.models.product import Product, ProductListView
+from app.schemas.product import ProductCreate, ProductFilter, ProductUpdate
+from app.repositories.product_repository import (
+    product_repository,
+    ProductRepository,
+    PRODUCT_SORTS,
+    STOCK_FIELDS
+)
 from beanie import PydanticObjectId
 
 class ProductService:
-    def __init__(self, product_repo: ProductRepository = product_repository):
+    def __init__(
+        self,
+        product_repo: ProductRepository = product_repository,
+        invalidation_bus: InvalidationBus | None = None
+    ):
         self.product_repo = product_repo
+        self.cache: ReadThroughCache[PydanticObjectId, Product] = ReadThroughCache(
+            maxsize=settings.PRODUCT_CACHE_SIZE,
+            ttl=settings.PRODUCT_CACHE_TTL_SECONDS
+        )
+
+        self.invalidation_bus = invalidation_bus or create_invalidation_bus(
+            settings.CACHE_INVALIDATION_BACKEND,
+            Product.get_pymongo_collection
+        )
+        self.invalidation_bus.subscribe(self._on_invalidate)
 
     async def get_by_id(self, product_id: PydanticObjectId) -> Product | None:
         """
-        Get a product by ID
+        Get a product by ID, served from the product cache when possible
         """
-        return await self.product_repo.get(product_id)
+        return await self.cache.get(
+            product_id, lambda: self.product_repo.get(product_id)
+        )
 
-    async def get_all(self) -> List[Product]:
+    async def get_page(
+        self,
+        limit: int,
+        filters: ProductFilter,
+        cursor: str | None = None
+    ) -> Tuple[List[ProductListView], str | None] | str:
         """
-        Get all products
+        Get a page of filtered products and the cursor of the next page.
+        The cursor holds the sort key values of the last product, joined by "_".
         """
-        return await self.product_repo.get_all()
+        sort_fields = [field for field, _ in PRODUCT_SORTS[filters.sort]]
+
+        after = None
+        if cursor:
+            values = cursor.split("_")
+            if len(values) != len(sort_fields):
+                return "INVALID_CURSOR"
+            try:
+                after = tuple(
+                    PydanticObjectId(value) if field == "_id" else float(value)
+                    for field, value in zip(sort_fields, values)
+                )
+            except Exception:
+                return "INVALID_CURSOR"
+
+        # Fetch one extra row to find out whether another page exists
+        products = await self.product_repo.get_page(limit + 1, filters, after)
+        if len(products) <= limit:
+            return products, None
+
+        products = products[:limit]
+        last = products[-1]
+        next_cursor = "_".join(
+            str(last.id) if field == "_id" else repr(getattr(last, field))
+            for field in sort_fields
+        )
+        return products, next_cursor
 
     async def create(self, product_in: ProductCreate) -> Product:
         """
         Create a new product
         """
-        return await self.product_repo.create(product_in)
+        product = await self.product_repo.create(product_in)
+        await self.invalidation_bus.publish(product.id)
+        return product
 
     async def update(
         self, 
@@ -38,7 +96,9 @@ class ProductService:
         if not product:
             return None
         
-        return await self.product_repo.update(product, product_in)
+        product = await self.product_repo.update(product, product_in)
+        await self.invalidation_bus.publish(product_id)
+        return product
 
     async def delete(self, product_id: PydanticObjectId) -> bool:
         """
@@ -49,6 +109,29 @@ class ProductService:
             return False
             
         await self.product_repo.delete(product)
+        await self.invalidation_bus.publish(product_id)
         return True
 
-product_service = ProductService()
\ No newline at end of file
+    async def set_stock_shards(
+        self,
+        product_id: PydanticObjectId,
+        shard_count: int
+    ) -> Product | str | None:
+        """
+        Split a hot product's stock over several shard documents, or fold
+        it back into the product with 0
+        """
+        if shard_count and not settings.STOCK_SHARDING:
+            return "STOCK_SHARDING_DISABLED"
+        if not await self.product_repo.set_stock_shards(product_id, shard_count):
+            return None
+        await self.invalidation_bus.publish(product_id)
+        return await self.product_repo.get(product_id)
+
+    def _on_invalidate(self, product_id: Any | None, fields: Mapping[str, Any] | None) -> None:
+        self.cache.invalidate(product_id)
+        if fields is None or not fields.keys() <= STOCK_FIELDS:
+            # Caches rebuilt now must not be filled from a lagging secondary
+            self.product_repo.read_catalog_from_primary(settings.MONGO_CATALOG_PRIMARY_AFTER_WRITE_SECONDS)
+
+product_service = ProductService()
@@ -0,0 +1,150 @@
+import asyncio
+from datetime import datetime
+from typing import Dict, Iterable, List
+from beanie import PydanticObjectId
+from motor.motor_asyncio import AsyncIOMotorClientSession
+from app.core.config import settings
+from app.db import run_in_transaction, TransactionConflict
+from app.models.order import OrderItem
+from app.models.reservation import Reservation
+from app.repositories.product_repository import (
+    product_repository,
+    ProductRepository,
+    InsufficientStockError
+)
+from app.repositories.reservation_repository import (
+    reservation_repository,
+    ReservationRepository
+)
+from app.services.product_service import product_service, ProductService
+
+def item_quantities(items: Iterable[OrderItem]) -> Dict[PydanticObjectId, int]:
+    """
+    Total quantity per product, for items that may repeat a product
+    """
+    quantities: Dict[PydanticObjectId, int] = {}
+    for item in items:
+        quantities[item.product_id] = quantities.get(item.product_id, 0) + item.quantity
+    return quantities
+
+class ReservationService:
+    """
+    Holds stock between checkout and payment. A hold takes the units off
+    available stock straight away and counts them as reserved; payment
+    turns the hold into a sale and expiry gives the units back. A
+    background sweeper releases holds whose payment never arrived.
+    """
+    def __init__(
+        self,
+        reservation_repo: ReservationRepository = reservation_repository,
+        product_repo: ProductRepository = product_repository,
+        product_srv: ProductService = product_service
+    ):
+        self.reservation_repo = reservation_repo
+        self.product_repo = product_repo
+        self.product_srv = product_srv
+        self._sweeper: asyncio.Task | None = None
+
+    async def hold(
+        self,
+        user_id: PydanticObjectId,
+        items: List[OrderItem],
+        total_price: float,
+        expires_at: datetime
+    ) -> Reservation | str:
+        """
+        Reserve the items for the user until expires_at
+        """
+        quantities = item_quantities(items)
+        reservation = Reservation(
+            user_id=user_id,
+            items=items,
+            total_price=total_price,
+            expires_at=expires_at
+        )
+        async def hold(session: AsyncIOMotorClientSession | None) -> None:
+            await self.product_repo.decrement_stock(quantities, session=session, reserve=True)
+            try:
+                await self.reservation_repo.create(reservation, session=session)
+            except Exception:
+                if session is None:
+                    await self.product_repo.release_reserved(quantities)
+                raise
+
+        try:
+            await run_in_transaction(hold)
+        except InsufficientStockError:
+            return "NOT_ENOUGH_STOCK"
+        except TransactionConflict:
+            return "CHECKOUT_BUSY"
+        return reservation
+
+    async def release(self, reservation_id: PydanticObjectId) -> bool:
+        """
+        Give a held reservation's units back to stock.
+        Returns False if it was no longer held.
+        Raises TransactionConflict if concurrent writes kept conflicting.
+        """
+        async def release(session: AsyncIOMotorClientSession | None) -> Reservation | None:
+            reservation = await self.reservation_repo.transition(
+                reservation_id, "held", "released", session=session
+            )
+            if reservation is not None:
+                await self.product_repo.release_reserved(
+                    item_quantities(reservation.items), session=session
+                )
+            return reservation
+
+        reservation = await run_in_transaction(release)
+        if reservation is None:
+            return False
+        await self._publish_restock(reservation)
+        return True
+
+    async def release_expired(self) -> int:
+        """
+        Release every expired hold and return how many there were
+        """
+        async def release_next(session: AsyncIOMotorClientSession | None) -> Reservation | None:
+            reservation = await self.reservation_repo.claim_next_expired(session=session)
+            if reservation is not None:
+                await self.product_repo.release_reserved(
+                    item_quantities(reservation.items), session=session
+                )
+            return reservation
+
+        released = 0
+        while True:
+            reservation = await run_in_transaction(release_next)
+            if reservation is None:
+                return released
+            await self._publish_restock(reservation)
+            released += 1
+
+    async def _publish_restock(self, reservation: Reservation) -> None:
+        # Released units are available again: refresh caches and sold-out
+        # marks. Only stock changed, and at least this many units are on hand.
+        for product_id, quantity in item_quantities(reservation.items).items():
+            await self.product_srv.invalidation_bus.publish(product_id, {"stock": quantity})
+
+    def start(self) -> None:
+        self._sweeper = asyncio.create_task(self._run_sweeper(), name="reservation-sweeper")
+
+    async def stop(self) -> None:
+        if self._sweeper is None:
+            return
+        self._sweeper.cancel()
+        await asyncio.gather(self._sweeper, return_exceptions=True)
+        self._sweeper = None
+
+    async def _run_sweeper(self) -> None:
+        while True:
+            try:
+                released = await self.release_expired()
+                if released:
+                    print(f"Released {released} expired stock reservations.")
+            except Exception as e:
+                print(f"Reservation sweeper failed: {e}")
+            await asyncio.sleep(settings.RESERVATION_SWEEP_SECONDS)
+
+reservation_service = ReservationService()
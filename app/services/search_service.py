@@ -0,0 +1,443 @@
+import asyncio
+import bisect
+import heapq
+import logging
+import math
+import re
+import statistics
+import time
+from collections import Counter
+from typing import Any, Iterator, List, Mapping, Sequence, Tuple
+
+from beanie import PydanticObjectId
+from app.core.config import settings
+from app.models.product import ProductListView
+from app.repositories.product_repository import product_repository, ProductRepository
+from app.services.product_service import product_service, ProductService
+
+logger = logging.getLogger(__name__)
+
+TOKEN_RE = re.compile(r"\w+")
+
+def tokenize(text: str) -> list[str]:
+    return TOKEN_RE.findall(text.lower())
+
+class InvertedIndex:
+    """
+    In-process full-text index over product name and description.
+    Matches must contain every query term, and the last term also matches
+    as a prefix for autocomplete. Results are ranked with BM25, with name
+    terms weighted above description terms.
+
+    Products are numbered densely and each posting maps a number to the
+    term's BM25 weight in that product, quantized to a byte. A query walks
+    the posting of its rarest term best weight first, looks each product up
+    in the other terms' postings, and stops once no later product can make
+    the page, so it never materializes whole postings.
+    """
+    NAME_WEIGHT = 3
+    K1 = 1.2
+    B = 0.75
+    # Prefix matches rank a little below the exact word
+    PREFIX_PENALTY = 0.8
+    # Completions of a partial word that are searched, most frequent first
+    MAX_PREFIX_EXPANSIONS = 16
+    # Vocabulary scanned for those completions, so a short prefix stays cheap
+    MAX_PREFIX_CANDIDATES = 2_048
+    IMPACT_LEVELS = 255
+    # Products whose length sets the average length of a bulk build
+    LENGTH_SAMPLE = 1_000
+    # Postings at least this long are ranked while building, not on first use
+    RANK_AHEAD_POSTINGS = 256
+
+    def __init__(self, average_length: float | None = None):
+        self.postings: dict[str, dict[int, int]] = {}
+        # Product numbers of a posting, highest weight first; kept up to date once built
+        self._ranked: dict[str, list[int]] = {}
+        self._numbers: dict[PydanticObjectId, int] = {}
+        self._ids: list[PydanticObjectId | None] = []
+        self._terms: list[tuple[str, ...]] = []
+        self._lengths: list[int] = []
+        self._free: list[int] = []
+        self.total_length = 0
+        # Fixed by a bulk build; otherwise the running average is used
+        self.average_length = average_length
+        # Sorted terms for prefix lookups, built on first use
+        self._vocabulary: list[str] | None = None
+
+    def __len__(self) -> int:
+        return len(self._numbers)
+
+    @classmethod
+    def build(
+        cls, documents: Sequence[tuple[PydanticObjectId, str, str]]
+    ) -> "InvertedIndex":
+        """
+        Index a whole catalog. CPU-bound, so callers run it in a worker
+        thread; the index is not shared until it is returned.
+        """
+        sample = documents[:cls.LENGTH_SAMPLE]
+        lengths = [sum(cls._weigh(name, description).values()) for _, name, description in sample]
+        index = cls(average_length=statistics.fmean(lengths) if lengths else None)
+        for product_id, name, description in documents:
+            index.add(product_id, name, description)
+
+        index._vocabulary = sorted(index.postings)
+        for term, posting in index.postings.items():
+            if len(posting) >= cls.RANK_AHEAD_POSTINGS:
+                index._rank(term)
+        return index
+
+    @classmethod
+    def _weigh(cls, name: str, description: str) -> Counter[str]:
+        weights: Counter[str] = Counter()
+        for term in tokenize(name):
+            weights[term] += cls.NAME_WEIGHT
+        for term in tokenize(description):
+            weights[term] += 1
+        return weights
+
+    def add(self, product_id: PydanticObjectId, name: str, description: str) -> None:
+        self.remove(product_id)
+
+        weights = self._weigh(name, description)
+        length = sum(weights.values())
+        if self._free:
+            number = self._free.pop()
+            self._ids[number] = product_id
+            self._terms[number] = tuple(weights)
+            self._lengths[number] = length
+        else:
+            number = len(self._ids)
+            self._ids.append(product_id)
+            self._terms.append(tuple(weights))
+            self._lengths.append(length)
+        self._numbers[product_id] = number
+        self.total_length += length
+
+        average_length = self.average_length or self.total_length / len(self._numbers)
+        norm = self.K1 * (1 - self.B + self.B * length / average_length)
+        for term, weight in weights.items():
+            impact = weight * (self.K1 + 1) / (weight + norm)
+            posting = self.postings.get(term)
+            if posting is None:
+                posting = self.postings[term] = {}
+                if self._vocabulary is not None:
+                    bisect.insort(self._vocabulary, term)
+            posting[number] = max(1, round(self.IMPACT_LEVELS * impact / (self.K1 + 1)))
+            ranked = self._ranked.get(term)
+            if ranked is not None:
+                bisect.insort(ranked, number, key=lambda n: -posting[n])
+
+    def remove(self, product_id: PydanticObjectId) -> None:
+        number = self._numbers.pop(product_id, None)
+        if number is None:
+            return
+
+        for term in self._terms[number]:
+            posting = self.postings[term]
+            ranked = self._ranked.get(term)
+            if ranked is not None:
+                start = bisect.bisect_left(ranked, -posting[number], key=lambda n: -posting[n])
+                del ranked[ranked.index(number, start)]
+            del posting[number]
+            if not posting:
+                del self.postings[term]
+                self._ranked.pop(term, None)
+                if self._vocabulary is not None:
+                    del self._vocabulary[bisect.bisect_left(self._vocabulary, term)]
+
+        self.total_length -= self._lengths[number]
+        self._ids[number] = None
+        self._terms[number] = ()
+        self._free.append(number)
+
+    def search(
+        self,
+        query: str,
+        offset: int,
+        limit: int,
+        prefix: bool = True
+    ) -> list[PydanticObjectId]:
+        """
+        Get the IDs of the matching products, best first
+        """
+        terms = tokenize(query)
+        wanted = offset + limit
+        if not terms or not self._numbers or wanted <= 0:
+            return []
+
+        # Each group lists alternative terms, with the factor that turns
+        # their stored weight into a score; a product must match every group
+        document_count = len(self._numbers)
+        groups: list[list[tuple[str, float]]] = []
+        for position, term in enumerate(terms):
+            if prefix and position == len(terms) - 1:
+                alternatives = self._expand(term)
+            else:
+                alternatives = [term] if term in self.postings else []
+            if not alternatives:
+                return []
+            groups.append([
+                (
+                    alternative,
+                    self._idf(alternative, document_count) / self.IMPACT_LEVELS
+                    * (1.0 if alternative == term else self.PREFIX_PENALTY)
+                )
+                for alternative in alternatives
+            ])
+
+        # Walk the group that can add the most to a score (its rarest term)
+        # best first, and probe the other groups' postings for each product.
+        # Whatever the walk meets later scores less, so it stops once even
+        # the best the other groups can add would not make the page.
+        groups.sort(
+            key=lambda group: max(factor * self._peak(term) for term, factor in group),
+            reverse=True
+        )
+        probed = [[(self.postings[term], factor) for term, factor in group] for group in groups[1:]]
+        headroom = sum(
+            max(factor * self._peak(term) for term, factor in group) for group in groups[1:]
+        )
+
+        # Ties go to the product met first. Every page meets products in the
+        # same order, so pages never overlap or skip a product.
+        top: list[tuple[float, int, int]] = []
+        for met, (score, number) in enumerate(self._walk(groups[0])):
+            if len(top) == wanted and score + headroom <= top[0][0]:
+                break
+            total = self._score(number, probed)
+            if total is None:
+                continue
+            entry = (total + score, -met, number)
+            if len(top) < wanted:
+                heapq.heappush(top, entry)
+            elif entry > top[0]:
+                heapq.heapreplace(top, entry)
+
+        top.sort(reverse=True)
+        return [self._ids[number] for _, _, number in top[offset:]]
+
+    @staticmethod
+    def _score(number: int, groups: list[list[tuple[dict[int, int], float]]]) -> float | None:
+        # Sum of the product's best score in each group, None unless it matches all
+        total = 0.0
+        for alternatives in groups:
+            best = 0.0
+            for posting, factor in alternatives:
+                impact = posting.get(number)
+                if impact is not None and impact * factor > best:
+                    best = impact * factor
+            if not best:
+                return None
+            total += best
+        return total
+
+    def _walk(self, group: list[tuple[str, float]]) -> Iterator[tuple[float, int]]:
+        # Products of the group with their best score in it, highest first
+        if len(group) == 1:
+            term, factor = group[0]
+            posting = self.postings[term]
+            return ((factor * posting[number], number) for number in self._rank(term))
+
+        def scored(term: str, factor: float) -> Iterator[tuple[float, int]]:
+            posting = self.postings[term]
+            for number in self._rank(term):
+                yield -factor * posting[number], number
+
+        def merged() -> Iterator[tuple[float, int]]:
+            seen = set()
+            for score, number in heapq.merge(*(scored(term, factor) for term, factor in group)):
+                if number not in seen:
+                    seen.add(number)
+                    yield -score, number
+        return merged()
+
+    def _rank(self, term: str) -> list[int]:
+        ranked = self._ranked.get(term)
+        if ranked is None:
+            posting = self.postings[term]
+            # Stable, so equal weights stay in insertion order, as insort keeps them
+            ranked = self._ranked[term] = sorted(posting, key=posting.__getitem__, reverse=True)
+        return ranked
+
+    def _peak(self, term: str) -> int:
+        # Highest weight in the posting
+        ranked = self._ranked.get(term)
+        if ranked is not None:
+            return self.postings[term][ranked[0]]
+        return max(self.postings[term].values())
+
+    def _idf(self, term: str, document_count: int) -> float:
+        frequency = len(self.postings[term])
+        return math.log(1 + (document_count - frequency + 0.5) / (frequency + 0.5))
+
+    def _expand(self, prefix: str) -> list[str]:
+        # The word itself and its most frequent completions
+        if self._vocabulary is None:
+            self._vocabulary = sorted(self.postings)
+
+        start = bisect.bisect_left(self._vocabulary, prefix)
+        completions = []
+        for term in self._vocabulary[start:start + self.MAX_PREFIX_CANDIDATES]:
+            if not term.startswith(prefix):
+                break
+            if term != prefix:
+                completions.append(term)
+
+        terms = [prefix] if prefix in self.postings else []
+        limit = self.MAX_PREFIX_EXPANSIONS - len(terms)
+        terms += heapq.nlargest(limit, completions, key=lambda term: len(self.postings[term]))
+        return terms
+
+class MongoTextSearchBackend:
+    """
+    Searches with the products text index. Matches whole (stemmed) words
+    only, so prefix matching is not available.
+    """
+    def __init__(self, product_repo: ProductRepository = product_repository):
+        self.product_repo = product_repo
+
+    async def start(self) -> None:
+        pass
+
+    async def stop(self) -> None:
+        pass
+
+    async def search(self, query: str, offset: int, limit: int) -> List[ProductListView]:
+        return await self.product_repo.search_text(query, offset, limit)
+
+class InMemorySearchBackend:
+    """
+    Searches an in-process inverted index, then loads the current fields
+    of the page of matches with one $in query. The index is built at
+    startup and kept in sync through the product invalidation bus.
+    """
+    def __init__(
+        self,
+        product_repo: ProductRepository = product_repository,
+        product_srv: ProductService = product_service
+    ):
+        self.product_repo = product_repo
+        self.index = InvertedIndex()
+        self._tasks: set[asyncio.Task] = set()
+        self._rebuild: asyncio.Task | None = None
+        self._rebuild_again = False
+        self._changed_during_rebuild: set[PydanticObjectId] | None = None
+        product_srv.invalidation_bus.subscribe(self._on_invalidate)
+
+    async def start(self) -> None:
+        await self.rebuild()
+
+    async def stop(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+
+    async def rebuild(self) -> None:
+        # Products changed while the new index is built are reindexed into it
+        self._changed_during_rebuild = set()
+        try:
+            started = time.perf_counter()
+            documents = [
+                (product.id, product.name, product.description)
+                async for product in self.product_repo.iter_search_documents()
+            ]
+            # Tokenizing a large catalog takes seconds; keep it off the event loop
+            index = await asyncio.to_thread(InvertedIndex.build, documents)
+            self.index = index
+            changed = self._changed_during_rebuild
+        finally:
+            self._changed_during_rebuild = None
+
+        for product_id in changed:
+            await self._reindex(product_id)
+        logger.info(
+            "Search index built with %d products in %.1fs.",
+            len(index), time.perf_counter() - started
+        )
+
+    async def search(self, query: str, offset: int, limit: int) -> List[ProductListView]:
+        product_ids = self.index.search(query, offset, limit)
+        products = await self.product_repo.get_many(product_ids)
+        return [
+            ProductListView.model_validate(products[product_id].model_dump(by_alias=True))
+            for product_id in product_ids
+            if product_id in products
+        ]
+
+    async def _reindex(self, product_id: PydanticObjectId) -> None:
+        product = await self.product_repo.get(product_id)
+        if product is None:
+            self.index.remove(product_id)
+        else:
+            self.index.add(product_id, product.name, product.description)
+
+    async def _rebuild_coalesced(self) -> None:
+        # Invalidations that arrive during a rebuild are covered by one more
+        while True:
+            self._rebuild_again = False
+            try:
+                await self.rebuild()
+            except Exception as e:
+                logger.warning("Could not rebuild the search index: %s", e)
+            if not self._rebuild_again:
+                return
+
+    def _on_invalidate(self, product_id: Any | None, fields: Mapping[str, Any] | None) -> None:
+        if product_id is None:
+            if self._rebuild is not None and not self._rebuild.done():
+                self._rebuild_again = True
+                return
+            task = self._rebuild = asyncio.create_task(self._rebuild_coalesced())
+        elif fields is not None and not fields.keys() & {"name", "description"}:
+            # Only the indexed fields need a reindex; stock writes are frequent
+            return
+        else:
+            if self._changed_during_rebuild is not None:
+                self._changed_during_rebuild.add(product_id)
+            task = asyncio.create_task(self._reindex(product_id))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+def create_search_backend(backend: str) -> MongoTextSearchBackend | InMemorySearchBackend:
+    if backend == "memory":
+        return InMemorySearchBackend()
+    if backend == "mongo":
+        return MongoTextSearchBackend()
+    raise ValueError(f"Unknown product search backend: {backend}")
+
+class SearchService:
+    def __init__(self, backend: MongoTextSearchBackend | InMemorySearchBackend | None = None):
+        self.backend = backend or create_search_backend(settings.PRODUCT_SEARCH_BACKEND)
+
+    async def search_products(
+        self,
+        query: str,
+        limit: int,
+        cursor: str | None = None
+    ) -> Tuple[List[ProductListView], str | None] | str:
+        """
+        Get a page of products matching the query, best first, and the
+        cursor of the next page
+        """
+        offset = 0
+        if cursor:
+            try:
+                offset = int(cursor)
+            except ValueError:
+                return "INVALID_CURSOR"
+            if offset < 0:
+                return "INVALID_CURSOR"
+
+        # Ranking gets more expensive the deeper the page
+        if offset + limit > settings.PRODUCT_SEARCH_MAX_RESULTS:
+            return [], None
+
+        # Fetch one extra row to find out whether another page exists
+        products = await self.backend.search(query, offset, limit + 1)
+        if len(products) <= limit:
+            return products, None
+        return products[:limit], str(offset + limit)
+
+search_service = SearchService()
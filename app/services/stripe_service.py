@@ -0,0 +1,96 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from typing import Callable, TypeVar
+
+import stripe
+from app.core.circuit_breaker import CircuitBreaker
+from app.core.config import settings
+
+T = TypeVar("T")
+
+# Errors that mean Stripe itself is struggling, as opposed to a bad request
+TRANSIENT_ERRORS = (stripe.APIConnectionError, stripe.RateLimitError, stripe.APIError)
+
+class StripeService:
+    """
+    Calls Stripe from a bounded thread pool so the event loop never waits
+    on the network. Each pool thread keeps its own pooled requests session.
+    Network errors are retried by the SDK with exponential backoff and
+    jitter, and a circuit breaker fails fast while Stripe is degraded.
+    """
+    def __init__(self):
+        base_addresses = {}
+        if settings.STRIPE_API_BASE:
+            # e.g. a local stripe-mock server
+            base_addresses["api"] = settings.STRIPE_API_BASE
+
+        self.client = stripe.StripeClient(
+            settings.STRIPE_SECRET_KEY,
+            http_client=stripe.RequestsClient(
+                timeout=(
+                    settings.STRIPE_CONNECT_TIMEOUT_SECONDS,
+                    settings.STRIPE_READ_TIMEOUT_SECONDS
+                )
+            ),
+            max_network_retries=settings.STRIPE_MAX_RETRIES,
+            base_addresses=base_addresses # pyright: ignore[reportArgumentType]
+        )
+        self.executor = ThreadPoolExecutor(
+            max_workers=settings.STRIPE_MAX_CONCURRENCY,
+            thread_name_prefix="stripe"
+        )
+        self.breaker = CircuitBreaker(
+            failure_threshold=settings.STRIPE_BREAKER_FAILURES,
+            reset_timeout=settings.STRIPE_BREAKER_RESET_SECONDS
+        )
+
+    async def create_checkout_session(self, params: dict) -> stripe.checkout.Session:
+        """
+        Create a Checkout Session.
+        Raises CircuitOpenError without calling Stripe while the circuit is open.
+        """
+        return await self._call(
+            partial(self.client.v1.checkout.sessions.create, params=params) # pyright: ignore[reportArgumentType]
+        )
+
+    async def expire_checkout_session(self, session_id: str) -> str:
+        """
+        Expire an open Checkout Session so it can no longer be paid, and
+        return its status afterwards: "expired", or "complete" if it was
+        paid first
+        """
+        try:
+            session = await self._call(partial(self.client.v1.checkout.sessions.expire, session_id))
+        except stripe.InvalidRequestError:
+            # Only open sessions can be expired; find out what it is instead
+            session = await self._call(partial(self.client.v1.checkout.sessions.retrieve, session_id))
+        return session.status # pyright: ignore[reportReturnType]
+
+    async def _call(self, func: Callable[[], T]) -> T:
+        """
+        Run a Stripe call on the pool, through the circuit breaker
+        """
+        self.breaker.before_call()
+
+        loop = asyncio.get_running_loop()
+        try:
+            result = await loop.run_in_executor(self.executor, func)
+        except TRANSIENT_ERRORS:
+            self.breaker.record_failure()
+            raise
+        except Exception:
+            # Bad requests are our fault, not a sign that Stripe is down
+            self.breaker.record_success()
+            raise
+        except BaseException:
+            self.breaker.record_abandoned()
+            raise
+
+        self.breaker.record_success()
+        return result
+
+    def close(self) -> None:
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+stripe_service = StripeService()
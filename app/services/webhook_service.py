@@ -0,0 +1,151 @@
+import asyncio
+import random
+from datetime import timedelta
+from typing import Any
+
+from beanie import PydanticObjectId
+from app.core.config import settings
+from app.models.webhook_event import WebhookEvent, utc_now
+from app.repositories.webhook_repository import webhook_repository, WebhookRepository
+from app.services.order_service import order_service, OrderService
+from app.services.reservation_service import reservation_service, ReservationService
+
+class PermanentWebhookError(Exception):
+    """
+    Raised when retrying an event cannot succeed
+    """
+
+class WebhookService:
+    """
+    Stripe events are stored first and processed later by a small pool of
+    background workers, so the webhook can be acknowledged right away.
+    Failed events are retried with backoff, then moved to a dead-letter
+    collection.
+    """
+    def __init__(
+        self,
+        webhook_repo: WebhookRepository = webhook_repository,
+        order_srv: OrderService = order_service,
+        reservation_srv: ReservationService = reservation_service
+    ):
+        self.webhook_repo = webhook_repo
+        self.order_srv = order_srv
+        self.reservation_srv = reservation_srv
+        self._wakeup = asyncio.Event()
+        self._workers: list[asyncio.Task] = []
+
+    async def enqueue(self, event: Any) -> bool | str:
+        """
+        Store a verified event for processing. Redeliveries of an event
+        that is already stored are ignored and return False.
+        """
+        # A signed body is not necessarily a Stripe event
+        if (
+            not isinstance(event, dict)
+            or not isinstance(event.get("id"), str)
+            or not isinstance(event.get("type"), str)
+        ):
+            return "INVALID_EVENT"
+
+        stored = await self.webhook_repo.enqueue(event["id"], event["type"], event)
+        if stored:
+            self._wakeup.set()
+        return stored
+
+    def start(self) -> None:
+        for i in range(settings.WEBHOOK_WORKERS):
+            self._workers.append(
+                asyncio.create_task(self._run_worker(), name=f"webhook-worker-{i}")
+            )
+
+    async def stop(self) -> None:
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers.clear()
+
+    async def _run_worker(self) -> None:
+        lease = timedelta(seconds=settings.WEBHOOK_LEASE_SECONDS)
+        while True:
+            # Clear before claiming so an enqueue during the claim is not missed
+            self._wakeup.clear()
+            try:
+                event = await self.webhook_repo.claim_next(lease)
+            except Exception as e:
+                print(f"Webhook worker could not claim an event: {e}")
+                event = None
+
+            if event is None:
+                # Sleep until a new event arrives or retries become due
+                try:
+                    await asyncio.wait_for(
+                        self._wakeup.wait(), timeout=settings.WEBHOOK_POLL_SECONDS
+                    )
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            try:
+                await self._process(event)
+            except Exception as e:
+                # The lease runs out and the event is claimed again
+                print(f"Webhook worker could not record the outcome of {event.event_id}: {e}")
+
+    async def _process(self, event: WebhookEvent) -> None:
+        try:
+            await self._handle(event)
+        except PermanentWebhookError as e:
+            print(f"Webhook event {event.event_id} failed permanently: {e}")
+            await self.webhook_repo.dead_letter(event, str(e))
+            return
+        except Exception as e:
+            if event.attempts >= settings.WEBHOOK_MAX_ATTEMPTS:
+                print(f"Webhook event {event.event_id} gave up after {event.attempts} attempts: {e}")
+                await self.webhook_repo.dead_letter(event, str(e))
+                return
+
+            # Exponential backoff with full jitter
+            delay = random.uniform(0, settings.WEBHOOK_RETRY_BASE_SECONDS * 2 ** event.attempts)
+            await self.webhook_repo.schedule_retry(
+                event, utc_now() + timedelta(seconds=delay), str(e)
+            )
+            return
+
+        await self.webhook_repo.mark_done(event)
+
+    async def _handle(self, event: WebhookEvent) -> None:
+        if event.type == "checkout.session.expired":
+            # Abandoned checkout: give the held stock back without waiting for the sweeper
+            session = event.payload["data"]["object"]
+            reservation_id = (session.get("metadata") or {}).get("reservation_id")
+            if reservation_id:
+                await self.reservation_srv.release(PydanticObjectId(reservation_id))
+            return
+
+        if event.type != "checkout.session.completed":
+            return
+
+        session = event.payload["data"]["object"]
+        metadata = session.get("metadata") or {}
+
+        # Retrieve the user_id stored in metadata
+        user_id = metadata.get("user_id")
+        if not user_id:
+            raise PermanentWebhookError("User ID not in metadata")
+
+        print(f"Checkout session completed for user: {user_id}")
+
+        # Call OrderService to finalize the purchase
+        reservation_id = metadata.get("reservation_id")
+        order_or_error = await self.order_srv.create_order_for_checkout(
+            PydanticObjectId(user_id),
+            session["id"],
+            PydanticObjectId(reservation_id) if reservation_id else None
+        )
+        if order_or_error == "CHECKOUT_BUSY":
+            # Lost to concurrent writes on the same products; retried with backoff
+            raise RuntimeError("Order write kept conflicting with other checkouts")
+        if isinstance(order_or_error, str):
+            raise PermanentWebhookError(f"Failed to create order: {order_or_error}")
+
+webhook_service = WebhookService()
@@ -0,0 +1,368 @@
+"""
+Load the hot API endpoints in-process and report latency, throughput and
+MongoDB operations per request.
+
+    python -m benchmarks.api_benchmark
+    python -m benchmarks.api_benchmark --mongo-url mongodb://localhost:27017/api_bench --concurrency 64
+    python -m benchmarks.api_benchmark --output baseline.json
+    python -m benchmarks.api_benchmark --baseline baseline.json --max-regression 10
+
+The real FastAPI app is driven through httpx's ASGI transport with its
+lifespan running, so caches, background workers and middleware behave as
+in production. Stripe is replaced by a local stub server and webhooks are
+signed with the configured secret. Without --mongo-url the database is
+mongomock-motor, which is only good for spotting regressions in the
+Python code; with it, the database is emptied and refilled.
+
+Needs httpx (and mongomock-motor without --mongo-url), which are not app
+dependencies. Results are printed as JSON. With --baseline, each scenario
+is compared to an earlier --output file and the exit status is 1 if any
+got more than --max-regression percent slower at p95 or in throughput.
+"""
+import argparse
+import asyncio
+import hashlib
+import hmac
+import json
+import os
+import random
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qsl
+
+SCENARIOS = ["login", "list", "detail", "add_to_cart", "checkout", "webhook"]
+PASSWORD = "benchmark-password"
+
+class StripeStub(BaseHTTPRequestHandler):
+    """
+    Answers every Checkout Session creation and remembers its metadata,
+    so the webhook scenario can complete real sessions
+    """
+    sessions: dict[str, dict] = {}
+    lock = threading.Lock()
+
+    def do_POST(self) -> None:
+        form = dict(parse_qsl(self.rfile.read(int(self.headers.get("Content-Length", 0))).decode()))
+        metadata = {key[9:-1]: value for key, value in form.items() if key.startswith("metadata[")}
+        with self.lock:
+            session_id = f"cs_bench_{len(self.sessions)}"
+            self.sessions[session_id] = metadata
+        body = json.dumps({
+            "id": session_id,
+            "object": "checkout.session",
+            "url": f"https://checkout.stripe.test/{session_id}",
+            "metadata": metadata,
+        }).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args) -> None:
+        pass
+
+def start_stripe_stub() -> ThreadingHTTPServer:
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StripeStub)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+def configure_environment(args: argparse.Namespace, stripe_url: str) -> None:
+    """
+    Point the app settings at the benchmark database and the Stripe stub.
+    Must run before anything from app is imported.
+    """
+    os.environ["DATABASE_URL"] = args.mongo_url or "mongodb://localhost:27017/api_bench"
+    os.environ["STRIPE_API_BASE"] = stripe_url
+    os.environ["BCRYPT_ROUNDS"] = str(args.bcrypt_rounds)
+    for name in ("SECRET_KEY", "ALGORITHM", "STRIPE_PUBLIC_KEY", "STRIPE_SECRET_KEY", "STRIPE_WEBHOOK_SECRET"):
+        os.environ.setdefault(name, "HS256" if name == "ALGORITHM" else "benchmark")
+    # Let the benchmark's concurrency, not the Stripe client limit, bound checkout
+    os.environ.setdefault("STRIPE_MAX_CONCURRENCY", "256")
+
+def use_memory_database() -> None:
+    """
+    Make app startup use mongomock-motor, and count its operations in the
+    same metric the pymongo listener feeds, since mongomock emits no events
+    """
+    import mongomock.collection
+    import mongomock.database
+    from beanie import init_beanie
+    from mongomock_motor import AsyncMongoMockClient, AsyncMongoMockCollection
+
+    import app.db
+    import app.main
+    from app.core.metrics import mongo_commands
+
+    # mongomock predates a few keyword arguments newer Beanie/pymongo pass
+    list_collection_names = mongomock.database.Database.list_collection_names
+    mongomock.database.Database.list_collection_names = (
+        lambda self, filter=None, session=None, **kwargs: list_collection_names(self, filter=filter, session=session)
+    )
+    add_update = mongomock.collection.BulkOperationBuilder.add_update
+    mongomock.collection.BulkOperationBuilder.add_update = (
+        lambda self, *args, sort=None, **kwargs: add_update(self, *args, **kwargs)
+    )
+
+    # Read preferences mean nothing in memory; mongomock-motor would return an unwrapped collection
+    AsyncMongoMockCollection.with_options = lambda self, **kwargs: self
+
+    depth = threading.local()
+    def counted(name: str, method):
+        def wrapper(self, *args, **kwargs):
+            # find_one and friends call find; count only the outermost call
+            depth.value = getattr(depth, "value", 0) + 1
+            try:
+                if depth.value == 1:
+                    mongo_commands.inc(self.name, name, "success")
+                return method(self, *args, **kwargs)
+            finally:
+                depth.value -= 1
+        return wrapper
+
+    for name in ("find", "find_one", "insert_one", "insert_many", "update_one", "update_many",
+                 "replace_one", "delete_one", "delete_many", "find_one_and_update",
+                 "find_one_and_replace", "find_one_and_delete", "aggregate", "bulk_write",
+                 "count_documents", "distinct"):
+        setattr(mongomock.collection.Collection, name,
+                counted(name, getattr(mongomock.collection.Collection, name)))
+
+    async def init_memory_db() -> None:
+        client = AsyncMongoMockClient()
+        await init_beanie(database=client["api_bench"], document_models=app.db.DOCUMENT_MODELS)
+        print("In-memory database initialized (transactions: False)...")
+
+    app.main.init_db = init_memory_db
+
+async def mongo_ops(client) -> float:
+    """
+    Total MongoDB commands run so far, read from /metrics
+    """
+    response = await client.get("/metrics")
+    return sum(
+        float(line.rsplit(" ", 1)[1])
+        for line in response.text.splitlines()
+        if line.startswith("mongo_commands_total{")
+    )
+
+def sign_webhook(payload: str, secret: str) -> str:
+    timestamp = int(time.time())
+    signature = hmac.new(secret.encode(), f"{timestamp}.{payload}".encode(), hashlib.sha256).hexdigest()
+    return f"t={timestamp},v1={signature}"
+
+class Benchmark:
+    def __init__(self, client, args: argparse.Namespace):
+        self.client = client
+        self.args = args
+        self.rng = random.Random(args.seed)
+        self.product_ids: list[str] = []
+        self.users: list[dict] = []
+
+    async def seed(self) -> None:
+        from app.models.product import Product
+
+        await Product.insert_many([
+            Product(
+                name=f"product {i}",
+                description=f"benchmark product number {i}",
+                price=round(self.rng.uniform(1, 500), 2),
+                stock=1_000_000_000
+            )
+            for i in range(self.args.products)
+        ])
+        self.product_ids = [str(product.id) for product in await Product.find_all().to_list()]
+
+        for i in range(self.args.users):
+            email = f"bench{i}@example.com"
+            response = await self.client.post("/api/v1/users/", json={
+                "first_name": "Bench", "last_name": str(i), "email": email, "password": PASSWORD,
+            })
+            response.raise_for_status()
+            token = await self.login(email)
+            self.users.append({
+                "email": email,
+                "headers": {"Authorization": f"Bearer {token}"},
+                # A few products per user keep carts to a realistic size
+                "wishlist": self.rng.sample(self.product_ids, min(3, len(self.product_ids))),
+            })
+            await self.client.post(
+                "/api/v1/cart/items",
+                json={"product_id": self.users[-1]["wishlist"][0], "quantity": 1},
+                headers=self.users[-1]["headers"]
+            )
+
+    async def login(self, email: str) -> str:
+        response = await self.client.post("/api/v1/auth/token", data={"username": email, "password": PASSWORD})
+        response.raise_for_status()
+        return response.json()["access_token"]
+
+    async def request(self, scenario: str, i: int, user: dict):
+        if scenario == "login":
+            return await self.client.post(
+                "/api/v1/auth/token", data={"username": user["email"], "password": PASSWORD}
+            )
+        if scenario == "list":
+            return await self.client.get("/api/v1/products/", params={"limit": 20})
+        if scenario == "detail":
+            return await self.client.get(f"/api/v1/products/{self.product_ids[i % len(self.product_ids)]}")
+        if scenario == "add_to_cart":
+            product_id = user["wishlist"][i % len(user["wishlist"])]
+            return await self.client.post(
+                "/api/v1/cart/items", json={"product_id": product_id, "quantity": 1}, headers=user["headers"]
+            )
+        if scenario == "checkout":
+            return await self.client.post("/api/v1/orders/create-checkout", headers=user["headers"])
+        raise ValueError(scenario)
+
+    async def run_scenario(self, scenario: str) -> dict:
+        from app.core.config import settings
+        from benchmarks.search_benchmark import summarize
+
+        payloads: list[str] = []
+        if scenario == "webhook":
+            if not StripeStub.sessions:
+                await self.run_scenario("checkout")
+            # Complete every session checkout created, as Stripe would
+            payloads = [
+                json.dumps({
+                    "id": f"evt_{session_id}",
+                    "type": "checkout.session.completed",
+                    "data": {"object": {"id": session_id, "metadata": metadata, "payment_status": "paid"}},
+                })
+                for session_id, metadata in StripeStub.sessions.items()
+            ]
+        total = len(payloads) if payloads else self.args.requests
+
+        samples: list[float] = []
+        errors = 0
+        next_index = 0
+
+        async def worker(worker_index: int) -> None:
+            nonlocal next_index, errors
+            # One user per worker, so a user's cart is never checked out twice at once
+            user = self.users[worker_index % len(self.users)]
+            while next_index < total:
+                i = next_index
+                next_index += 1
+                started = time.perf_counter()
+                if scenario == "webhook":
+                    response = await self.client.post(
+                        "/api/v1/webhooks/stripe",
+                        content=payloads[i],
+                        headers={"Stripe-Signature": sign_webhook(payloads[i], settings.STRIPE_WEBHOOK_SECRET)}
+                    )
+                else:
+                    response = await self.request(scenario, i, user)
+                samples.append(time.perf_counter() - started)
+                if response.status_code >= 400:
+                    errors += 1
+
+        ops_before = await mongo_ops(self.client)
+        started = time.perf_counter()
+        await asyncio.gather(*(worker(i) for i in range(self.args.concurrency)))
+        elapsed = time.perf_counter() - started
+        ops = await mongo_ops(self.client) - ops_before
+
+        stats = summarize(samples)
+        stats.pop("queries")
+        return {
+            "requests": len(samples),
+            "errors": errors,
+            "throughput_rps": round(len(samples) / elapsed, 1),
+            **stats,
+            "mongo_ops_per_request": round(ops / len(samples), 2),
+        }
+
+def compare(results: dict, baseline: dict, max_regression: float) -> tuple[dict, list[str]]:
+    """
+    Percent change of each scenario against the baseline, and the
+    scenarios that regressed by more than max_regression percent
+    """
+    def change(new: float, old: float) -> float | None:
+        return round((new - old) / old * 100, 1) if old else None
+
+    comparison, regressions = {}, []
+    for scenario, new in results["scenarios"].items():
+        old = baseline.get("scenarios", {}).get(scenario)
+        if old is None:
+            continue
+        delta = {
+            "throughput_rps_pct": change(new["throughput_rps"], old["throughput_rps"]),
+            "p50_ms_pct": change(new["p50_ms"], old["p50_ms"]),
+            "p95_ms_pct": change(new["p95_ms"], old["p95_ms"]),
+            "p99_ms_pct": change(new["p99_ms"], old["p99_ms"]),
+            "mongo_ops_per_request": round(new["mongo_ops_per_request"] - old["mongo_ops_per_request"], 2),
+        }
+        comparison[scenario] = delta
+        if (delta["p95_ms_pct"] or 0) > max_regression or -(delta["throughput_rps_pct"] or 0) > max_regression:
+            regressions.append(scenario)
+    return comparison, regressions
+
+async def run(args: argparse.Namespace) -> dict:
+    import httpx
+    from app.main import app
+
+    from app.db import DOCUMENT_MODELS
+
+    async with app.router.lifespan_context(app):
+        if args.mongo_url:
+            # Empty rather than drop, so the indexes built at startup stay
+            for model in DOCUMENT_MODELS:
+                await model.get_pymongo_collection().delete_many({})
+
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://benchmark") as client:
+            benchmark = Benchmark(client, args)
+            await benchmark.seed()
+
+            results = {
+                "database": "mongo" if args.mongo_url else "memory",
+                "concurrency": args.concurrency,
+                "scenarios": {},
+            }
+            for scenario in args.scenarios:
+                results["scenarios"][scenario] = await benchmark.run_scenario(scenario)
+    return results
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--mongo-url", help="MongoDB URL of a scratch database; in-memory when left out")
+    parser.add_argument("--scenarios", nargs="+", choices=SCENARIOS, default=SCENARIOS)
+    parser.add_argument("--requests", type=int, default=1_000, help="Requests per scenario")
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--users", type=int, help="Users to log in as; defaults to --concurrency")
+    parser.add_argument("--products", type=int, default=1_000)
+    parser.add_argument("--bcrypt-rounds", type=int, default=12,
+                        help="Password hash cost; lower it to keep login from dominating a run")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", help="Also write the results to this file")
+    parser.add_argument("--baseline", help="Results file of an earlier run to compare against")
+    parser.add_argument("--max-regression", type=float, default=10,
+                        help="Percent of p95 or throughput loss that fails the comparison")
+    args = parser.parse_args()
+    args.users = args.users or args.concurrency
+
+    stub = start_stripe_stub()
+    configure_environment(args, f"http://127.0.0.1:{stub.server_port}")
+    if not args.mongo_url:
+        use_memory_database()
+
+    results = asyncio.run(run(args))
+    stub.shutdown()
+
+    regressions: list[str] = []
+    if args.baseline:
+        with open(args.baseline) as f:
+            results["comparison"], regressions = compare(results, json.load(f), args.max_regression)
+        results["regressions"] = regressions
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+    print(json.dumps(results, indent=2))
+    sys.exit(1 if regressions else 0)
+
+if __name__ == "__main__":
+    main()
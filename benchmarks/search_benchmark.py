@@ -0,0 +1,140 @@
+"""
+Compare the two product search backends on a synthetic catalog.
+
+    python -m benchmarks.search_benchmark --products 1000000
+    python -m benchmarks.search_benchmark --products 200000 --mongo-url mongodb://localhost:27017/search_bench
+
+The in-process index is always measured. The Mongo text index is measured
+too when --mongo-url is given; its database is dropped and refilled.
+Results are printed as JSON.
+"""
+import argparse
+import json
+import os
+import random
+import statistics
+import time
+
+# The app settings are loaded on import; placeholders are enough here
+for name in ("DATABASE_URL", "SECRET_KEY", "ALGORITHM",
+             "STRIPE_PUBLIC_KEY", "STRIPE_SECRET_KEY", "STRIPE_WEBHOOK_SECRET"):
+    os.environ.setdefault(name, "benchmark")
+
+from bson import ObjectId
+
+from app.services.search_service import InvertedIndex
+
+ADJECTIVES = ["red", "blue", "green", "black", "white", "light", "heavy", "classic",
+              "modern", "vintage", "wireless", "portable", "premium", "organic", "smart"]
+NOUNS = ["shoes", "shirt", "jacket", "lamp", "chair", "headphones", "keyboard", "mug",
+         "backpack", "watch", "speaker", "bottle", "blanket", "camera", "charger"]
+
+def make_vocabulary(size: int, rng: random.Random) -> list[str]:
+    letters = "abcdefghijklmnopqrstuvwxyz"
+    return ["".join(rng.choice(letters) for _ in range(rng.randint(4, 9))) for _ in range(size)]
+
+def make_products(count: int, seed: int):
+    rng = random.Random(seed)
+    filler = make_vocabulary(20_000, rng)
+    for _ in range(count):
+        name = f"{rng.choice(ADJECTIVES)} {rng.choice(NOUNS)} {rng.choice(filler)}"
+        description = " ".join(rng.choice(filler) for _ in range(rng.randint(8, 20)))
+        yield ObjectId(), name, description
+
+def make_queries(rng: random.Random) -> list[str]:
+    queries = []
+    for _ in range(200):
+        kind = rng.random()
+        if kind < 0.4:
+            queries.append(rng.choice(NOUNS))
+        elif kind < 0.8:
+            queries.append(f"{rng.choice(ADJECTIVES)} {rng.choice(NOUNS)}")
+        else:
+            # Autocomplete: a partial last word
+            noun = rng.choice(NOUNS)
+            queries.append(f"{rng.choice(ADJECTIVES)} {noun[:rng.randint(2, len(noun))]}")
+    return queries
+
+def summarize(samples: list[float]) -> dict:
+    samples = sorted(samples)
+    def percentile(p: float) -> float:
+        return round(samples[min(len(samples) - 1, int(p * len(samples)))] * 1000, 3)
+    return {
+        "queries": len(samples),
+        "mean_ms": round(statistics.fmean(samples) * 1000, 3),
+        "p50_ms": percentile(0.50),
+        "p95_ms": percentile(0.95),
+        "p99_ms": percentile(0.99),
+    }
+
+def bench_memory(products: list, queries: list[str], limit: int) -> dict:
+    started = time.perf_counter()
+    index = InvertedIndex.build(products)
+    build_seconds = time.perf_counter() - started
+
+    samples = []
+    for query in queries:
+        started = time.perf_counter()
+        index.search(query, 0, limit)
+        samples.append(time.perf_counter() - started)
+    return {"build_seconds": round(build_seconds, 2), **summarize(samples)}
+
+def bench_mongo(mongo_url: str, products: list, queries: list[str], limit: int) -> dict:
+    from pymongo import MongoClient, TEXT
+
+    client = MongoClient(mongo_url)
+    collection = client.get_default_database()["products"]
+    collection.drop()
+
+    started = time.perf_counter()
+    batch = []
+    for product_id, name, description in products:
+        batch.append({"_id": product_id, "name": name, "description": description,
+                      "price": 1.0, "stock": 1})
+        if len(batch) == 10_000:
+            collection.insert_many(batch, ordered=False)
+            batch.clear()
+    if batch:
+        collection.insert_many(batch, ordered=False)
+    collection.create_index(
+        [("name", TEXT), ("description", TEXT)],
+        name="name_description_text",
+        weights={"name": 10, "description": 1}
+    )
+    build_seconds = time.perf_counter() - started
+
+    score = {"$meta": "textScore"}
+    samples = []
+    for query in queries:
+        started = time.perf_counter()
+        list(
+            collection.find({"$text": {"$search": query}}, {"score": score})
+            .sort([("score", score)])
+            .limit(limit)
+        )
+        samples.append(time.perf_counter() - started)
+    client.close()
+    return {"build_seconds": round(build_seconds, 2), **summarize(samples)}
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--products", type=int, default=100_000)
+    parser.add_argument("--limit", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--mongo-url", help="MongoDB URL of a scratch database")
+    args = parser.parse_args()
+
+    products = list(make_products(args.products, args.seed))
+    queries = make_queries(random.Random(args.seed))
+
+    results = {
+        "products": args.products,
+        "memory": bench_memory(products, queries, args.limit),
+    }
+    if args.mongo_url:
+        results["mongo"] = bench_mongo(args.mongo_url, products, queries, args.limit)
+
+    print(json.dumps(results, indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+"""
+Measure checkout stock decrements on one hot product, with the stock in
+the product document and spread over stock shards.
+
+    python -m benchmarks.stock_benchmark --mongo-url mongodb://localhost:27017/stock_bench
+    python -m benchmarks.stock_benchmark --mongo-url ... --concurrency 256 --shards 1 8 32
+
+Each run refills the product, then --concurrency tasks take one unit at a
+time until --orders decrements have been made. The database is dropped
+and refilled. Results are printed as JSON.
+"""
+import argparse
+import asyncio
+import json
+import os
+import time
+
+# The app settings are loaded on import; placeholders are enough here
+for name in ("DATABASE_URL", "SECRET_KEY", "ALGORITHM",
+             "STRIPE_PUBLIC_KEY", "STRIPE_SECRET_KEY", "STRIPE_WEBHOOK_SECRET"):
+    os.environ.setdefault(name, "benchmark")
+os.environ["STOCK_SHARDING"] = "true"
+
+from beanie import init_beanie
+from motor.motor_asyncio import AsyncIOMotorClient
+
+from app.models.product import Product
+from app.models.stock_shard import StockShard
+from app.repositories.product_repository import product_repository
+from benchmarks.search_benchmark import summarize
+
+async def bench(shard_count: int, orders: int, concurrency: int) -> dict:
+    product = Product(name="hot", description="hot", price=1.0, stock=orders)
+    await product.insert()
+    if shard_count > 1:
+        await product_repository.set_stock_shards(product.id, shard_count) # pyright: ignore[reportArgumentType]
+
+    remaining = orders
+    samples: list[float] = []
+
+    async def worker() -> None:
+        nonlocal remaining
+        while remaining > 0:
+            remaining -= 1
+            started = time.perf_counter()
+            await product_repository.decrement_stock({product.id: 1}) # pyright: ignore[reportArgumentType]
+            samples.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+
+    left = (await product_repository.get(product.id)).stock # pyright: ignore
+    return {
+        "shards": shard_count,
+        "orders_per_second": round(len(samples) / elapsed),
+        "stock_left": left,
+        **summarize(samples),
+    }
+
+async def run(args: argparse.Namespace) -> dict:
+    client = AsyncIOMotorClient(args.mongo_url, maxPoolSize=args.concurrency)
+    database = client.get_default_database()
+    await client.drop_database(database.name)
+    await init_beanie(database=database, document_models=[Product, StockShard])
+
+    results = {"orders": args.orders, "concurrency": args.concurrency, "runs": []}
+    for shard_count in args.shards:
+        results["runs"].append(await bench(shard_count, args.orders, args.concurrency))
+    client.close()
+    return results
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--mongo-url", required=True, help="MongoDB URL of a scratch database")
+    parser.add_argument("--orders", type=int, default=20_000)
+    parser.add_argument("--concurrency", type=int, default=128)
+    parser.add_argument("--shards", type=int, nargs="+", default=[1, 4, 16],
+                        help="Shard counts to compare; 1 means the product document itself")
+    args = parser.parse_args()
+
+    print(json.dumps(asyncio.run(run(args)), indent=2))
+
+if __name__ == "__main__":
+    main()
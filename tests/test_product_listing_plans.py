@@ -0,0 +1,117 @@
+"""
+Explains the product listing query for every filter and sort combination
+against a real MongoDB and checks that each one is served by an index:
+no collection scan, no blocking sort, and no documents fetched only to be
+filtered out.
+
+    TEST_DATABASE_URL=mongodb://localhost:27017/listing_plans_test pytest
+
+The database named in the URL is dropped first.
+"""
+import asyncio
+import itertools
+import os
+from typing import Any
+
+import pytest
+
+TEST_DATABASE_URL = os.environ.get("TEST_DATABASE_URL")
+if not TEST_DATABASE_URL:
+    pytest.skip("TEST_DATABASE_URL is not set", allow_module_level=True)
+
+from beanie import init_beanie
+from motor.motor_asyncio import AsyncIOMotorClient
+
+from app.models.product import Product
+from app.repositories.product_repository import (
+    LISTING_INDEXES,
+    PRODUCT_SORTS,
+    LISTING_PROJECTION,
+    product_repository
+)
+from app.schemas.product import ProductFilter
+
+FILTER_COMBINATIONS = list(itertools.product(
+    (None, 10.0), (None, 500.0), (False, True), (None, "Pro"), PRODUCT_SORTS
+))
+
+def unbounded_scan(stage: dict) -> bool:
+    """
+    Whether an IXSCAN walks its whole index: no bounds on its first field
+    """
+    if stage.get("stage") != "IXSCAN":
+        return False
+    bounds = stage.get("indexBounds", {})
+    first_field = next(iter(stage.get("keyPattern", {})), None)
+    return bounds.get(first_field) == ["[MinKey, MaxKey]"] or bounds.get(first_field) == ["[MaxKey, MinKey]"]
+
+def plan_problems(plan: dict) -> list[str]:
+    """
+    What is wrong with a winning plan, walking it from the root down
+    """
+    problems = []
+    stages = [plan.get("queryPlan", plan)]
+    while stages:
+        stage = stages.pop()
+        name = stage.get("stage")
+        if name == "COLLSCAN":
+            problems.append("collection scan")
+        if name == "SORT":
+            problems.append("blocking sort")
+        if name == "FETCH" and stage.get("filter") and unbounded_scan(stage.get("inputStage", {})):
+            problems.append(f"whole index walked to filter fetched documents on {stage['filter']}")
+        if stage.get("inputStage"):
+            stages.append(stage["inputStage"])
+        stages.extend(stage.get("inputStages", []))
+    return problems
+
+async def explain_listings() -> dict[str, list[str]]:
+    client: AsyncIOMotorClient = AsyncIOMotorClient(TEST_DATABASE_URL)
+    database = client.get_default_database()
+    await client.drop_database(database.name)
+    try:
+        await init_beanie(database=database, document_models=[Product]) # pyright: ignore[reportArgumentType]
+        await Product.insert_many([
+            Product(
+                name=f"{('Pro', 'Basic', 'Mini')[i % 3]} {i}",
+                description="",
+                price=float(i % 1000),
+                stock=i % 4
+            )
+            for i in range(3000)
+        ])
+        last = await Product.find_one(Product.price == 250.0)
+        assert last is not None
+
+        failures = {}
+        collection = Product.get_pymongo_collection()
+        for min_price, max_price, in_stock, name_prefix, sort in FILTER_COMBINATIONS:
+            filters = ProductFilter(
+                min_price=min_price,
+                max_price=max_price,
+                in_stock=in_stock,
+                name_prefix=name_prefix,
+                sort=sort # pyright: ignore[reportArgumentType]
+            )
+            # The first page and a page after a cursor
+            after_row: dict[str, Any] = {"_id": last.id, "price": last.price}
+            after = tuple(after_row[field] for field, _ in PRODUCT_SORTS[sort])
+            for cursor in (None, after):
+                explained = await (
+                    collection.find(product_repository._listing_query(filters, cursor), LISTING_PROJECTION)
+                    .sort(PRODUCT_SORTS[sort])
+                    .hint(LISTING_INDEXES[sort])
+                    .limit(20)
+                    .explain()
+                )
+                problems = plan_problems(explained["queryPlanner"]["winningPlan"])
+                if problems:
+                    failures[f"{filters!r} after={cursor is not None}"] = problems
+        return failures
+    finally:
+        await client.drop_database(database.name)
+        client.close()
+
+def test_every_listing_combination_is_index_backed():
+    failures = asyncio.run(explain_listings())
+    assert not failures, "\n".join(f"{key}: {problems}" for key, problems in failures.items())